@@ -2,6 +2,8 @@
 ASGI config for hb project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it (e.g. ``uvicorn hb.asgi:application``) for the real-time event stream at
+api/v1/eventos/, whose connections stay open.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
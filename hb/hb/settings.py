@@ -123,3 +123,38 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Portaria
+
+# Size of the LRU cache kept in front of each document, phone and plate validator,
+# keyed on the normalized value. Opt-in: 0 (the default) disables it; set it, e.g. to 4096,
+# on deployments that validate the same documents over and over (bulk loads, CSV checks).
+PORTARIA_VALIDATION_CACHE_SIZE = 0
+
+# Seconds during which the in-memory copy of Cor, MarcaModelo, Quadra, Lote and Residencia is used
+# without checking their version in Atualizado. Changes made by this process are seen at once.
+PORTARIA_REFERENCE_CACHE_TTL = 5
+
+# Rows per page of the cursor-paginated endpoints (see portaria.pagination); clients may
+# ask for a different size with ?tamanho=, up to PORTARIA_MAX_PAGE_SIZE.
+PORTARIA_PAGE_SIZE = 50
+PORTARIA_MAX_PAGE_SIZE = 500
+
+# Delta sync (api/v1/sync/): records and removals per page, and days removals are kept before
+# `manage.py limpar_removidos` deletes them. A client whose `since` is older gets a full sync.
+PORTARIA_SYNC_PAGE_SIZE = 1000
+PORTARIA_SYNC_RETENTION_DAYS = 90
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'portaria.pagination.PaginacaoPorCursor',
+}
+
+# Closed visits whose entry is older than this many days (rounded down to whole months) are
+# moved to the archive by `manage.py arquivar_visitas`; the API keeps reading them.
+PORTARIA_ARQUIVO_HORIZONTE_DIAS = 365
+
+# Server-Sent Events stream (api/v1/eventos/, see portaria.broadcast): messages kept for clients
+# that reconnect, and messages a client may fall behind before it is disconnected.
+PORTARIA_EVENTS_HISTORY = 500
+PORTARIA_EVENTS_QUEUE_SIZE = 100
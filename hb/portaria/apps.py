@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.test.signals import setting_changed
+
+from .utils import configure_validation_cache
+
+
+def _configurar_cache_de_validacao(*, setting, value, **kwargs):
+    if setting == 'PORTARIA_VALIDATION_CACHE_SIZE':
+        configure_validation_cache(value)
 
 
 class PortariaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'portaria'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        configure_validation_cache(getattr(settings, 'PORTARIA_VALIDATION_CACHE_SIZE', 0))
+        setting_changed.connect(_configurar_cache_de_validacao)
@@ -0,0 +1,146 @@
+"""
+In-process broadcast of changes to Server-Sent Events clients (``GET api/v1/eventos/``).
+
+The signals publish each change once, after its transaction commits. The message is encoded
+a single time, and the same bytes are queued for every client subscribed to its channel, so the
+cost of a change does not grow with the number of open screens.
+
+Each message has an increasing id. The last PORTARIA_EVENTS_HISTORY messages are kept, so a
+client that reconnects with ``Last-Event-ID`` receives what it missed. A client that falls
+PORTARIA_EVENTS_QUEUE_SIZE messages behind is disconnected, and it resumes the same way.
+
+Each worker process has its own broker: a client sees the changes made through the worker
+that serves it. Run a single ASGI worker, or route all clients and writes to the same one,
+when every screen must see every change.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+VISITS = 'visitantes'
+VEHICLES = 'veiculos'
+RESIDENTS = 'moradores'
+CHANNELS = frozenset((VISITS, VEHICLES, RESIDENTS))
+
+# Messages are still published for this many seconds after the last client leaves, so that
+# a screen that is reloading or reconnecting finds them in the history
+_RESUME_WINDOW = 60
+
+
+class Subscription:
+    """
+    Queue of encoded messages of one client, read in the event loop that serves it.
+
+    A None in the queue ends the stream.
+    """
+
+    def __init__(self, channels, loop):
+        self.channels = channels
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=getattr(settings, 'PORTARIA_EVENTS_QUEUE_SIZE', 100))
+        self.closed = False
+
+    def put(self, message):
+        """
+        Queue a message; must run in ``self.loop``.
+        """
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # The client is not keeping up: drop what is queued and end the stream
+            self.closed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class Broker:
+    """
+    Subscribers and recent messages of this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._history = deque(maxlen=getattr(settings, 'PORTARIA_EVENTS_HISTORY', 500))
+        # Ids start at the current time in milliseconds, so they keep growing across restarts
+        self._ids = itertools.count(int(time.time() * 1000))
+        self._last_left = None
+
+    def is_listened(self, channel):
+        """
+        Whether a message on ``channel`` would reach anyone, now or on a reconnection.
+        Callers skip building the message when it would not.
+        """
+        if any(channel in subscription.channels for subscription in self._subscriptions):
+            return True
+        last_left = self._last_left
+        return last_left is not None and time.monotonic() - last_left < _RESUME_WINDOW
+
+    def publish(self, channel, event, data):
+        """
+        Send a message to every subscriber of ``channel``; may be called from any thread.
+
+        Parameters
+        ----------
+        channel : str
+            One of CHANNELS.
+        event : str
+            Event name, e.g. 'visita.entrada'.
+        data : object
+            JSON-serializable payload.
+        """
+        with self._lock:
+            message_id = next(self._ids)
+            message = (f'id: {message_id}\nevent: {event}\n'
+                       f'data: {json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))}\n\n').encode()
+            self._history.append((message_id, channel, message))
+            subscriptions = [s for s in self._subscriptions if channel in s.channels]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+            except RuntimeError:
+                # The loop of the client is closed; it is removed when its stream ends
+                pass
+
+    def subscribe(self, channels, last_event_id=None):
+        """
+        Subscribe the running event loop to ``channels``.
+
+        Parameters
+        ----------
+        channels : set of str
+            Channels to receive.
+        last_event_id : int
+            Id of the last message received before a reconnection; the later messages still
+            in the history are queued first.
+
+        Returns
+        -------
+        Subscription
+        """
+        subscription = Subscription(frozenset(channels), asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+            missed = [message for message_id, channel, message in self._history
+                      if last_event_id is not None and message_id > last_event_id and channel in channels]
+        for message in missed:
+            subscription.put(message)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            if not self._subscriptions:
+                self._last_left = time.monotonic()
+
+
+broker = Broker()
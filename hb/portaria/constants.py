@@ -6,4 +6,27 @@ AREA_CODES = (
         '65', '66', '67', '68', '69', '71', '73', '74', '75', '77',
         '79', '81', '82', '83', '84', '85', '86', '87', '88', '89',
         '91', '92', '93', '94', '95', '96', '97', '98', '99'
-    )
\ No newline at end of file
+    )
+
+DOCUMENTO = [
+    (1, 'CPF'),
+    (2, 'RG'),
+    (3, 'RNE'),
+    (4, 'CNH'),
+    (5, 'CIN'),
+    (6, 'Passaporte'),
+    (7, 'Sem documento'),
+    (9, 'Outro')
+]
+
+# Check digit weights
+CIC_FIRST_WEIGHTS = (10, 9, 8, 7, 6, 5, 4, 3, 2)
+CIC_SECOND_WEIGHTS = (11, 10, 9, 8, 7, 6, 5, 4, 3, 2)
+CNPJ_FIRST_WEIGHTS = (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+CNPJ_SECOND_WEIGHTS = (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+OLD_CNH_WEIGHTS = (9, 8, 7, 6, 5, 4, 3, 2, 1)
+CNH_FIRST_WEIGHTS = (2, 3, 4, 5, 6, 7, 8, 9, 10)
+CNH_SECOND_WEIGHTS = (3, 4, 5, 6, 7, 8, 9, 10, 11, 2)
+
+# Letter replacing the second digit of an old format plate in the Mercosul format, by digit
+MERCOSUL_LETTERS = 'ABCDEFGHIJ'
@@ -0,0 +1,214 @@
+"""
+The document, phone and plate validators as they were before the validate_document registry, kept
+unchanged so that benchmark_validadores can time them next to the current ones.
+
+They recompile their patterns and rebuild the weight lists on every call, and is_rg_valid raises
+on empty values. Do not use them outside the benchmark.
+"""
+import re
+
+from portaria.constants import AREA_CODES
+
+
+def is_cic_valid(cic):
+    """
+    Validate a CIC number based on assumed check digit rules similar to CPF.
+
+    Parameters
+    ----------
+    cic : str
+        CIC number as a string, possibly including any non-numeric characters.
+
+    Returns
+    -------
+    bool
+        True if the CIC is valid, False otherwise.
+    """
+    cic = re.sub(r'[^0-9]', '', cic)
+
+    if len(cic) != 11:
+        return False
+
+    # Calculate the first check digit (10th digit)
+    first_weights = list(range(10, 1, -1))  # weights from 10 to 2
+    first_check_sum = sum(int(digit) * weight for digit, weight in zip(cic[:9], first_weights))
+    first_check_digit = 11 - (first_check_sum % 11)
+    if first_check_digit >= 10:
+        first_check_digit = 0
+
+    # Calculate the second check digit (11th digit)
+    second_weights = list(range(11, 1, -1))  # weights from 11 to 2
+    second_check_sum = sum(int(digit) * weight for digit, weight in zip(cic[:10], second_weights))
+    second_check_digit = 11 - (second_check_sum % 11)
+    if second_check_digit >= 10:
+        second_check_digit = 0
+
+    # Check if the calculated digits match the provided digits
+    return int(cic[9]) == first_check_digit and int(cic[10]) == second_check_digit
+
+
+def is_rne_valid(rne):
+    """
+    Validates a Brazilian RNE ID number.
+
+    Parameters
+    ----------
+    rne : str
+        RNE ID number as a string.
+
+    Returns
+    -------
+    bool
+        True if the RNE ID number is valid, False otherwise.
+    """
+    # Define the regex pattern for RNE numbers: Letter (typically V or W), 6-8 digits, and a check character
+    pattern = r'^[VW]\d{6,8}-[A-Z]$'
+    # Check if the RNE number matches the pattern
+    return bool(re.fullmatch(pattern, rne))
+
+
+def is_rg_valid(rg):
+    """
+    Validates a Brazilian RG number.
+
+    Parameters
+    ----------
+    rg : str
+        RG number as a string, possibly including dots, slashes, and hyphens.
+
+    Returns
+    -------
+    bool
+        True if the RG number is valid, False otherwise.
+    """
+    rg = re.sub(r'[^A-Z0-9]', '', rg.upper())
+    digits = map(int, rg[:-1])
+    totals = []
+    for i, digit in enumerate(digits):
+        totals.append(digit * (2 + i))
+
+    total = sum(totals)
+    remainder = total % 11
+    verification_digit = 11 - remainder
+
+    if verification_digit == 10:
+        return rg[-1] == 'X'
+    elif verification_digit == 11:
+        verification_digit = 0
+
+    return verification_digit == int(rg[-1])
+
+
+def is_old_cnh_pgus_valid(cnh):
+    """
+    Validates an old Brazilian CNH number based on PGU-S checksum calculations.
+
+    Parameters
+    ----------
+    cnh : str
+        CNH number as a string.
+
+    Returns
+    -------
+    bool
+        True if the CNH is valid, False otherwise.
+    """
+
+    if len(cnh) != 9:
+        return False
+
+    weights = [9, 8, 7, 6, 5, 4, 3, 2, 1]
+    sum_digits = sum(int(c) * w for c, w in zip(cnh, weights))
+    remainder = sum_digits % 11
+    verify_one = 0 if remainder > 9 else 11 - remainder
+    return str(verify_one) == cnh[-1]
+
+
+def is_cnh_valid(cnh):
+    """
+    Validates a Brazilian CNH number based on checksum calculations.
+
+    Parameters
+    ----------
+        cnh: Is a str - CNH number as a string
+
+    Returns
+    -------
+       bool: True if the CNH is valid, False otherwise
+
+    resources: https://www.devmedia.com.br/forum/validacao-de-cnh/372972
+    """
+    cnh = re.sub(r'[^0-9]', '', cnh)
+
+    if len(cnh) == 9:
+        return is_old_cnh_pgus_valid(cnh)
+
+    length = len(cnh)
+
+    if length != 11:
+        filler = '0' * (11 - length)
+        cnh = cnh[0:length - 2] + filler + cnh[length - 2:]
+
+    weights1 = [2, 3, 4, 5, 6, 7, 8, 9, 10]
+    sum_digits = 0
+    for i in range(9):
+        sum_digits += int(cnh[i]) * weights1[i]
+
+    remainder = sum_digits % 11
+    verify_one = 0 if remainder > 9 else 11 - remainder
+
+    if cnh[9] != str(verify_one):
+        return False
+
+    weights2 = [3, 4, 5, 6, 7, 8, 9, 10, 11, 2]
+    sum_digits = 0
+    for i in range(10):
+        sum_digits += int(cnh[i]) * weights2[i]
+
+    remainder = sum_digits % 11
+    verify_two = 1 if remainder == 10 else 11 - remainder
+
+    return str(verify_two) == cnh[10]
+
+
+def is_phone_number_valid(phone_number):
+    """
+    Validate a Brazilian phone number.
+
+    Parameters
+    ----------
+    phone_number : str
+        Phone number as a string, possibly including parentheses, hyphens, and spaces.
+
+    Returns
+    -------
+    bool
+        True if the phone number is valid, False otherwise.
+    """
+    # Remove all non-numeric characters from the phone number
+    phone_number = re.sub(r'\D', '', phone_number)
+
+    # Check if the phone number has the correct length and starts with a valid area code
+    return len(phone_number) == 11 and phone_number[2:4] in AREA_CODES
+
+
+def is_license_plate_valid(license_plate):
+    """
+    Validates a Brazilian license plate number.
+
+    Parameters
+    ----------
+    license_plate:  License plate number as a string.
+
+    Returns
+    -------
+        Bool: True if the license plate is valid, False otherwise.
+    """
+    # Remove any non-alphanumeric characters and convert to uppercase
+    license_plate = re.sub(r'[^A-Z0-9]', '', license_plate.upper())
+    return re.match(r'^[A-Z]{3}\d{4}$|^[A-Z]{3}\d[A-Z]\d{2}$', license_plate) is not None
+
+
+_NON_DIGIT = re.compile(r'[^0-9]')
+_NON_ALPHANUMERIC = re.compile(r'[^A-Z0-9]')
+_NON_DECIMAL = re.compile(r'\D')
@@ -0,0 +1,60 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from portaria.models import VisitaArquivada, Visitantes
+
+
+def inicio_do_mes(momento):
+    """
+    Primeiro instante do mês de ``momento``, no fuso atual
+    """
+    dia = timezone.localtime(momento).date().replace(day=1)
+    return timezone.make_aware(datetime.datetime.combine(dia, datetime.time()))
+
+
+def proximo_mes(momento):
+    return inicio_do_mes(momento + datetime.timedelta(days=32))
+
+
+class Command(BaseCommand):
+    help = ('Move as visitas encerradas mais antigas que o horizonte para o arquivo, mês a mês, '
+            'mantendo os totais diários por residência e tipo de visitante')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int,
+                            default=getattr(settings, 'PORTARIA_ARQUIVO_HORIZONTE_DIAS', 365),
+                            help='Horizonte: visitas com entrada há mais dias que este são arquivadas')
+        parser.add_argument('--simular', action='store_true',
+                            help='Apenas informa quantas visitas seriam arquivadas por mês')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 0:
+            raise CommandError('O horizonte deve ser de zero ou mais dias')
+
+        # Só meses completos vão para o arquivo
+        limite = inicio_do_mes(timezone.now() - datetime.timedelta(days=options['dias']))
+        encerradas = Visitantes.objects.filter(data_saida__isnull=False, data_entrada__lt=limite)
+        primeira = encerradas.aggregate(primeira=Min('data_entrada'))['primeira']
+        if primeira is None:
+            self.stdout.write('Nenhuma visita a arquivar')
+            return
+
+        total = 0
+        mes = inicio_do_mes(primeira)
+        while mes < limite:
+            fim = proximo_mes(mes)
+            if options['simular']:
+                quantidade = encerradas.filter(data_entrada__gte=mes, data_entrada__lt=fim).count()
+            else:
+                quantidade = VisitaArquivada.arquivar(mes, fim)
+            if quantidade:
+                self.stdout.write(f'{timezone.localtime(mes):%Y-%m}: {quantidade} visitas')
+            total += quantidade
+            mes = fim
+
+        acao = 'a arquivar' if options['simular'] else 'arquivadas'
+        self.stdout.write(self.style.SUCCESS(f'{total} visitas {acao}'))
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from portaria.models import Morador, Veiculo
+
+# Host aceito com DEBUG e ALLOWED_HOSTS vazio
+HOST = 'localhost'
+
+
+def dividir(total, partes):
+    """
+    ``total`` requisições repartidas entre ``partes`` clientes
+    """
+    return [total // partes + (1 if i < total % partes else 0) for i in range(partes)]
+
+
+def conteudo(resposta):
+    dados = resposta.json()
+    # As rotas síncronas são paginadas
+    return dados['results'] if isinstance(dados, dict) and 'results' in dados else dados
+
+
+def medir_wsgi(url, requisicoes, concorrencia):
+    """
+    Requisições por segundo pelo handler WSGI, com ``concorrencia`` threads, como um servidor WSGI com threads
+    """
+    def cliente(quantidade):
+        client = Client(HTTP_HOST=HOST)
+        try:
+            for _ in range(quantidade):
+                resposta = client.get(url)
+                if resposta.status_code != 200:
+                    raise CommandError(f'{url}: {resposta.status_code}')
+        finally:
+            connection.close()
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concorrencia) as executor:
+        list(executor.map(cliente, dividir(requisicoes, concorrencia)))
+    return requisicoes / (time.perf_counter() - inicio)
+
+
+async def medir_asgi(url, requisicoes, concorrencia):
+    """
+    Requisições por segundo pelo handler ASGI, com ``concorrencia`` clientes no mesmo event loop
+    """
+    client = AsyncClient(headers={'host': HOST})
+
+    async def cliente(quantidade):
+        for _ in range(quantidade):
+            resposta = await client.get(url)
+            if resposta.status_code != 200:
+                raise CommandError(f'{url}: {resposta.status_code}')
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(quantidade) for quantidade in dividir(requisicoes, concorrencia)))
+    return requisicoes / (time.perf_counter() - inicio)
+
+
+class Command(BaseCommand):
+    help = ('Compara, em requisições por segundo com clientes simultâneos, as consultas da portaria '
+            '(placa, documento e visitas abertas) pelas views síncronas sob WSGI e ASGI e pelas views '
+            'async sob ASGI, com os dados do banco atual')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=1000,
+                            help='Requisições por medição')
+        parser.add_argument('--concorrencia', type=int, default=20,
+                            help='Clientes simultâneos')
+
+    def handle(self, *args, **options):
+        requisicoes = options['requisicoes']
+        concorrencia = options['concorrencia']
+        if requisicoes < 1 or concorrencia < 1:
+            raise CommandError('Informe números positivos')
+
+        veiculo = Veiculo.objects.order_by('-id').first()
+        morador = Morador.objects.filter(documento_chave__isnull=False).order_by('-id').first()
+        if veiculo is None or morador is None:
+            raise CommandError('Cadastre ao menos um veículo e um morador com documento')
+
+        consultas = (
+            ('Placa', f"{reverse('veiculo-list')}?{urlencode({'placa': veiculo.placa})}",
+             f"{reverse('async-veiculo')}?{urlencode({'placa': veiculo.placa})}"),
+            ('Documento', f"{reverse('morador-list')}?{urlencode({'documento': morador.documento})}",
+             f"{reverse('async-morador')}?{urlencode({'documento': morador.documento})}"),
+            ('Dentro', reverse('visitantes-dentro'), reverse('async-dentro')),
+        )
+
+        for nome, url_sincrona, url_async in consultas:
+            # Primeira leitura fora da medição: conferência das respostas e caches aquecidos
+            iguais = conteudo(Client(HTTP_HOST=HOST).get(url_sincrona)) == conteudo(
+                asyncio.run(AsyncClient(headers={'host': HOST}).get(url_async)))
+
+            wsgi = medir_wsgi(url_sincrona, requisicoes, concorrencia)
+            asgi_sincrona = asyncio.run(medir_asgi(url_sincrona, requisicoes, concorrencia))
+            asgi_async = asyncio.run(medir_asgi(url_async, requisicoes, concorrencia))
+            self.stdout.write(f'{nome:<10} WSGI síncrona {wsgi:>8,.0f} req/s  '
+                              f'ASGI síncrona {asgi_sincrona:>8,.0f} req/s  '
+                              f'ASGI async {asgi_async:>8,.0f} req/s  '
+                              f'({asgi_async / wsgi:.1f}x WSGI, {"iguais" if iguais else "DIFERENTES"})')
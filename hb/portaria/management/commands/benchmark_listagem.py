@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portaria.models import Veiculo, Morador, Residencia, Visitantes
+from portaria.serializers import (LeituraRapida,
+                                  VeiculoSerializer,
+                                  MoradorSerializer,
+                                  ResidenciaSerializer,
+                                  VisitanteSerializer)
+
+# Consultas das listagens, como nos viewsets
+LISTAGENS = (
+    ('Veículos', Veiculo.objects.all(), VeiculoSerializer),
+    ('Moradores', Morador.objects.prefetch_related('veiculos'), MoradorSerializer),
+    ('Residências', Residencia.objects.prefetch_related('moradores'), ResidenciaSerializer),
+    ('Visitantes', Visitantes.objects.all(), VisitanteSerializer),
+)
+
+
+def medir(funcao, repeticoes):
+    """
+    Menor tempo de ``repeticoes`` execuções e o resultado da última
+    """
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempo = time.perf_counter() - inicio
+        melhor = tempo if melhor is None else min(melhor, tempo)
+    return melhor, resultado
+
+
+class Command(BaseCommand):
+    help = ('Compara, em linhas por segundo, a listagem pelo ModelSerializer e pela leitura rápida (values()), '
+            'com os dados do banco atual')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=5000,
+                            help='Linhas lidas de cada tabela')
+        parser.add_argument('--repeticoes', type=int, default=3,
+                            help='Medições por listagem; vale a mais rápida')
+
+    def handle(self, *args, **options):
+        linhas = options['linhas']
+        repeticoes = options['repeticoes']
+
+        for nome, queryset, serializer_class in LISTAGENS:
+            queryset = queryset.order_by('-pk')[:linhas]
+            leitura = LeituraRapida.para(serializer_class)
+
+            tempo_serializer, esperado = medir(lambda: serializer_class(list(queryset), many=True).data, repeticoes)
+            if not esperado:
+                self.stdout.write(f'{nome:<12} sem dados')
+                continue
+            tempo_rapido, obtido = medir(lambda: leitura.representar(list(leitura.consulta(queryset))), repeticoes)
+
+            quantidade = len(esperado)
+            iguais = 'iguais' if [dict(item) for item in esperado] == obtido else 'DIFERENTES'
+            self.stdout.write(f'{nome:<12} {quantidade:>7} linhas  '
+                              f'serializer {quantidade / tempo_serializer:>10,.0f} linhas/s  '
+                              f'rápida {quantidade / tempo_rapido:>10,.0f} linhas/s  '
+                              f'({tempo_serializer / tempo_rapido:.1f}x, {iguais})')
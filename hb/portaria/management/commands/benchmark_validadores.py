@@ -0,0 +1,78 @@
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from portaria.constants import DOCUMENTO
+from portaria.utils import (configure_validation_cache, validate_document, is_phone_number_valid,
+                            is_license_plate_valid)
+
+from . import _validadores_anteriores as anteriores
+
+# Valid sample for each DOCUMENTO code
+AMOSTRAS = {
+    1: '529.982.247-25',
+    2: '24.678.135-X',
+    3: 'V1234567-A',
+    4: '861.579.117-91',
+    5: '529.982.247-25',
+    6: 'FX123456',
+    7: '',
+    9: '123',
+}
+
+# Validador anterior de cada código; os tipos sem dígito verificador não eram validados
+VALIDADORES_ANTERIORES = {
+    1: anteriores.is_cic_valid,
+    2: anteriores.is_rg_valid,
+    3: anteriores.is_rne_valid,
+    4: anteriores.is_cnh_valid,
+    5: anteriores.is_cic_valid,
+}
+
+
+class Command(BaseCommand):
+    help = ('Compara a latência por chamada dos validadores de documentos, celular e placa, '
+            'antes (funções por tipo) e depois do registro validate_document')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--numero', type=int, default=100000,
+                            help='Chamadas por medição')
+        parser.add_argument('--repeticoes', type=int, default=5,
+                            help='Medições por validador; vale a mais rápida')
+
+    def handle(self, *args, **options):
+        numero = options['numero']
+        repeticoes = options['repeticoes']
+
+        casos = []
+        for tipo, nome in DOCUMENTO:
+            anterior = VALIDADORES_ANTERIORES.get(tipo)
+            casos.append((nome,
+                          anterior and (lambda anterior=anterior, tipo=tipo: anterior(AMOSTRAS[tipo])),
+                          lambda tipo=tipo: validate_document(tipo, AMOSTRAS[tipo])))
+        casos.append(('Celular', lambda: anteriores.is_phone_number_valid('(11) 91234-5678'),
+                      lambda: is_phone_number_valid('(11) 91234-5678')))
+        casos.append(('Placa', lambda: anteriores.is_license_plate_valid('ABC1C34'),
+                      lambda: is_license_plate_valid('ABC1C34')))
+
+        # Mede as contas, não os acertos do cache de validação (PORTARIA_VALIDATION_CACHE_SIZE)
+        configure_validation_cache(0)
+        try:
+            self.comparar(casos, numero, repeticoes)
+        finally:
+            configure_validation_cache(getattr(settings, 'PORTARIA_VALIDATION_CACHE_SIZE', 0))
+
+    def comparar(self, casos, numero, repeticoes):
+        def medir(chamada):
+            return min(timeit.repeat(chamada, number=numero, repeat=repeticoes)) / numero
+
+        for nome, anterior, atual in casos:
+            tempo = medir(atual)
+            if anterior is None:
+                self.stdout.write(f'{nome:<15} {"-":>8} -> {tempo * 1e6:8.2f} µs/chamada')
+                continue
+            tempo_anterior = medir(anterior)
+            iguais = 'iguais' if anterior() == atual() else 'DIFERENTES'
+            self.stdout.write(f'{nome:<15} {tempo_anterior * 1e6:8.2f} -> {tempo * 1e6:8.2f} µs/chamada  '
+                              f'({tempo_anterior / tempo:.1f}x, {iguais})')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from portaria.models import Removido
+
+
+class Command(BaseCommand):
+    help = ('Apaga os registros de remoção mais antigos que o prazo de guarda (PORTARIA_SYNC_RETENTION_DAYS); '
+            'clientes que sincronizarem a partir de uma data anterior recebem a sincronização completa')
+
+    def handle(self, *args, **options):
+        apagados = Removido.limpar()
+        self.stdout.write(self.style.SUCCESS(f'{apagados} remoções apagadas'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from portaria.models import recontar_ocupacao
+
+
+class Command(BaseCommand):
+    help = ('Refaz os contadores de ocupação (visitantes dentro por residência e por tipo de visitante) '
+            'a partir das visitas abertas, informando as divergências encontradas')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conferir', action='store_true',
+                            help='Apenas informa as divergências, sem alterar os contadores')
+
+    def handle(self, *args, **options):
+        divergencias = recontar_ocupacao(gravar=not options['conferir'])
+        for contador, chave, gravado, contado in divergencias:
+            self.stdout.write(f'{contador} {chave}: {gravado} nos contadores, {contado} visitas abertas')
+
+        if not divergencias:
+            self.stdout.write(self.style.SUCCESS('Contadores de acordo com as visitas abertas'))
+        elif options['conferir']:
+            self.stdout.write(self.style.WARNING(f'{len(divergencias)} contadores divergentes'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(divergencias)} contadores corrigidos'))
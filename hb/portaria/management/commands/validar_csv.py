@@ -0,0 +1,157 @@
+import csv
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portaria.constants import DOCUMENTO
+from portaria.utils import validate_document, validate_many, is_license_plate_valid
+
+# Tipo de validação em lote (validate_many) por código de DOCUMENTO; os demais tipos são validados um a um
+TIPOS_EM_LOTE = {1: 'cic', 2: 'rg', 4: 'cnh', 5: 'cic'}
+
+# Código de DOCUMENTO pelo número ou pelo nome, em maiúsculas
+CODIGOS_DOCUMENTO = {str(codigo): codigo for codigo, _ in DOCUMENTO}
+CODIGOS_DOCUMENTO.update({nome.upper(): codigo for codigo, nome in DOCUMENTO})
+
+
+def validar_linhas(linhas, colunas):
+    """
+    Valida um lote de linhas do CSV.
+
+    Parâmetros
+    ----------
+    linhas : list of (int, dict)
+        Número da linha no arquivo e os valores da linha por coluna.
+    colunas : dict
+        Nome da coluna no CSV para 'documento', 'tipo_documento', 'celular' e 'placa';
+        colunas ausentes (None) não são validadas.
+
+    Retorna
+    -------
+    list of (int, dict, list):
+        As linhas rejeitadas, com os motivos da rejeição.
+    """
+    motivos = [[] for _ in linhas]
+
+    coluna = colunas['documento']
+    if coluna:
+        coluna_tipo = colunas['tipo_documento']
+        por_tipo = {}
+        for i, (_, linha) in enumerate(linhas):
+            documento = (linha.get(coluna) or '').strip()
+            if not documento:
+                continue
+            tipo = linha.get(coluna_tipo, '') if coluna_tipo else '1'
+            tipo = CODIGOS_DOCUMENTO.get((tipo or '').strip().upper())
+            if tipo is None:
+                motivos[i].append('tipo de documento inválido')
+            else:
+                por_tipo.setdefault(tipo, []).append((i, documento))
+
+        for tipo, documentos in por_tipo.items():
+            if tipo in TIPOS_EM_LOTE:
+                validos, _ = validate_many(TIPOS_EM_LOTE[tipo], [documento for _, documento in documentos])
+                validos = validos.tolist()
+            else:
+                validos = [validate_document(tipo, documento) for _, documento in documentos]
+            for (i, _), valido in zip(documentos, validos):
+                if not valido:
+                    motivos[i].append('documento inválido')
+
+    coluna = colunas['celular']
+    if coluna:
+        # O celular é obrigatório no cadastro do morador: em branco é rejeitado, ao contrário
+        # do documento e da placa, que são opcionais
+        celulares = [(linha.get(coluna) or '').strip() for _, linha in linhas]
+        _, falhas = validate_many('phone', celulares)
+        for i, (celular, falha) in enumerate(zip(celulares, falhas)):
+            if not celular:
+                motivos[i].append('celular ausente')
+            elif falha:
+                motivos[i].append('celular inválido')
+
+    coluna = colunas['placa']
+    if coluna:
+        for i, (_, linha) in enumerate(linhas):
+            placa = (linha.get(coluna) or '').strip()
+            if placa and not is_license_plate_valid(placa):
+                motivos[i].append('placa inválida')
+
+    return [(numero, linha, m) for (numero, linha), m in zip(linhas, motivos) if m]
+
+
+class Command(BaseCommand):
+    help = ('Valida documentos, celulares e placas de um CSV sem carregá-lo inteiro na memória, '
+            'usando um processo por núcleo, e grava as linhas rejeitadas em outro CSV')
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='CSV a validar')
+        parser.add_argument('--rejeitados', default=None,
+                            help='CSV com as linhas rejeitadas (padrão: <arquivo>.rejeitados.csv)')
+        parser.add_argument('--delimitador', default=',',
+                            help='Separador de colunas do CSV')
+        parser.add_argument('--encoding', default='utf-8-sig',
+                            help='Codificação do CSV')
+        parser.add_argument('--coluna-documento', default='documento')
+        parser.add_argument('--coluna-tipo-documento', default='tipo_documento',
+                            help='Código ou nome do DOCUMENTO; sem essa coluna os documentos são tratados como CPF')
+        parser.add_argument('--coluna-celular', default='celular',
+                            help='Obrigatório: celular em branco é rejeitado; documento e placa em branco, não')
+        parser.add_argument('--coluna-placa', default='placa')
+        parser.add_argument('--processos', type=int, default=os.cpu_count(),
+                            help='Processos de validação (padrão: número de núcleos)')
+        parser.add_argument('--lote', type=int, default=5000,
+                            help='Linhas enviadas a cada processo por vez')
+
+    def handle(self, *args, **options):
+        arquivo = options['arquivo']
+        rejeitados = options['rejeitados'] or f'{os.path.splitext(arquivo)[0]}.rejeitados.csv'
+        processos = max(options['processos'] or 1, 1)
+        lote = max(options['lote'], 1)
+
+        try:
+            entrada = open(arquivo, newline='', encoding=options['encoding'])
+        except OSError as e:
+            raise CommandError(f'Não foi possível abrir {arquivo}: {e}')
+
+        with entrada, open(rejeitados, 'w', newline='', encoding='utf-8') as saida:
+            leitor = csv.DictReader(entrada, delimiter=options['delimitador'])
+            cabecalho = leitor.fieldnames or []
+            colunas = {
+                'documento': options['coluna_documento'],
+                'tipo_documento': options['coluna_tipo_documento'],
+                'celular': options['coluna_celular'],
+                'placa': options['coluna_placa'],
+            }
+            colunas = {nome: coluna if coluna in cabecalho else None for nome, coluna in colunas.items()}
+            if not any(colunas.values()):
+                raise CommandError('O CSV não tem nenhuma das colunas a validar')
+
+            escritor = csv.DictWriter(saida, fieldnames=['linha', *cabecalho, 'motivos'],
+                                      delimiter=options['delimitador'], extrasaction='ignore')
+            escritor.writeheader()
+
+            # A linha 1 é o cabeçalho
+            linhas = ((leitor.line_num, linha) for linha in leitor)
+            total = total_rejeitados = 0
+
+            # No máximo dois lotes por processo em andamento, para a memória não crescer com o arquivo
+            with ProcessPoolExecutor(max_workers=processos) as executor:
+                pendentes = deque()
+                while True:
+                    while len(pendentes) < 2 * processos:
+                        linhas_do_lote = list(islice(linhas, lote))
+                        if not linhas_do_lote:
+                            break
+                        total += len(linhas_do_lote)
+                        pendentes.append(executor.submit(validar_linhas, linhas_do_lote, colunas))
+                    if not pendentes:
+                        break
+                    for numero, linha, motivos in pendentes.popleft().result():
+                        escritor.writerow({**linha, 'linha': numero, 'motivos': '; '.join(motivos)})
+                        total_rejeitados += 1
+
+        self.stdout.write(f'{total} linhas validadas, {total_rejeitados} rejeitadas em {rejeitados}')
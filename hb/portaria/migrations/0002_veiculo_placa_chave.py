@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:28
+
+import re
+
+from django.db import migrations, models
+
+
+def preencher_placa_chave(apps, schema_editor):
+    Veiculo = apps.get_model('portaria', 'Veiculo')
+    veiculos = []
+    for veiculo in Veiculo.objects.only('pk', 'placa').iterator():
+        placa = re.sub(r'[^A-Z0-9]', '', veiculo.placa.upper())
+        if len(placa) == 7 and placa[4].isdigit():
+            placa = placa[:4] + 'ABCDEFGHIJ'[int(placa[4])] + placa[5:]
+        veiculo.placa_chave = placa
+        veiculos.append(veiculo)
+    Veiculo.objects.bulk_update(veiculos, ['placa_chave'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='veiculo',
+            name='placa_chave',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='Placa no formato Mercosul, igual para ABC1234 e ABC1C34', max_length=7, verbose_name='Chave da placa'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(preencher_placa_chave, migrations.RunPython.noop),
+    ]
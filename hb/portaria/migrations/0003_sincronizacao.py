@@ -0,0 +1,82 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0002_veiculo_placa_chave'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Removido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome_do_modelo', models.CharField(help_text='Nome do modelo', max_length=100, verbose_name='Modelo')),
+                ('id_removido', models.BigIntegerField(verbose_name='Id removido')),
+                ('data_remocao', models.DateTimeField(auto_now_add=True, verbose_name='Data da remoção')),
+            ],
+            options={
+                'verbose_name': 'Remoção de dados',
+                'verbose_name_plural': 'Remoções de dados',
+            },
+        ),
+        migrations.AddField(
+            model_name='cor',
+            name='ultima_atualizacao',
+            field=models.DateTimeField(auto_now=True, verbose_name='Última atualização'),
+        ),
+        migrations.AddField(
+            model_name='marcamodelo',
+            name='ultima_atualizacao',
+            field=models.DateTimeField(auto_now=True, verbose_name='Última atualização'),
+        ),
+        migrations.AddField(
+            model_name='visitantes',
+            name='ultima_atualizacao',
+            field=models.DateTimeField(auto_now=True, verbose_name='Última atualização'),
+        ),
+        migrations.AlterField(
+            model_name='atualizado',
+            name='nome_do_modelo',
+            field=models.CharField(help_text='Nome do modelo', max_length=100, unique=True, verbose_name='Modelo'),
+        ),
+        migrations.AddIndex(
+            model_name='cor',
+            index=models.Index(fields=['ultima_atualizacao'], name='portaria_co_ultima__946355_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(fields=['ultima_atualizacao'], name='portaria_lo_ultima__2e6750_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marcamodelo',
+            index=models.Index(fields=['ultima_atualizacao'], name='portaria_ma_ultima__176d81_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='morador',
+            index=models.Index(fields=['ultima_atualizacao'], name='portaria_mo_ultima__828683_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quadra',
+            index=models.Index(fields=['ultima_atualizacao'], name='portaria_qu_ultima__1ab070_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='residencia',
+            index=models.Index(fields=['ultima_atualizacao'], name='portaria_re_ultima__8b2bff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='veiculo',
+            index=models.Index(fields=['ultima_atualizacao'], name='portaria_ve_ultima__bcbbe4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitantes',
+            index=models.Index(fields=['ultima_atualizacao'], name='portaria_vi_ultima__49ed52_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='removido',
+            index=models.Index(fields=['data_remocao'], name='portaria_re_data_re_06247a_idx'),
+        ),
+    ]
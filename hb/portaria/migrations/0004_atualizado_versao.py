@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0003_sincronizacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='atualizado',
+            name='versao',
+            field=models.PositiveBigIntegerField(default=0, help_text='Aumenta a cada alteração dos dados do modelo', verbose_name='Versão'),
+        ),
+    ]
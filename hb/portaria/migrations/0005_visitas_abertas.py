@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0004_atualizado_versao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitantes',
+            name='placa',
+            field=models.CharField(blank=True, help_text='Placa do veículo do visitante, se houver', max_length=7, null=True, verbose_name='Placa'),
+        ),
+        migrations.AddIndex(
+            model_name='visitantes',
+            index=models.Index(condition=models.Q(('data_saida__isnull', True)), fields=['residencia'], name='visitantes_abertas_residencia'),
+        ),
+        migrations.AddIndex(
+            model_name='visitantes',
+            index=models.Index(condition=models.Q(('data_saida__isnull', True)), fields=['documento'], name='visitantes_abertas_documento'),
+        ),
+        migrations.AddIndex(
+            model_name='visitantes',
+            index=models.Index(condition=models.Q(('data_saida__isnull', True)), fields=['placa'], name='visitantes_abertas_placa'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0005_visitas_abertas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visitantes',
+            index=models.Index(fields=['data_entrada', 'id'], name='visitantes_entrada_id'),
+        ),
+    ]
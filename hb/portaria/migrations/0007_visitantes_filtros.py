@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0006_visitantes_paginacao'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visitantes',
+            index=models.Index(fields=['residencia', 'data_entrada', 'id'], name='visitantes_residencia_entrada'),
+        ),
+        migrations.AddIndex(
+            model_name='visitantes',
+            index=models.Index(fields=['morador', 'data_entrada', 'id'], name='visitantes_morador_entrada'),
+        ),
+        migrations.AddIndex(
+            model_name='visitantes',
+            index=models.Index(fields=['tipo_visitante', 'data_entrada', 'id'], name='visitantes_tipo_entrada'),
+        ),
+        migrations.AddIndex(
+            model_name='visitantes',
+            index=models.Index(fields=['data_saida'], name='visitantes_saida'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+COLUNAS = ('id, tipo_visitante, nome, tipo_de_documento, documento, placa, residencia_id, morador_id, '
+           'data_entrada, data_saida, ultima_atualizacao')
+
+CRIAR_HISTORICO = (
+    f'CREATE VIEW portaria_visitas_historico AS '
+    f'SELECT {COLUNAS} FROM portaria_visitantes '
+    f'UNION ALL '
+    f'SELECT {COLUNAS} FROM portaria_visitaarquivada'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0007_visitantes_filtros'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitaHistorico',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('tipo_visitante', models.IntegerField(choices=[(1, 'Visitante'), (2, 'Prestador de serviço'), (3, 'Entregador'), (4, 'Fornecedor'), (5, 'Doméstica'), (6, 'Jardineiro'), (7, 'Poceiro'), (8, 'Corretores de imóveis'), (9, 'Provedor de internet'), (10, 'Engenheiro'), (11, 'Arquiteto'), (12, 'Pedreiro'), (13, 'Eletricista'), (14, 'Pintor'), (15, 'Marceneiro'), (16, 'Encanador'), (17, 'Vidraceiro'), (18, 'Serralheiro'), (19, 'Bombeiro'), (20, 'Policia'), (21, 'Ambulância'), (22, 'Oficial de Justiça'), (23, 'Outro')], verbose_name='Tipo de visitante')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome')),
+                ('tipo_de_documento', models.IntegerField(choices=[(1, 'CPF'), (2, 'RG'), (3, 'RNE'), (4, 'CNH'), (5, 'CIN'), (6, 'Passaporte'), (7, 'Sem documento'), (9, 'Outro')], verbose_name='Tipo de documento')),
+                ('documento', models.CharField(blank=True, max_length=20, null=True, verbose_name='Documento')),
+                ('placa', models.CharField(blank=True, max_length=7, null=True, verbose_name='Placa')),
+                ('data_entrada', models.DateTimeField(verbose_name='Data de entrada')),
+                ('data_saida', models.DateTimeField(blank=True, null=True, verbose_name='Data de saída')),
+                ('ultima_atualizacao', models.DateTimeField(verbose_name='Última atualização')),
+            ],
+            options={
+                'db_table': 'portaria_visitas_historico',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitaArquivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('tipo_visitante', models.IntegerField(choices=[(1, 'Visitante'), (2, 'Prestador de serviço'), (3, 'Entregador'), (4, 'Fornecedor'), (5, 'Doméstica'), (6, 'Jardineiro'), (7, 'Poceiro'), (8, 'Corretores de imóveis'), (9, 'Provedor de internet'), (10, 'Engenheiro'), (11, 'Arquiteto'), (12, 'Pedreiro'), (13, 'Eletricista'), (14, 'Pintor'), (15, 'Marceneiro'), (16, 'Encanador'), (17, 'Vidraceiro'), (18, 'Serralheiro'), (19, 'Bombeiro'), (20, 'Policia'), (21, 'Ambulância'), (22, 'Oficial de Justiça'), (23, 'Outro')], verbose_name='Tipo de visitante')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome')),
+                ('tipo_de_documento', models.IntegerField(choices=[(1, 'CPF'), (2, 'RG'), (3, 'RNE'), (4, 'CNH'), (5, 'CIN'), (6, 'Passaporte'), (7, 'Sem documento'), (9, 'Outro')], verbose_name='Tipo de documento')),
+                ('documento', models.CharField(blank=True, max_length=20, null=True, verbose_name='Documento')),
+                ('placa', models.CharField(blank=True, max_length=7, null=True, verbose_name='Placa')),
+                ('data_entrada', models.DateTimeField(verbose_name='Data de entrada')),
+                ('data_saida', models.DateTimeField(verbose_name='Data de saída')),
+                ('ultima_atualizacao', models.DateTimeField(verbose_name='Última atualização')),
+                ('morador', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='portaria.morador', verbose_name='Morador')),
+                ('residencia', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='portaria.residencia', verbose_name='Residência')),
+            ],
+            options={
+                'verbose_name': 'Visita arquivada',
+                'verbose_name_plural': 'Visitas arquivadas',
+                'indexes': [models.Index(fields=['data_entrada', 'id'], name='arquivo_entrada_id'), models.Index(fields=['residencia', 'data_entrada', 'id'], name='arquivo_residencia_entrada'), models.Index(fields=['morador', 'data_entrada', 'id'], name='arquivo_morador_entrada'), models.Index(fields=['tipo_visitante', 'data_entrada', 'id'], name='arquivo_tipo_entrada'), models.Index(fields=['data_saida'], name='arquivo_saida')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitasPorDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(verbose_name='Dia')),
+                ('tipo_visitante', models.IntegerField(choices=[(1, 'Visitante'), (2, 'Prestador de serviço'), (3, 'Entregador'), (4, 'Fornecedor'), (5, 'Doméstica'), (6, 'Jardineiro'), (7, 'Poceiro'), (8, 'Corretores de imóveis'), (9, 'Provedor de internet'), (10, 'Engenheiro'), (11, 'Arquiteto'), (12, 'Pedreiro'), (13, 'Eletricista'), (14, 'Pintor'), (15, 'Marceneiro'), (16, 'Encanador'), (17, 'Vidraceiro'), (18, 'Serralheiro'), (19, 'Bombeiro'), (20, 'Policia'), (21, 'Ambulância'), (22, 'Oficial de Justiça'), (23, 'Outro')], verbose_name='Tipo de visitante')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Total')),
+                ('residencia', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='portaria.residencia', verbose_name='Residência')),
+            ],
+            options={
+                'verbose_name': 'Visitas por dia',
+                'verbose_name_plural': 'Visitas por dia',
+                'constraints': [models.UniqueConstraint(fields=('dia', 'residencia', 'tipo_visitante'), name='visitas_por_dia_unica')],
+            },
+        ),
+        migrations.RunSQL(CRIAR_HISTORICO, 'DROP VIEW portaria_visitas_historico'),
+    ]
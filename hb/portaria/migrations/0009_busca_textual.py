@@ -0,0 +1,45 @@
+import unicodedata
+
+from django.db import migrations
+
+TOKENIZADOR = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+
+def normalizar(texto):
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+
+def criar_busca(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Morador = apps.get_model('portaria', 'Morador')
+    VisitaHistorico = apps.get_model('portaria', 'VisitaHistorico')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'CREATE VIRTUAL TABLE portaria_busca_morador USING fts5(nome, observacao, {TOKENIZADOR})')
+        cursor.execute(f'CREATE VIRTUAL TABLE portaria_busca_visitante USING fts5(nome, {TOKENIZADOR})')
+        cursor.executemany('INSERT INTO portaria_busca_morador (rowid, nome, observacao) VALUES (%s, %s, %s)',
+                           [(pk, normalizar(nome), normalizar(observacao)) for pk, nome, observacao
+                            in Morador.objects.values_list('pk', 'nome', 'observacao').iterator()])
+        cursor.executemany('INSERT INTO portaria_busca_visitante (rowid, nome) VALUES (%s, %s)',
+                           [(pk, normalizar(nome)) for pk, nome
+                            in VisitaHistorico.objects.values_list('pk', 'nome').iterator()])
+
+
+def remover_busca(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE portaria_busca_morador')
+        cursor.execute('DROP TABLE portaria_busca_visitante')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0008_arquivo_de_visitas'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_busca, remover_busca),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:00
+
+import re
+
+from django.db import migrations, models
+
+COLUNAS_ANTIGAS = ('id, tipo_visitante, nome, tipo_de_documento, documento, placa, residencia_id, morador_id, '
+                   'data_entrada, data_saida, ultima_atualizacao')
+COLUNAS = ('id, tipo_visitante, nome, tipo_de_documento, documento, documento_chave, placa, residencia_id, '
+           'morador_id, data_entrada, data_saida, ultima_atualizacao')
+
+
+def criar_historico(colunas):
+    return (f'CREATE VIEW portaria_visitas_historico AS '
+            f'SELECT {colunas} FROM portaria_visitantes '
+            f'UNION ALL '
+            f'SELECT {colunas} FROM portaria_visitaarquivada')
+
+
+def chave(documento):
+    return re.sub(r'[^A-Z0-9]', '', (documento or '').upper()) or None
+
+
+def preencher_documento_chave(apps, schema_editor):
+    # Moradores com o mesmo documento precisam ser unidos à mão antes da restrição de unicidade;
+    # o documento digitado não muda
+    Morador = apps.get_model('portaria', 'Morador')
+    moradores, usadas, repetidas = [], {}, []
+    for morador in Morador.objects.only('pk', 'tipo_documento', 'documento').order_by('pk').iterator():
+        morador.documento_chave = chave(morador.documento)
+        if morador.documento_chave:
+            par = (morador.tipo_documento, morador.documento_chave)
+            if par in usadas:
+                repetidas.append((usadas[par], morador.pk, morador.documento_chave))
+            usadas.setdefault(par, morador.pk)
+            moradores.append(morador)
+    if repetidas:
+        pares = ', '.join(f'moradores {a} e {b} ({documento})' for a, b, documento in repetidas[:20])
+        raise RuntimeError(f'Há mais de um morador com o mesmo documento ({pares}); '
+                           f'una-os antes de aplicar esta migração')
+    Morador.objects.bulk_update(moradores, ['documento_chave'], batch_size=1000)
+
+    for nome in ('Visitantes', 'VisitaArquivada'):
+        modelo = apps.get_model('portaria', nome)
+        visitas = []
+        for visita in modelo.objects.filter(documento__isnull=False).only('pk', 'documento').iterator():
+            visita.documento_chave = chave(visita.documento)
+            visitas.append(visita)
+        modelo.objects.bulk_update(visitas, ['documento_chave'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0009_busca_textual'),
+    ]
+
+    operations = [
+        # A view é recriada no fim com a nova coluna; o SQLite não altera tabelas usadas por views
+        migrations.RunSQL('DROP VIEW portaria_visitas_historico', criar_historico(COLUNAS_ANTIGAS)),
+        migrations.RemoveIndex(
+            model_name='visitantes',
+            name='visitantes_abertas_documento',
+        ),
+        migrations.AddField(
+            model_name='morador',
+            name='documento_chave',
+            field=models.CharField(blank=True, editable=False, help_text='Documento apenas com letras e números, para as buscas', max_length=20, null=True, verbose_name='Chave do documento'),
+        ),
+        migrations.AddField(
+            model_name='visitaarquivada',
+            name='documento_chave',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True, verbose_name='Chave do documento'),
+        ),
+        migrations.AddField(
+            model_name='visitantes',
+            name='documento_chave',
+            field=models.CharField(blank=True, editable=False, help_text='Documento apenas com letras e números, para as buscas', max_length=20, null=True, verbose_name='Chave do documento'),
+        ),
+        migrations.RunPython(preencher_documento_chave, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='visitaarquivada',
+            index=models.Index(fields=['documento_chave', 'data_entrada', 'id'], name='arquivo_documento_entrada'),
+        ),
+        migrations.AddIndex(
+            model_name='visitantes',
+            index=models.Index(fields=['documento_chave', 'data_entrada', 'id'], name='visitantes_documento_entrada'),
+        ),
+        migrations.AddIndex(
+            model_name='visitantes',
+            index=models.Index(condition=models.Q(('data_saida__isnull', True)), fields=['documento_chave'], name='visitantes_abertas_documento'),
+        ),
+        migrations.AddConstraint(
+            model_name='morador',
+            constraint=models.UniqueConstraint(fields=('tipo_documento', 'documento_chave'), name='morador_documento_unico', violation_error_message='Já existe um morador com este documento'),
+        ),
+        migrations.RunSQL(criar_historico(COLUNAS), 'DROP VIEW portaria_visitas_historico'),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+COLUNAS_ANTIGAS = ('id, tipo_visitante, nome, tipo_de_documento, documento, documento_chave, placa, residencia_id, '
+                   'morador_id, data_entrada, data_saida, ultima_atualizacao')
+COLUNAS = ('id, tipo_visitante, nome, tipo_de_documento, documento, documento_chave, placa, perfil_id, '
+           'residencia_id, morador_id, data_entrada, data_saida, ultima_atualizacao')
+
+SEM_DOCUMENTO = 7
+
+
+def criar_historico(colunas):
+    return (f'CREATE VIEW portaria_visitas_historico AS '
+            f'SELECT {colunas} FROM portaria_visitantes '
+            f'UNION ALL '
+            f'SELECT {colunas} FROM portaria_visitaarquivada')
+
+
+def criar_perfis(apps, schema_editor):
+    # Um perfil por documento já visto, com o nome e o tipo da visita mais recente
+    PerfilVisitante = apps.get_model('portaria', 'PerfilVisitante')
+    perfis = {}
+    for nome in ('VisitaArquivada', 'Visitantes'):
+        modelo = apps.get_model('portaria', nome)
+        visitas = (modelo.objects.filter(documento_chave__isnull=False).exclude(tipo_de_documento=SEM_DOCUMENTO)
+                   .order_by('data_entrada', 'id')
+                   .values_list('tipo_de_documento', 'documento_chave', 'documento', 'nome', 'tipo_visitante'))
+        for tipo_de_documento, chave, documento, nome_visitante, tipo_visitante in visitas.iterator():
+            perfis[tipo_de_documento, chave] = PerfilVisitante(
+                tipo_de_documento=tipo_de_documento, documento_chave=chave, documento=documento,
+                nome=nome_visitante, tipo_visitante=tipo_visitante)
+    PerfilVisitante.objects.bulk_create(perfis.values(), batch_size=1000)
+
+    with schema_editor.connection.cursor() as cursor:
+        for tabela in ('portaria_visitantes', 'portaria_visitaarquivada'):
+            cursor.execute(f'UPDATE {tabela} SET perfil_id = ('
+                           f'SELECT p.id FROM portaria_perfilvisitante p '
+                           f'WHERE p.documento_chave = {tabela}.documento_chave '
+                           f'AND p.tipo_de_documento = {tabela}.tipo_de_documento) '
+                           f'WHERE documento_chave IS NOT NULL')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0010_documento_chave'),
+    ]
+
+    operations = [
+        # A view é recriada no fim com a nova coluna; o SQLite não altera tabelas usadas por views
+        migrations.RunSQL('DROP VIEW portaria_visitas_historico', criar_historico(COLUNAS_ANTIGAS)),
+        migrations.CreateModel(
+            name='PerfilVisitante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_visitante', models.IntegerField(choices=[(1, 'Visitante'), (2, 'Prestador de serviço'), (3, 'Entregador'), (4, 'Fornecedor'), (5, 'Doméstica'), (6, 'Jardineiro'), (7, 'Poceiro'), (8, 'Corretores de imóveis'), (9, 'Provedor de internet'), (10, 'Engenheiro'), (11, 'Arquiteto'), (12, 'Pedreiro'), (13, 'Eletricista'), (14, 'Pintor'), (15, 'Marceneiro'), (16, 'Encanador'), (17, 'Vidraceiro'), (18, 'Serralheiro'), (19, 'Bombeiro'), (20, 'Policia'), (21, 'Ambulância'), (22, 'Oficial de Justiça'), (23, 'Outro')], help_text='Tipo usual do visitante', verbose_name='Tipo de visitante')),
+                ('nome', models.CharField(help_text='Informe o nome do visitante', max_length=100, verbose_name='Nome')),
+                ('tipo_de_documento', models.IntegerField(choices=[(1, 'CPF'), (2, 'RG'), (3, 'RNE'), (4, 'CNH'), (5, 'CIN'), (6, 'Passaporte'), (7, 'Sem documento'), (9, 'Outro')], help_text='Informe o tipo de documento', verbose_name='Tipo de documento')),
+                ('documento', models.CharField(help_text='Informe o documento do visitante', max_length=20, verbose_name='Documento')),
+                ('documento_chave', models.CharField(editable=False, help_text='Documento apenas com letras e números, para as buscas', max_length=20, verbose_name='Chave do documento')),
+                ('data_inclusao', models.DateTimeField(auto_now_add=True, verbose_name='Data de inclusão')),
+                ('ultima_atualizacao', models.DateTimeField(auto_now=True, verbose_name='Última atualização')),
+            ],
+            options={
+                'verbose_name': 'Perfil de visitante',
+                'verbose_name_plural': 'Perfis de visitantes',
+                'ordering': ['nome'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='perfilvisitante',
+            index=models.Index(fields=['ultima_atualizacao'], name='portaria_pe_ultima__750f0f_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='perfilvisitante',
+            constraint=models.UniqueConstraint(fields=('documento_chave', 'tipo_de_documento'), name='perfil_visitante_documento_unico'),
+        ),
+        migrations.AddField(
+            model_name='visitaarquivada',
+            name='perfil',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='portaria.perfilvisitante', verbose_name='Perfil'),
+        ),
+        migrations.AddField(
+            model_name='visitantes',
+            name='perfil',
+            field=models.ForeignKey(blank=True, help_text='Perfil do visitante frequente, se houver', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='visitas', to='portaria.perfilvisitante', verbose_name='Perfil'),
+        ),
+        migrations.RunPython(criar_perfis, migrations.RunPython.noop),
+        migrations.RunSQL(criar_historico(COLUNAS), 'DROP VIEW portaria_visitas_historico'),
+    ]
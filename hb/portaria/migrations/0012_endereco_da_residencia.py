@@ -0,0 +1,38 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:06
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def conferir_enderecos(apps, schema_editor):
+    # Residências repetidas precisam ser unidas à mão: cada uma tem moradores e visitas próprios
+    Residencia = apps.get_model('portaria', 'Residencia')
+    repetidas = (Residencia.objects.values('quadra_id', 'lote_id')
+                 .annotate(total=Count('id')).filter(total__gt=1).order_by('quadra_id', 'lote_id'))
+    if repetidas:
+        enderecos = ', '.join(f"quadra {r['quadra_id']} lote {r['lote_id']}" for r in repetidas[:20])
+        raise RuntimeError(f'Há mais de uma residência no mesmo endereço ({enderecos}); '
+                           f'una-as antes de aplicar esta migração')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0011_perfil_visitante'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(fields=['lote'], name='portaria_lo_lote_51261a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quadra',
+            index=models.Index(fields=['quadra'], name='portaria_qu_quadra_473ae5_idx'),
+        ),
+        migrations.RunPython(conferir_enderecos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='residencia',
+            constraint=models.UniqueConstraint(fields=('quadra', 'lote'), name='residencia_endereco_unico'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0012_endereco_da_residencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoDaPortaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(help_text='Chave do evento, gerada pelo equipamento (ex: um UUID)', max_length=64, unique=True, verbose_name='Chave')),
+                ('tipo', models.CharField(choices=[('entrada', 'Entrada'), ('saida', 'Saída')], max_length=10, verbose_name='Tipo')),
+                ('data', models.DateTimeField(help_text='Momento em que o evento aconteceu no equipamento', verbose_name='Data do evento')),
+                ('resposta', models.JSONField(help_text='Resultado enviado quando o evento foi aplicado', verbose_name='Resposta')),
+                ('data_recebimento', models.DateTimeField(auto_now_add=True, verbose_name='Data de recebimento')),
+            ],
+            options={
+                'verbose_name': 'Evento da portaria',
+                'verbose_name_plural': 'Eventos da portaria',
+                'indexes': [models.Index(fields=['data_recebimento'], name='portaria_ev_data_re_9bbeb2_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def contar_ocupacao(apps, schema_editor):
+    # Contadores iniciais a partir das visitas abertas
+    abertas = apps.get_model('portaria', 'Visitantes').objects.filter(data_saida__isnull=True).order_by()
+    for nome, campo in (('OcupacaoPorResidencia', 'residencia_id'), ('OcupacaoPorTipo', 'tipo_visitante')):
+        modelo = apps.get_model('portaria', nome)
+        contagem = abertas.values(campo).annotate(dentro=Count('id')).values_list(campo, 'dentro')
+        modelo.objects.bulk_create([modelo(**{campo: chave, 'dentro': dentro}) for chave, dentro in contagem])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0013_eventos_da_portaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacaoPorTipo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_visitante', models.IntegerField(choices=[(1, 'Visitante'), (2, 'Prestador de serviço'), (3, 'Entregador'), (4, 'Fornecedor'), (5, 'Doméstica'), (6, 'Jardineiro'), (7, 'Poceiro'), (8, 'Corretores de imóveis'), (9, 'Provedor de internet'), (10, 'Engenheiro'), (11, 'Arquiteto'), (12, 'Pedreiro'), (13, 'Eletricista'), (14, 'Pintor'), (15, 'Marceneiro'), (16, 'Encanador'), (17, 'Vidraceiro'), (18, 'Serralheiro'), (19, 'Bombeiro'), (20, 'Policia'), (21, 'Ambulância'), (22, 'Oficial de Justiça'), (23, 'Outro')], unique=True, verbose_name='Tipo de visitante')),
+                ('dentro', models.IntegerField(default=0, verbose_name='Visitantes dentro')),
+            ],
+            options={
+                'verbose_name': 'Ocupação por tipo de visitante',
+                'verbose_name_plural': 'Ocupação por tipo de visitante',
+            },
+        ),
+        migrations.CreateModel(
+            name='OcupacaoPorResidencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dentro', models.IntegerField(default=0, verbose_name='Visitantes dentro')),
+                ('residencia', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='portaria.residencia', verbose_name='Residência')),
+            ],
+            options={
+                'verbose_name': 'Ocupação por residência',
+                'verbose_name_plural': 'Ocupação por residência',
+            },
+        ),
+        migrations.RunPython(contar_ocupacao, migrations.RunPython.noop),
+    ]
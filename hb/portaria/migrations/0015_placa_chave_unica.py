@@ -0,0 +1,32 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:26
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def conferir_placas(apps, schema_editor):
+    # Veículos com a mesma placa nas grafias antiga e Mercosul precisam ser unidos à mão:
+    # cada um pode estar ligado a moradores diferentes
+    Veiculo = apps.get_model('portaria', 'Veiculo')
+    repetidas = (Veiculo.objects.values('placa_chave')
+                 .annotate(total=Count('id')).filter(total__gt=1).order_by('placa_chave'))
+    if repetidas:
+        placas = ', '.join(r['placa_chave'] for r in repetidas[:20])
+        raise RuntimeError(f'Há mais de um veículo com a mesma placa ({placas}); '
+                           f'una-os antes de aplicar esta migração')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0014_ocupacao'),
+    ]
+
+    operations = [
+        migrations.RunPython(conferir_placas, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='veiculo',
+            name='placa_chave',
+            field=models.CharField(editable=False, help_text='Placa no formato Mercosul, igual para ABC1234 e ABC1C34', max_length=7, unique=True, verbose_name='Chave da placa'),
+        ),
+    ]
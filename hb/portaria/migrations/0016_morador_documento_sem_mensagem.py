@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0015_placa_chave_unica'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='morador',
+            name='morador_documento_unico',
+        ),
+        migrations.AddConstraint(
+            model_name='morador',
+            constraint=models.UniqueConstraint(fields=('tipo_documento', 'documento_chave'), name='morador_documento_unico'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:43
+
+import re
+
+from django.db import migrations, models
+
+COLUNAS_ANTIGAS = ('id, tipo_visitante, nome, tipo_de_documento, documento, documento_chave, placa, perfil_id, '
+                   'residencia_id, morador_id, data_entrada, data_saida, ultima_atualizacao')
+COLUNAS = ('id, tipo_visitante, nome, tipo_de_documento, documento, documento_chave, placa, placa_chave, perfil_id, '
+           'residencia_id, morador_id, data_entrada, data_saida, ultima_atualizacao')
+
+# Segundo dígito da placa antiga -> letra da grafia Mercosul (utils.license_plate_key)
+LETRAS_MERCOSUL = 'ABCDEFGHIJ'
+
+
+def criar_historico(colunas):
+    return (f'CREATE VIEW portaria_visitas_historico AS '
+            f'SELECT {colunas} FROM portaria_visitantes '
+            f'UNION ALL '
+            f'SELECT {colunas} FROM portaria_visitaarquivada')
+
+
+def chave(placa):
+    placa = re.sub(r'[^A-Z0-9]', '', placa.upper())
+    if len(placa) == 7 and placa[4].isdigit():
+        placa = placa[:4] + LETRAS_MERCOSUL[int(placa[4])] + placa[5:]
+    return placa
+
+
+def preencher_placa_chave(apps, schema_editor):
+    # As placas já gravadas seguem como estão: as antigas visitas guardaram a chave no lugar da placa digitada
+    for nome in ('Visitantes', 'VisitaArquivada'):
+        modelo = apps.get_model('portaria', nome)
+        visitas = []
+        for visita in modelo.objects.filter(placa__isnull=False).only('pk', 'placa').iterator():
+            visita.placa_chave = chave(visita.placa)
+            visitas.append(visita)
+        modelo.objects.bulk_update(visitas, ['placa_chave'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portaria', '0016_morador_documento_sem_mensagem'),
+    ]
+
+    operations = [
+        # A view é recriada no fim com a nova coluna; o SQLite não altera tabelas usadas por views
+        migrations.RunSQL('DROP VIEW portaria_visitas_historico', criar_historico(COLUNAS_ANTIGAS)),
+        migrations.RemoveIndex(
+            model_name='visitantes',
+            name='visitantes_abertas_placa',
+        ),
+        migrations.AddField(
+            model_name='visitaarquivada',
+            name='placa_chave',
+            field=models.CharField(blank=True, editable=False, max_length=7, null=True, verbose_name='Chave da placa'),
+        ),
+        migrations.AddField(
+            model_name='visitantes',
+            name='placa_chave',
+            field=models.CharField(blank=True, editable=False, help_text='Placa no formato Mercosul, igual para ABC1234 e ABC1C34, para a saída', max_length=7, null=True, verbose_name='Chave da placa'),
+        ),
+        migrations.RunPython(preencher_placa_chave, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='visitantes',
+            index=models.Index(condition=models.Q(('data_saida__isnull', True)), fields=['placa_chave'], name='visitantes_abertas_placa'),
+        ),
+        migrations.RunSQL(criar_historico(COLUNAS), 'DROP VIEW portaria_visitas_historico'),
+    ]
@@ -1,19 +1,20 @@
-from django.db import models
-from datetime import datetime
-from .utils import is_license_plate_valid
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models.functions import TruncDate
+from django.dispatch import Signal
+from django.utils import timezone
+from datetime import datetime, timedelta
+from .constants import DOCUMENTO
+from .reference_data import reference_table
+from .utils import (address_part_key, document_key, is_license_plate_valid, license_plate_key,
+                    normalize_license_plate, parse_address, validate_document)
 from django.core.exceptions import ValidationError
 from django.conf import settings
 
-DOCUMENTO = [
-    (1, 'CPF'),
-    (2, 'RG'),
-    (3, 'RNE'),
-    (4, 'CNH'),
-    (5, 'CIN'),
-    (6, 'Passaporte'),
-    (7, 'Sem documento'),
-    (9, 'Outro')
-]
+# Formato das datas em to_dict(): o primeiro de DATETIME_INPUT_FORMATS
+FORMATO_DATA_HORA = settings.DATETIME_INPUT_FORMATS[0]
+
+# Código de "Sem documento" em DOCUMENTO
+SEM_DOCUMENTO = 7
 
 TIPO_DE_VEICULO = [
     (1, 'Carro'),
@@ -83,6 +84,7 @@ class Atualizado(models.Model):
     """
 
     nome_do_modelo = models.CharField(max_length=100,
+                                      unique=True,
                                       verbose_name='Modelo',
                                       help_text='Nome do modelo')
 
@@ -90,19 +92,41 @@ class Atualizado(models.Model):
                                               verbose_name='Última atualização',
                                               help_text='Data da última atualização')
 
+    versao = models.PositiveBigIntegerField(default=0,
+                                            verbose_name='Versão',
+                                            help_text='Aumenta a cada alteração dos dados do modelo')
+
     def __str__(self):
         return self.nome_do_modelo
 
     def to_dict(self):
         return {
             'nome_do_modelo': self.nome_do_modelo,
-            'ultima_atualizacao': self.ultima_atualizacao.strftime(settings.DATETIME_INPUT_FORMATS)
+            'ultima_atualizacao': self.ultima_atualizacao.strftime(FORMATO_DATA_HORA),
+            'versao': self.versao
         }
 
-    def to_list(self):
-        return [d.to_dict() for d in self.objects.all()]
+    @classmethod
+    def to_list(cls):
+        return [d.to_dict() for d in cls.objects.all()]
 
-    def precisa_atualizar(self, data_ultima_atualizacao):
+    @classmethod
+    def registrar(cls, nome_do_modelo):
+        """
+        Registra que os dados de um modelo foram alterados agora, aumentando a versão
+
+        Parâmetros
+        ----------
+        nome_do_modelo : str
+            Nome do modelo alterado (Model._meta.model_name)
+        """
+        alterados = cls.objects.filter(nome_do_modelo=nome_do_modelo).update(ultima_atualizacao=timezone.now(),
+                                                                             versao=models.F('versao') + 1)
+        if not alterados:
+            cls.objects.create(nome_do_modelo=nome_do_modelo, versao=1)
+
+    @classmethod
+    def precisa_atualizar(cls, data_ultima_atualizacao):
         """
         Verifica se os dados precisam ser atualizados
 
@@ -116,7 +140,7 @@ class Atualizado(models.Model):
         bool:
             True se os dados precisam ser atualizados, False caso contrário
         """
-        return self.objects.filter(ultima_atualizacao__lt=data_ultima_atualizacao).exists()
+        return cls.objects.filter(ultima_atualizacao__gt=data_ultima_atualizacao).exists()
 
     class Meta:
         verbose_name = 'Alteração de dados'
@@ -126,11 +150,67 @@ class Atualizado(models.Model):
         ]
 
 
+class Removido(models.Model):
+    """
+    Registro de exclusões, para que os clientes removam os dados na sincronização
+    """
+
+    nome_do_modelo = models.CharField(max_length=100,
+                                      verbose_name='Modelo',
+                                      help_text='Nome do modelo')
+
+    id_removido = models.BigIntegerField(verbose_name='Id removido')
+
+    data_remocao = models.DateTimeField(auto_now_add=True,
+                                        verbose_name='Data da remoção')
+
+    def __str__(self):
+        return f'{self.nome_do_modelo} {self.id_removido}'
+
+    @staticmethod
+    def inicio_da_guarda(agora=None):
+        """
+        Data a partir da qual as remoções são guardadas (PORTARIA_SYNC_RETENTION_DAYS); as anteriores
+        podem ter sido apagadas por ``limpar``
+
+        Parâmetros
+        ----------
+        agora : datetime
+            Momento de referência. Padrão: agora
+        """
+        dias = getattr(settings, 'PORTARIA_SYNC_RETENTION_DAYS', 90)
+        return (agora or timezone.now()) - timedelta(days=dias)
+
+    @classmethod
+    def limpar(cls):
+        """
+        Apaga as remoções anteriores ao prazo de guarda
+
+        Retorna
+        -------
+        int:
+            Quantidade de remoções apagadas
+        """
+        apagados, _ = cls.objects.filter(data_remocao__lt=cls.inicio_da_guarda()).delete()
+        return apagados
+
+    class Meta:
+        verbose_name = 'Remoção de dados'
+        verbose_name_plural = 'Remoções de dados'
+        indexes = [
+            models.Index(fields=['data_remocao']),
+        ]
+
+
 class Cor(models.Model):
     cor = models.CharField(max_length=50,
                            verbose_name='Cor',
                            help_text='Ex: Preto, branco, vermelho, etc.')
 
+    ultima_atualizacao = models.DateTimeField(auto_now=True,
+                                              editable=False,
+                                              verbose_name='Última atualização')
+
     def __str__(self):
         return self.cor
 
@@ -141,7 +221,9 @@ class Cor(models.Model):
         }
 
     @staticmethod
-    def to_list(query):
+    def to_list(query=None):
+        if query is None:
+            query = reference_table(Cor).all()
         return [cor.to_dict() for cor in query]
 
     @staticmethod
@@ -153,6 +235,7 @@ class Cor(models.Model):
         verbose_name_plural = 'Cores'
         indexes = [
             models.Index(fields=['cor']),
+            models.Index(fields=['ultima_atualizacao']),
         ]
 
 
@@ -166,6 +249,10 @@ class MarcaModelo(models.Model):
                                default=1,
                                help_text='Tipo de veículo')
 
+    ultima_atualizacao = models.DateTimeField(auto_now=True,
+                                              editable=False,
+                                              verbose_name='Última atualização')
+
     def __str__(self):
         return self.marca_modelo
 
@@ -178,13 +265,14 @@ class MarcaModelo(models.Model):
 
     @staticmethod
     def to_list():
-        return [marca_modelo.to_dict() for marca_modelo in MarcaModelo.objects.all()]
+        return [marca_modelo.to_dict() for marca_modelo in reference_table(MarcaModelo).all()]
 
     class Meta:
         verbose_name = 'Marca/Modelo'
         verbose_name_plural = 'Marcas/Modelos'
         indexes = [
             models.Index(fields=['marca_modelo']),
+            models.Index(fields=['ultima_atualizacao']),
         ]
 
 
@@ -194,6 +282,12 @@ class Veiculo(models.Model):
                              verbose_name='Placa',
                              help_text='Apenas números e letras')
 
+    placa_chave = models.CharField(max_length=7,
+                                   unique=True,
+                                   editable=False,
+                                   verbose_name='Chave da placa',
+                                   help_text='Placa no formato Mercosul, igual para ABC1234 e ABC1C34')
+
     tipo = models.IntegerField(choices=TIPO_DE_VEICULO,
                                verbose_name='Tipo',
                                help_text='Tipo de veículo')
@@ -225,7 +319,7 @@ class Veiculo(models.Model):
             'Modelo_id': self.modelo_id,
             'Ano': self.ano,
             'Cor_id': self.cor_id,
-            'Atualizado': self.ultima_atualizacao.strftime(settings.DATETIME_INPUT_FORMATS)
+            'Atualizado': self.ultima_atualizacao.strftime(FORMATO_DATA_HORA)
         }
 
     @classmethod
@@ -237,8 +331,27 @@ class Veiculo(models.Model):
         self.placa = self.placa.upper()
         if not is_license_plate_valid(self.placa):
             raise ValidationError('Placa inválida')
+        self.placa_chave = license_plate_key(self.placa)
+
+    def unique_error_message(self, model_class, unique_check):
+        if tuple(unique_check) == ('placa_chave',):
+            # ABC1234 e ABC1C34 são o mesmo veículo
+            return ValidationError('Já existe um veículo com esta placa', code='unique')
+        return super().unique_error_message(model_class, unique_check)
+
+    def validate_unique(self, exclude=None):
+        try:
+            super().validate_unique(exclude)
+        except ValidationError as e:
+            # A chave não é informada pelo usuário: a placa repetida é apontada uma vez, no campo placa
+            erros = e.update_error_dict({})
+            repetida = erros.pop('placa_chave', [])
+            if repetida and 'placa' not in erros:
+                erros['placa'] = repetida
+            raise ValidationError(erros)
 
     def save(self, *args, **kwargs):
+        self.placa_chave = license_plate_key(self.placa)
         self.full_clean()
         super(Veiculo, self).save(*args, **kwargs)
 
@@ -247,6 +360,7 @@ class Veiculo(models.Model):
         verbose_name_plural = 'Veículos'
         indexes = [
             models.Index(fields=['placa', '-ultima_atualizacao']),
+            models.Index(fields=['ultima_atualizacao']),
         ]
 
 
@@ -259,6 +373,13 @@ class Morador(models.Model):
                                  blank=True,
                                  verbose_name='Documento')
 
+    documento_chave = models.CharField(max_length=20,
+                                       null=True,
+                                       blank=True,
+                                       editable=False,
+                                       verbose_name='Chave do documento',
+                                       help_text='Documento apenas com letras e números, para as buscas')
+
     tipo_documento = models.IntegerField(choices=DOCUMENTO,
                                          default=2,
                                          verbose_name='Tipo de documento')
@@ -297,20 +418,31 @@ class Morador(models.Model):
             'E-mail': self.email,
             'Veículos': [v.placa for v in self.veiculos.all()],
             'Observação': self.observacao,
-            'Data de Inclusão': self.data_inclusao.strftime(settings.DATETIME_INPUT_FORMATS),
-            'Última Atualização': self.ultima_atualizacao.strftime(settings.DATETIME_INPUT_FORMATS)
+            'Data de Inclusão': self.data_inclusao.strftime(FORMATO_DATA_HORA),
+            'Última Atualização': self.ultima_atualizacao.strftime(FORMATO_DATA_HORA)
         }
 
     @classmethod
     def to_list(cls):
-        return [m.to_dict() for m in cls.objects.all()]
+        return [m.to_dict() for m in cls.objects.prefetch_related('veiculos')]
 
     def veiculos_list(self):
         return ', '.join([str(v) for v in self.veiculos.all()])
 
     veiculos_list.short_description = 'Veículos'
 
+    def clean(self):
+        if self.documento and not validate_document(self.tipo_documento, self.documento):
+            raise ValidationError({'documento': 'Documento inválido'})
+        self.documento_chave = document_key(self.documento)
+
+    def unique_error_message(self, model_class, unique_check):
+        if tuple(unique_check) == ('tipo_documento', 'documento_chave'):
+            return ValidationError('Já existe um morador com este documento', code='unique_together')
+        return super().unique_error_message(model_class, unique_check)
+
     def save(self, *args, **kwargs):
+        self.documento_chave = document_key(self.documento)
         self.full_clean()
         super(Morador, self).save(*args, **kwargs)
 
@@ -318,6 +450,13 @@ class Morador(models.Model):
         verbose_name = 'Morador'
         verbose_name_plural = 'Moradores'
         ordering = ['nome']
+        indexes = [
+            models.Index(fields=['ultima_atualizacao']),
+        ]
+        constraints = [
+            # Também é a chave natural da carga em lote; moradores sem documento não entram (NULL)
+            models.UniqueConstraint(fields=['tipo_documento', 'documento_chave'], name='morador_documento_unico'),
+        ]
 
 
 class Lote(models.Model):
@@ -336,17 +475,21 @@ class Lote(models.Model):
         return {
             'id': self.pk,
             'Lote': self.lote,
-            'Atualizado': self.ultima_atualizacao.strftime(settings.DATETIME_INPUT_FORMATS)
+            'Atualizado': self.ultima_atualizacao.strftime(FORMATO_DATA_HORA)
         }
 
     @classmethod
     def to_list(cls):
-        return [l.to_dict() for l in cls.objects.all()]
+        return [l.to_dict() for l in reference_table(cls).all()]
 
     class Meta:
         verbose_name = 'Lote'
         verbose_name_plural = 'Lotes'
         ordering = ['lote']
+        indexes = [
+            models.Index(fields=['lote']),
+            models.Index(fields=['ultima_atualizacao']),
+        ]
 
 
 class Quadra(models.Model):
@@ -365,12 +508,25 @@ class Quadra(models.Model):
         return {
             'id': self.pk,
             'Quadra': self.quadra,
-            'Atualizado': self.ultima_atualizacao.strftime(settings.DATETIME_INPUT_FORMATS)
+            'Atualizado': self.ultima_atualizacao.strftime(FORMATO_DATA_HORA)
         }
 
     @classmethod
     def to_list(cls):
-        return [q.to_dict() for q in cls.objects.all()]
+        return [q.to_dict() for q in reference_table(cls).all()]
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['quadra']),
+            models.Index(fields=['ultima_atualizacao']),
+        ]
+
+
+def _ids_por_chave(linhas, campo):
+    ids = {}
+    for linha in linhas:
+        ids.setdefault(address_part_key(getattr(linha, campo)), []).append(linha.pk)
+    return ids
 
 
 class Residencia(models.Model):
@@ -400,6 +556,263 @@ class Residencia(models.Model):
                                               editable=False,
                                               verbose_name='Última atualização')
 
+    def to_dict(self):
+        return {
+            'id': self.pk,
+            'Quadra': (reference_table(Quadra).get(self.quadra_id) or self.quadra).quadra,
+            'Lote': (reference_table(Lote).get(self.lote_id) or self.lote).lote,
+            'Moradores': [m.pk for m in self.moradores.all()],
+            'Água': self.agua,
+            'Saneamento': self.saneamento,
+            'Atualizado': self.ultima_atualizacao.strftime(FORMATO_DATA_HORA)
+        }
+
+    @classmethod
+    def to_list(cls):
+        return [r.to_dict() for r in cls.objects.prefetch_related('moradores')]
+
+    @classmethod
+    def anfitrioes(cls, placa=None, documento=None):
+        """
+        Residências e moradores ligados a uma placa ou ao documento de um morador, em uma única consulta
+
+        Parâmetros
+        ----------
+        placa : str
+            Placa de um veículo de morador, no formato antigo ou Mercosul
+        documento : str
+            Documento do morador
+
+        Retorna
+        -------
+        QuerySet:
+            Dicionários com residencia_id, quadra_id, lote_id, morador_id, morador_nome, morador_celular
+            e, na busca por placa, veiculo_id, veiculo_placa, veiculo_modelo_id e veiculo_cor_id
+        """
+        campos = {
+            'residencia_id': models.F('pk'),
+            'morador_id': models.F('moradores__id'),
+            'morador_nome': models.F('moradores__nome'),
+            'morador_celular': models.F('moradores__celular'),
+        }
+        if placa:
+            query = cls.objects.filter(moradores__veiculos__placa_chave=license_plate_key(placa))
+            campos.update({
+                'veiculo_id': models.F('moradores__veiculos__id'),
+                'veiculo_placa': models.F('moradores__veiculos__placa'),
+                'veiculo_modelo_id': models.F('moradores__veiculos__modelo_id'),
+                'veiculo_cor_id': models.F('moradores__veiculos__cor_id'),
+            })
+        else:
+            query = cls.objects.filter(moradores__documento_chave=document_key(documento))
+        return query.values('quadra_id', 'lote_id', **campos).order_by('moradores__nome')
+
+    @classmethod
+    def pelo_endereco(cls, endereco):
+        """
+        Residências de um endereço digitado na portaria ('Q3 L12', '3/12'...), sem consultar o banco
+
+        Quadras, lotes e residências vêm das cópias em memória (reference_data), com os mapas
+        chave do nome -> ids e (quadra, lote) -> residência refeitos só quando uma das tabelas muda.
+
+        Parâmetros
+        ----------
+        endereco : str
+            Quadra e lote, com ou sem os rótulos e os zeros à esquerda
+
+        Retorna
+        -------
+        list:
+            As residências do endereço (mais de uma só se houver quadras ou lotes com nomes
+            equivalentes, como '03' e '3'), ou None se o endereço não puder ser lido
+        """
+        partes = parse_address(endereco)
+        if partes is None:
+            return None
+        quadras = reference_table(Quadra).memo('endereco', lambda linhas: _ids_por_chave(linhas, 'quadra'))
+        lotes = reference_table(Lote).memo('endereco', lambda linhas: _ids_por_chave(linhas, 'lote'))
+        residencias = reference_table(cls).memo('endereco', lambda linhas: {(r.quadra_id, r.lote_id): r
+                                                                             for r in linhas})
+        return [residencias[quadra, lote]
+                for quadra in quadras.get(partes[0], ())
+                for lote in lotes.get(partes[1], ())
+                if (quadra, lote) in residencias]
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ultima_atualizacao']),
+        ]
+        constraints = [
+            # Também é a chave natural da carga em lote e a do endereço na portaria
+            models.UniqueConstraint(fields=['quadra', 'lote'], name='residencia_endereco_unico'),
+        ]
+
+
+class PerfilVisitante(models.Model):
+    """
+    Visitante frequente (diarista, jardineiro, entregador...), identificado pelo documento.
+
+    Na entrada, o perfil é encontrado pelo índice único de (tipo_de_documento, documento_chave)
+    e fornece nome, tipo e documento da visita, já validados quando o perfil foi criado.
+    """
+    tipo_visitante = models.IntegerField(choices=TIPO_DE_VISITANTE,
+                                         verbose_name='Tipo de visitante',
+                                         help_text='Tipo usual do visitante')
+    nome = models.CharField(max_length=100,
+                            verbose_name='Nome',
+                            help_text='Informe o nome do visitante')
+
+    tipo_de_documento = models.IntegerField(choices=DOCUMENTO,
+                                            verbose_name='Tipo de documento',
+                                            help_text='Informe o tipo de documento')
+
+    documento = models.CharField(max_length=20,
+                                 verbose_name='Documento',
+                                 help_text='Informe o documento do visitante')
+
+    documento_chave = models.CharField(max_length=20,
+                                       editable=False,
+                                       verbose_name='Chave do documento',
+                                       help_text='Documento apenas com letras e números, para as buscas')
+
+    data_inclusao = models.DateTimeField(auto_now_add=True,
+                                         verbose_name='Data de inclusão')
+
+    ultima_atualizacao = models.DateTimeField(auto_now=True,
+                                              verbose_name='Última atualização')
+
+    def __str__(self):
+        return self.nome
+
+    def to_dict(self):
+        return {
+            'id': self.pk,
+            'Tipo de Visitante': self.tipo_visitante,
+            'Nome': self.nome,
+            'Tipo de Documento': self.tipo_de_documento,
+            'Documento': self.documento,
+            'Data de Inclusão': self.data_inclusao.strftime(FORMATO_DATA_HORA),
+            'Última Atualização': self.ultima_atualizacao.strftime(FORMATO_DATA_HORA)
+        }
+
+    @classmethod
+    def to_list(cls):
+        return [p.to_dict() for p in cls.objects.all()]
+
+    @classmethod
+    def pelo_documento(cls, documento, tipo_de_documento=None):
+        """
+        Perfil de um documento, com ou sem pontuação, por uma busca no índice único
+
+        Parâmetros
+        ----------
+        documento : str
+            Documento do visitante
+        tipo_de_documento : int
+            Tipo do documento; sem ele, vale o perfil mais recente com esse número
+
+        Retorna
+        -------
+        PerfilVisitante:
+            O perfil, ou None se não houver
+        """
+        chave = document_key(documento)
+        if not chave:
+            return None
+        perfis = cls.objects.filter(documento_chave=chave)
+        if tipo_de_documento is not None:
+            perfis = perfis.filter(tipo_de_documento=tipo_de_documento)
+        return perfis.order_by('-ultima_atualizacao').first()
+
+    def clean(self):
+        if self.tipo_de_documento == SEM_DOCUMENTO:
+            raise ValidationError({'tipo_de_documento': 'O perfil exige um documento'})
+        if not validate_document(self.tipo_de_documento, self.documento):
+            raise ValidationError({'documento': 'Documento inválido'})
+        self.documento_chave = document_key(self.documento)
+
+    def unique_error_message(self, model_class, unique_check):
+        if tuple(unique_check) == ('documento_chave', 'tipo_de_documento'):
+            return ValidationError('Já existe um perfil com este documento', code='unique_together')
+        return super().unique_error_message(model_class, unique_check)
+
+    def save(self, *args, **kwargs):
+        self.documento_chave = document_key(self.documento) or ''
+        self.full_clean()
+        super(PerfilVisitante, self).save(*args, **kwargs)
+
+    class Meta:
+        verbose_name = 'Perfil de visitante'
+        verbose_name_plural = 'Perfis de visitantes'
+        ordering = ['nome']
+        indexes = [
+            models.Index(fields=['ultima_atualizacao']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['documento_chave', 'tipo_de_documento'],
+                                    name='perfil_visitante_documento_unico'),
+        ]
+
+
+# Enviado por registrar_saida(), cujo UPDATE não envia post_save;
+# argumentos: documento_chave, placa, data_saida e total (visitas fechadas)
+visitas_encerradas = Signal()
+
+
+class VisitantesQuerySet(models.QuerySet):
+    def abertas(self):
+        """
+        Visitas sem data de saída, isto é, quem está dentro agora. Usa os índices parciais em data_saida IS NULL.
+        """
+        return self.filter(data_saida__isnull=True)
+
+    def registrar_saida(self, documento=None, placa=None, quando=None):
+        """
+        Fecha, em um único UPDATE, as visitas abertas de um documento ou de uma placa, descontando-as
+        dos contadores de ocupação na mesma transação
+
+        Parâmetros
+        ----------
+        documento : str
+            Documento do visitante, como informado na entrada
+        placa : str
+            Placa do veículo, no formato antigo ou Mercosul
+        quando : datetime
+            Momento da saída, para saídas registradas antes (sem conexão); só fecha as visitas
+            que entraram até esse momento. Padrão: agora
+
+        Retorna
+        -------
+        int:
+            Número de visitas fechadas
+        """
+        documento_chave = document_key(documento) if documento else None
+        placa = license_plate_key(placa) if placa and not documento else None
+        if documento_chave:
+            visitas = self.abertas().filter(documento_chave=documento_chave)
+        elif placa:
+            visitas = self.abertas().filter(placa_chave=placa)
+        else:
+            return 0
+        agora = timezone.now()
+        if quando is not None:
+            visitas = visitas.filter(data_entrada__lte=quando)
+        with transaction.atomic():
+            # As poucas visitas abertas do documento ou da placa, travadas até o fim da transação
+            abertas = list(visitas.select_for_update().values_list('pk', 'residencia_id', 'tipo_visitante'))
+            fechadas = self.filter(pk__in=[pk for pk, _, _ in abertas]).update(data_saida=quando or agora,
+                                                                               ultima_atualizacao=agora)
+            variacoes = {}
+            for _, residencia_id, tipo_visitante in abertas:
+                variacoes[residencia_id, tipo_visitante] = variacoes.get((residencia_id, tipo_visitante), 0) - 1
+            ajustar_ocupacao(variacoes)
+        if fechadas:
+            # update() não envia post_save
+            Atualizado.registrar(Visitantes._meta.model_name)
+            visitas_encerradas.send(sender=Visitantes, documento_chave=documento_chave, placa=placa,
+                                    data_saida=quando or agora, total=fechadas)
+        return fechadas
+
 
 class Visitantes(models.Model):
     tipo_visitante = models.IntegerField(choices=TIPO_DE_VISITANTE,
@@ -419,6 +832,34 @@ class Visitantes(models.Model):
                                  verbose_name='Documento',
                                  help_text='Informe o documento do visitante')
 
+    documento_chave = models.CharField(max_length=20,
+                                       null=True,
+                                       blank=True,
+                                       editable=False,
+                                       verbose_name='Chave do documento',
+                                       help_text='Documento apenas com letras e números, para as buscas')
+
+    placa = models.CharField(max_length=7,
+                             null=True,
+                             blank=True,
+                             verbose_name='Placa',
+                             help_text='Placa do veículo do visitante, se houver')
+
+    placa_chave = models.CharField(max_length=7,
+                                   null=True,
+                                   blank=True,
+                                   editable=False,
+                                   verbose_name='Chave da placa',
+                                   help_text='Placa no formato Mercosul, igual para ABC1234 e ABC1C34, para a saída')
+
+    perfil = models.ForeignKey(PerfilVisitante,
+                               null=True,
+                               blank=True,
+                               on_delete=models.DO_NOTHING,
+                               related_name='visitas',
+                               verbose_name='Perfil',
+                               help_text='Perfil do visitante frequente, se houver')
+
     residencia = models.ForeignKey(Residencia,
                                    on_delete=models.DO_NOTHING,
                                    verbose_name='Residência',
@@ -437,3 +878,437 @@ class Visitantes(models.Model):
                                       blank=True,
                                       verbose_name='Data de saída',
                                       help_text='Informe a data de saída do visitante')
+
+    ultima_atualizacao = models.DateTimeField(auto_now=True,
+                                              editable=False,
+                                              verbose_name='Última atualização')
+
+    objects = VisitantesQuerySet.as_manager()
+
+    def to_dict(self):
+        return {
+            'id': self.pk,
+            'Tipo de Visitante': self.tipo_visitante,
+            'Nome': self.nome,
+            'Tipo de Documento': self.tipo_de_documento,
+            'Documento': self.documento,
+            'Placa': self.placa,
+            'Residência_id': self.residencia_id,
+            'Morador_id': self.morador_id,
+            'Morador': self.morador.nome,
+            'Data de Entrada': self.data_entrada.strftime(FORMATO_DATA_HORA),
+            'Data de Saída': self.data_saida.strftime(FORMATO_DATA_HORA) if self.data_saida else None
+        }
+
+    @classmethod
+    def to_list(cls):
+        return [v.to_dict() for v in cls.objects.select_related('morador')]
+
+    def clean(self):
+        # O documento igual ao do perfil já foi validado quando o perfil foi criado
+        if (self.documento and not self._documento_do_perfil()
+                and not validate_document(self.tipo_de_documento, self.documento)):
+            raise ValidationError({'documento': 'Documento inválido'})
+        if self.placa and not is_license_plate_valid(self.placa):
+            raise ValidationError({'placa': 'Placa inválida'})
+
+    def _documento_do_perfil(self):
+        """
+        Indica se o documento da visita é o do seu perfil, já validado quando o perfil foi criado
+
+        Retorna
+        -------
+        bool:
+            True se a visita tem perfil com a mesma chave e o mesmo tipo de documento
+        """
+        try:
+            perfil = self.perfil
+        except PerfilVisitante.DoesNotExist:
+            return False
+        return (perfil is not None and perfil.tipo_de_documento == self.tipo_de_documento
+                and perfil.documento_chave == document_key(self.documento))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        visita = super().from_db(db, field_names, values)
+        # Estado de ocupação como está no banco, para os contadores atualizados nos signals
+        if not visita.get_deferred_fields() & {'residencia_id', 'tipo_visitante', 'data_saida'}:
+            visita._ocupacao = visita.estado_de_ocupacao()
+        return visita
+
+    def estado_de_ocupacao(self):
+        """
+        Residência e tipo de visitante em que a visita conta como ocupação, ou None se ela já saiu
+        """
+        return (self.residencia_id, self.tipo_visitante) if self.data_saida is None else None
+
+    def save(self, *args, **kwargs):
+        # A placa fica como digitada (sem separadores); a saída procura pela chave, nas duas grafias
+        self.placa = normalize_license_plate(self.placa) if self.placa else None
+        self.placa_chave = license_plate_key(self.placa) if self.placa else None
+        self.documento_chave = document_key(self.documento)
+        self.full_clean()
+        # A visita e os contadores de ocupação (signals) são gravados juntos
+        with transaction.atomic():
+            super(Visitantes, self).save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ultima_atualizacao']),
+            # Paginação por cursor do histórico de visitas
+            models.Index(fields=['data_entrada', 'id'], name='visitantes_entrada_id'),
+            # Relatórios por residência, morador ou tipo em um período, já na ordem da paginação
+            models.Index(fields=['residencia', 'data_entrada', 'id'], name='visitantes_residencia_entrada'),
+            models.Index(fields=['morador', 'data_entrada', 'id'], name='visitantes_morador_entrada'),
+            models.Index(fields=['tipo_visitante', 'data_entrada', 'id'], name='visitantes_tipo_entrada'),
+            models.Index(fields=['data_saida'], name='visitantes_saida'),
+            models.Index(fields=['documento_chave', 'data_entrada', 'id'], name='visitantes_documento_entrada'),
+            # Visitas abertas (quem está dentro): poucas linhas, mesmo com anos de histórico
+            models.Index(fields=['residencia'],
+                         condition=models.Q(data_saida__isnull=True),
+                         name='visitantes_abertas_residencia'),
+            models.Index(fields=['documento_chave'],
+                         condition=models.Q(data_saida__isnull=True),
+                         name='visitantes_abertas_documento'),
+            models.Index(fields=['placa_chave'],
+                         condition=models.Q(data_saida__isnull=True),
+                         name='visitantes_abertas_placa'),
+        ]
+
+
+class VisitaArquivada(models.Model):
+    """
+    Visita encerrada há mais tempo que o horizonte de arquivamento (PORTARIA_ARQUIVO_HORIZONTE_DIAS).
+
+    As visitas são movidas de Visitantes mês a mês pelo comando ``arquivar_visitas``, com o mesmo id,
+    e continuam sendo lidas pela API através de VisitaHistorico.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    tipo_visitante = models.IntegerField(choices=TIPO_DE_VISITANTE, verbose_name='Tipo de visitante')
+    nome = models.CharField(max_length=100, verbose_name='Nome')
+    tipo_de_documento = models.IntegerField(choices=DOCUMENTO, verbose_name='Tipo de documento')
+    documento = models.CharField(max_length=20, null=True, blank=True, verbose_name='Documento')
+    documento_chave = models.CharField(max_length=20, null=True, blank=True, editable=False,
+                                       verbose_name='Chave do documento')
+    placa = models.CharField(max_length=7, null=True, blank=True, verbose_name='Placa')
+    placa_chave = models.CharField(max_length=7, null=True, blank=True, editable=False, verbose_name='Chave da placa')
+    perfil = models.ForeignKey(PerfilVisitante, null=True, blank=True, on_delete=models.DO_NOTHING,
+                               db_constraint=False, related_name='+', verbose_name='Perfil')
+    residencia = models.ForeignKey(Residencia, on_delete=models.DO_NOTHING, db_constraint=False,
+                                   related_name='+', verbose_name='Residência')
+    morador = models.ForeignKey(Morador, on_delete=models.DO_NOTHING, db_constraint=False,
+                                related_name='+', verbose_name='Morador')
+    data_entrada = models.DateTimeField(verbose_name='Data de entrada')
+    data_saida = models.DateTimeField(verbose_name='Data de saída')
+    ultima_atualizacao = models.DateTimeField(verbose_name='Última atualização')
+
+    # Colunas copiadas de Visitantes, na mesma ordem nas duas tabelas
+    COLUNAS = ('id', 'tipo_visitante', 'nome', 'tipo_de_documento', 'documento', 'documento_chave', 'placa',
+               'placa_chave', 'perfil_id', 'residencia_id', 'morador_id', 'data_entrada', 'data_saida',
+               'ultima_atualizacao')
+
+    # Ids por INSERT e DELETE, abaixo do limite de parâmetros por comando dos bancos
+    LOTE_DE_IDS = 500
+
+    @classmethod
+    def arquivar(cls, inicio, fim):
+        """
+        Move para o arquivo as visitas encerradas com entrada no período, somando-as em VisitasPorDia
+
+        As visitas são lidas (e travadas) uma vez; agregação, cópia e remoção usam esse mesmo conjunto de ids,
+        na mesma transação, sem os sinais de exclusão: a visita não foi apagada, apenas mudou de tabela.
+        Uma visita encerrada depois da leitura fica para o próximo arquivamento.
+
+        Parâmetros
+        ----------
+        inicio : datetime
+            Início do período (inclusive)
+        fim : datetime
+            Fim do período (exclusive)
+
+        Retorna
+        -------
+        int:
+            Quantidade de visitas arquivadas
+        """
+        encerradas = Visitantes.objects.filter(data_saida__isnull=False,
+                                               data_entrada__gte=inicio, data_entrada__lt=fim)
+        colunas = ', '.join(cls.COLUNAS)
+        with transaction.atomic():
+            linhas = list(encerradas.select_for_update()
+                          .values_list('pk', 'data_entrada', 'residencia_id', 'tipo_visitante'))
+            if not linhas:
+                return 0
+            por_dia = {}
+            for _, data_entrada, residencia_id, tipo_visitante in linhas:
+                chave = (timezone.localdate(data_entrada), residencia_id, tipo_visitante)
+                por_dia[chave] = por_dia.get(chave, 0) + 1
+            existentes = {
+                (v.dia, v.residencia_id, v.tipo_visitante): v
+                for v in VisitasPorDia.objects.filter(dia__gte=timezone.localdate(inicio),
+                                                      dia__lte=timezone.localdate(fim))
+            }
+            novos, alterados = [], []
+            for chave, total in por_dia.items():
+                if chave in existentes:
+                    existentes[chave].total += total
+                    alterados.append(existentes[chave])
+                else:
+                    dia, residencia_id, tipo_visitante = chave
+                    novos.append(VisitasPorDia(dia=dia, residencia_id=residencia_id,
+                                               tipo_visitante=tipo_visitante, total=total))
+            VisitasPorDia.objects.bulk_create(novos)
+            VisitasPorDia.objects.bulk_update(alterados, ['total'])
+
+            arquivadas = 0
+            ids = [pk for pk, _, _, _ in linhas]
+            with connection.cursor() as cursor:
+                for i in range(0, len(ids), cls.LOTE_DE_IDS):
+                    lote = ids[i:i + cls.LOTE_DE_IDS]
+                    condicao = f'id IN ({", ".join(["%s"] * len(lote))})'
+                    cursor.execute(f'INSERT INTO {cls._meta.db_table} ({colunas}) '
+                                   f'SELECT {colunas} FROM {Visitantes._meta.db_table} WHERE {condicao}', lote)
+                    cursor.execute(f'DELETE FROM {Visitantes._meta.db_table} WHERE {condicao}', lote)
+                    arquivadas += cursor.rowcount
+        return arquivadas
+
+    class Meta:
+        verbose_name = 'Visita arquivada'
+        verbose_name_plural = 'Visitas arquivadas'
+        # Os mesmos acessos do histórico em Visitantes
+        indexes = [
+            models.Index(fields=['data_entrada', 'id'], name='arquivo_entrada_id'),
+            models.Index(fields=['residencia', 'data_entrada', 'id'], name='arquivo_residencia_entrada'),
+            models.Index(fields=['morador', 'data_entrada', 'id'], name='arquivo_morador_entrada'),
+            models.Index(fields=['tipo_visitante', 'data_entrada', 'id'], name='arquivo_tipo_entrada'),
+            models.Index(fields=['data_saida'], name='arquivo_saida'),
+            models.Index(fields=['documento_chave', 'data_entrada', 'id'], name='arquivo_documento_entrada'),
+        ]
+
+
+class VisitaHistorico(models.Model):
+    """
+    Todas as visitas, recentes (Visitantes) e arquivadas (VisitaArquivada), somente para leitura.
+
+    É a view ``portaria_visitas_historico`` (UNION ALL das duas tabelas); filtros e ordenação são
+    aplicados a cada tabela com os seus índices e os resultados são intercalados, sem ordenação extra.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    tipo_visitante = models.IntegerField(choices=TIPO_DE_VISITANTE, verbose_name='Tipo de visitante')
+    nome = models.CharField(max_length=100, verbose_name='Nome')
+    tipo_de_documento = models.IntegerField(choices=DOCUMENTO, verbose_name='Tipo de documento')
+    documento = models.CharField(max_length=20, null=True, blank=True, verbose_name='Documento')
+    documento_chave = models.CharField(max_length=20, null=True, blank=True, editable=False,
+                                       verbose_name='Chave do documento')
+    placa = models.CharField(max_length=7, null=True, blank=True, verbose_name='Placa')
+    placa_chave = models.CharField(max_length=7, null=True, blank=True, editable=False, verbose_name='Chave da placa')
+    perfil = models.ForeignKey(PerfilVisitante, null=True, blank=True, on_delete=models.DO_NOTHING,
+                               related_name='+', verbose_name='Perfil')
+    residencia = models.ForeignKey(Residencia, on_delete=models.DO_NOTHING, related_name='+',
+                                   verbose_name='Residência')
+    morador = models.ForeignKey(Morador, on_delete=models.DO_NOTHING, related_name='+',
+                                verbose_name='Morador')
+    data_entrada = models.DateTimeField(verbose_name='Data de entrada')
+    data_saida = models.DateTimeField(null=True, blank=True, verbose_name='Data de saída')
+    ultima_atualizacao = models.DateTimeField(verbose_name='Última atualização')
+
+    class Meta:
+        managed = False
+        db_table = 'portaria_visitas_historico'
+
+
+class VisitasPorDia(models.Model):
+    """
+    Quantidade de visitas arquivadas por dia de entrada, residência e tipo de visitante
+    """
+    dia = models.DateField(verbose_name='Dia')
+    residencia = models.ForeignKey(Residencia, on_delete=models.DO_NOTHING, db_constraint=False,
+                                   related_name='+', verbose_name='Residência')
+    tipo_visitante = models.IntegerField(choices=TIPO_DE_VISITANTE, verbose_name='Tipo de visitante')
+    total = models.PositiveIntegerField(default=0, verbose_name='Total')
+
+    @classmethod
+    def resumo(cls, inicio=None, fim=None, residencia=None, tipo_visitante=None):
+        """
+        Visitas por dia, residência e tipo, somando o arquivo (já agregado) e as visitas em Visitantes
+
+        Parâmetros
+        ----------
+        inicio : datetime
+            Entradas a partir deste momento
+        fim : datetime
+            Entradas antes deste momento
+        residencia : int
+            Id da residência
+        tipo_visitante : int
+            Tipo de visitante
+
+        Retorna
+        -------
+        list:
+            Dicionários com dia, residencia, tipo_visitante e total, ordenados por dia
+        """
+        agregados = cls.objects.all()
+        recentes = Visitantes.objects.all()
+        if inicio:
+            agregados = agregados.filter(dia__gte=timezone.localdate(inicio))
+            recentes = recentes.filter(data_entrada__gte=inicio)
+        if fim:
+            agregados = agregados.filter(dia__lt=timezone.localdate(fim))
+            recentes = recentes.filter(data_entrada__lt=fim)
+        if residencia:
+            agregados = agregados.filter(residencia_id=residencia)
+            recentes = recentes.filter(residencia_id=residencia)
+        if tipo_visitante:
+            agregados = agregados.filter(tipo_visitante=tipo_visitante)
+            recentes = recentes.filter(tipo_visitante=tipo_visitante)
+
+        totais = {}
+        for linha in agregados.values('dia', 'residencia_id', 'tipo_visitante', 'total'):
+            chave = (linha['dia'], linha['residencia_id'], linha['tipo_visitante'])
+            totais[chave] = totais.get(chave, 0) + linha['total']
+        for linha in (recentes.annotate(dia=TruncDate('data_entrada'))
+                      .values('dia', 'residencia_id', 'tipo_visitante')
+                      .annotate(total=models.Count('id'))
+                      .order_by()):
+            chave = (linha['dia'], linha['residencia_id'], linha['tipo_visitante'])
+            totais[chave] = totais.get(chave, 0) + linha['total']
+        return [{'dia': dia, 'residencia': residencia, 'tipo_visitante': tipo, 'total': total}
+                for (dia, residencia, tipo), total in sorted(totais.items())]
+
+    class Meta:
+        verbose_name = 'Visitas por dia'
+        verbose_name_plural = 'Visitas por dia'
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'residencia', 'tipo_visitante'], name='visitas_por_dia_unica'),
+        ]
+
+
+class OcupacaoPorResidencia(models.Model):
+    """
+    Visitas abertas (visitantes dentro agora) de cada residência, mantidas a cada entrada e saída
+    """
+    residencia = models.OneToOneField(Residencia, on_delete=models.DO_NOTHING, db_constraint=False,
+                                      related_name='+', verbose_name='Residência')
+    dentro = models.IntegerField(default=0, verbose_name='Visitantes dentro')
+
+    class Meta:
+        verbose_name = 'Ocupação por residência'
+        verbose_name_plural = 'Ocupação por residência'
+
+
+class OcupacaoPorTipo(models.Model):
+    """
+    Visitas abertas (visitantes dentro agora) de cada tipo de visitante, mantidas a cada entrada e saída
+    """
+    tipo_visitante = models.IntegerField(choices=TIPO_DE_VISITANTE, unique=True, verbose_name='Tipo de visitante')
+    dentro = models.IntegerField(default=0, verbose_name='Visitantes dentro')
+
+    class Meta:
+        verbose_name = 'Ocupação por tipo de visitante'
+        verbose_name_plural = 'Ocupação por tipo de visitante'
+
+
+def _somar_ocupacao(modelo, campo, variacoes):
+    for chave, variacao in variacoes.items():
+        if not variacao or modelo.objects.filter(**{campo: chave}).update(dentro=models.F('dentro') + variacao):
+            continue
+        try:
+            with transaction.atomic():
+                modelo.objects.create(**{campo: chave, 'dentro': variacao})
+        except IntegrityError:
+            # Criado ao mesmo tempo por outra transação
+            modelo.objects.filter(**{campo: chave}).update(dentro=models.F('dentro') + variacao)
+
+
+def ajustar_ocupacao(variacoes):
+    """
+    Soma as variações aos contadores de ocupação, na transação em curso
+
+    Parâmetros
+    ----------
+    variacoes : dict
+        Variação (+1 na entrada, -1 na saída) por (residencia_id, tipo_visitante)
+    """
+    por_residencia, por_tipo = {}, {}
+    for (residencia_id, tipo_visitante), variacao in variacoes.items():
+        por_residencia[residencia_id] = por_residencia.get(residencia_id, 0) + variacao
+        por_tipo[tipo_visitante] = por_tipo.get(tipo_visitante, 0) + variacao
+    _somar_ocupacao(OcupacaoPorResidencia, 'residencia_id', por_residencia)
+    _somar_ocupacao(OcupacaoPorTipo, 'tipo_visitante', por_tipo)
+
+
+def recontar_ocupacao(gravar=True):
+    """
+    Confere os contadores de ocupação com a contagem das visitas abertas e, se ``gravar``, os refaz
+
+    Retorna
+    -------
+    list of (str, object, int, int)
+        Contador ('residencia' ou 'tipo_visitante'), chave, valor gravado e valor contado, de cada divergência
+    """
+    divergencias = []
+    with transaction.atomic():
+        for modelo, campo, nome in ((OcupacaoPorResidencia, 'residencia_id', 'residencia'),
+                                    (OcupacaoPorTipo, 'tipo_visitante', 'tipo_visitante')):
+            if gravar:
+                # Trava os contadores antes de contar, para que nenhuma entrada ou saída fique de fora
+                gravados = dict(modelo.objects.select_for_update().values_list(campo, 'dentro'))
+                modelo.objects.all().delete()
+            else:
+                gravados = dict(modelo.objects.values_list(campo, 'dentro'))
+            contados = dict(Visitantes.objects.abertas().order_by().values(campo)
+                            .annotate(dentro=models.Count('id')).values_list(campo, 'dentro'))
+            for chave in sorted(gravados.keys() | contados.keys()):
+                if gravados.get(chave, 0) != contados.get(chave, 0):
+                    divergencias.append((nome, chave, gravados.get(chave, 0), contados.get(chave, 0)))
+            if gravar:
+                modelo.objects.bulk_create([modelo(**{campo: chave, 'dentro': dentro})
+                                            for chave, dentro in contados.items()], batch_size=1000)
+        if gravar and divergencias:
+            # A leitura da ocupação usa a versão dos visitantes no ETag: os clientes precisam reler
+            Atualizado.registrar(Visitantes._meta.model_name)
+    return divergencias
+
+
+class EventoDaPortaria(models.Model):
+    """
+    Entrada ou saída enviada em lote por um equipamento da portaria, pela chave gerada no equipamento.
+
+    Um evento reenviado (a reconexão repete a fila) é reconhecido pela chave e recebe a mesma resposta,
+    sem criar outra visita.
+    """
+    ENTRADA = 'entrada'
+    SAIDA = 'saida'
+    TIPOS = [
+        (ENTRADA, 'Entrada'),
+        (SAIDA, 'Saída'),
+    ]
+
+    chave = models.CharField(max_length=64,
+                             unique=True,
+                             verbose_name='Chave',
+                             help_text='Chave do evento, gerada pelo equipamento (ex: um UUID)')
+
+    tipo = models.CharField(max_length=10,
+                            choices=TIPOS,
+                            verbose_name='Tipo')
+
+    data = models.DateTimeField(verbose_name='Data do evento',
+                                help_text='Momento em que o evento aconteceu no equipamento')
+
+    resposta = models.JSONField(verbose_name='Resposta',
+                                help_text='Resultado enviado quando o evento foi aplicado')
+
+    data_recebimento = models.DateTimeField(auto_now_add=True,
+                                            verbose_name='Data de recebimento')
+
+    def __str__(self):
+        return self.chave
+
+    class Meta:
+        verbose_name = 'Evento da portaria'
+        verbose_name_plural = 'Eventos da portaria'
+        indexes = [
+            models.Index(fields=['data_recebimento']),
+        ]
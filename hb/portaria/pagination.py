@@ -0,0 +1,30 @@
+"""
+Keyset (cursor) pagination for the portaria viewsets.
+
+Each page is read with ``WHERE <ordering field> < <cursor> ORDER BY ... LIMIT n`` over an
+indexed column, so any page costs the same as the first one, whatever the size of the table.
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class PaginacaoPorCursor(CursorPagination):
+    """
+    Cursor pagination whose ordering comes from the ``ordenacao`` attribute of the viewset.
+
+    The page size is ``PORTARIA_PAGE_SIZE`` and may be changed by the client with ``?tamanho=``,
+    up to ``PORTARIA_MAX_PAGE_SIZE``. The first field of the ordering must be indexed and should
+    change rarely; ties on it are resolved by DRF with an offset inside the cursor.
+    """
+    ordering = '-id'
+    page_size_query_param = 'tamanho'
+
+    def __init__(self):
+        self.page_size = getattr(settings, 'PORTARIA_PAGE_SIZE', 50)
+        self.max_page_size = getattr(settings, 'PORTARIA_MAX_PAGE_SIZE', 500)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordenacao', self.ordering)
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
@@ -0,0 +1,242 @@
+"""
+In-memory fuzzy index of vehicle plates, tolerant to OCR and typing errors.
+
+Plates are reduced to their license_plate_key, so that the old format and the Mercosul
+spelling of a plate are the same, folded so that characters often
+mistaken for each other (O/0, I/1, B/8, ...) become the same, and indexed by trigrams.
+A search collects the plates sharing trigrams with the query and ranks them by an
+edit distance where swapping confusable characters costs less than any other change.
+
+The index lives in the worker process: it is loaded from the database on first use and
+kept up to date by the Veiculo post_save/post_delete signals of this process. Changes made
+by other processes are picked up like those of the reference tables (reference_data): the
+version of Veiculo in Atualizado is checked at most every PORTARIA_REFERENCE_CACHE_TTL
+seconds, and the index is rebuilt when it changed. Queryset update() and bulk_create()
+skip the signals, so call reset_plate_index() after them.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .models import Atualizado, Veiculo
+from .utils import license_plate_key
+
+# Characters often mistaken for each other, by OCR or when typing
+CONFUSABLE = ('0ODQ', '1IL', '8B', '5S', '2Z', '6G', '7T', '4A')
+
+# Cost of replacing a character by a confusable one, instead of 1
+CONFUSION_COST = 0.5
+
+# Candidates ranked by edit distance, after being pre-selected by shared trigrams
+MAX_CANDIDATES = 100
+
+_GROUP = {char: group[0] for group in CONFUSABLE for char in group}
+_FOLD_TABLE = str.maketrans(_GROUP)
+
+
+def fold(plate):
+    """
+    Replace each confusable character by the first one of its group.
+    """
+    return plate.translate(_FOLD_TABLE)
+
+
+def trigrams(plate):
+    """
+    Trigrams of the plate, padded so that the first and last characters weigh as much as the others.
+    """
+    padded = f'^{plate}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def distance(a, b):
+    """
+    Edit distance between two plate keys where replacing a character by a confusable one
+    costs CONFUSION_COST.
+
+    Parameters
+    ----------
+    a, b : str
+        Plate keys.
+
+    Returns
+    -------
+    float
+        Cost of the cheapest sequence of insertions, deletions and replacements turning a into b.
+    """
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [float(i)]
+        group_a = _GROUP.get(char_a, char_a)
+        for j, char_b in enumerate(b, 1):
+            if char_a == char_b:
+                replace = 0.0
+            elif group_a == _GROUP.get(char_b, char_b):
+                replace = CONFUSION_COST
+            else:
+                replace = 1.0
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + replace))
+        previous = current
+    return previous[-1]
+
+
+class PlateIndex:
+    """
+    Trigram index of plates by vehicle id.
+    """
+
+    def __init__(self):
+        self._plates = {}
+        self._postings = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._plates)
+
+    def load(self, items):
+        """
+        Replace the contents of the index.
+
+        Parameters
+        ----------
+        items : iterable of (int, str)
+            Vehicle ids and plates.
+        """
+        plates = {}
+        postings = defaultdict(set)
+        for pk, plate in items:
+            plate = license_plate_key(plate)
+            plates[pk] = plate
+            for trigram in trigrams(fold(plate)):
+                postings[trigram].add(pk)
+        with self._lock:
+            self._plates = plates
+            self._postings = postings
+
+    def add(self, pk, plate):
+        """
+        Index the plate of a vehicle, replacing the previous one.
+        """
+        plate = license_plate_key(plate)
+        with self._lock:
+            self._discard(pk)
+            self._plates[pk] = plate
+            for trigram in trigrams(fold(plate)):
+                self._postings[trigram].add(pk)
+
+    def remove(self, pk):
+        """
+        Remove a vehicle from the index, if present.
+        """
+        with self._lock:
+            self._discard(pk)
+
+    def _discard(self, pk):
+        plate = self._plates.pop(pk, None)
+        if plate is None:
+            return
+        for trigram in trigrams(fold(plate)):
+            postings = self._postings.get(trigram)
+            if postings is not None:
+                postings.discard(pk)
+                if not postings:
+                    del self._postings[trigram]
+
+    def search(self, query, limit=10, max_distance=2.0):
+        """
+        Find the plates closest to a possibly mistyped one.
+
+        Parameters
+        ----------
+        query : str
+            Plate as typed or read by OCR.
+        limit : int
+            Maximum number of results.
+        max_distance : float
+            Results farther than this from the query are dropped.
+
+        Returns
+        -------
+        list of (int, str, float)
+            Vehicle id, plate key and distance, closest first.
+        """
+        query = license_plate_key(query)
+        if not query:
+            return []
+
+        with self._lock:
+            shared = Counter()
+            for trigram in trigrams(fold(query)):
+                shared.update(self._postings.get(trigram, ()))
+            candidates = [(pk, self._plates[pk]) for pk, _ in shared.most_common(MAX_CANDIDATES)]
+
+        results = []
+        for pk, plate in candidates:
+            cost = distance(query, plate)
+            if cost <= max_distance:
+                results.append((pk, plate, cost))
+        results.sort(key=lambda result: (result[2], result[1]))
+        return results[:limit]
+
+
+_plate_index = None
+_plate_index_version = None
+_plate_index_checked_at = None
+_plate_index_lock = threading.Lock()
+
+
+def get_plate_index():
+    """
+    The plate index of this process, loaded from the database on first use and rebuilt when
+    the vehicles were changed by another process.
+    """
+    global _plate_index, _plate_index_version, _plate_index_checked_at
+    ttl = getattr(settings, 'PORTARIA_REFERENCE_CACHE_TTL', 0)
+    checked_at = _plate_index_checked_at
+    if checked_at is not None and time.monotonic() - checked_at < ttl:
+        return _plate_index
+    with _plate_index_lock:
+        if _plate_index_checked_at != checked_at:
+            # Another thread checked the version meanwhile
+            return _plate_index
+        versao = (Atualizado.objects.filter(nome_do_modelo=Veiculo._meta.model_name)
+                  .values_list('versao', flat=True).first() or 0)
+        # The version is read before the plates: a change in between only causes another rebuild
+        if _plate_index is None or versao != _plate_index_version:
+            index = PlateIndex()
+            index.load(Veiculo.objects.values_list('pk', 'placa').iterator())
+            _plate_index = index
+            _plate_index_version = versao
+        _plate_index_checked_at = time.monotonic()
+    return _plate_index
+
+
+def reset_plate_index():
+    """
+    Drop the plate index so that the next search reloads it from the database.
+    """
+    global _plate_index, _plate_index_version, _plate_index_checked_at
+    with _plate_index_lock:
+        _plate_index = None
+        _plate_index_version = None
+        _plate_index_checked_at = None
+
+
+def index_vehicle(pk, plate):
+    """
+    Update the plate of a vehicle in the index, if it is already loaded.
+    """
+    index = _plate_index
+    if index is not None:
+        index.add(pk, plate)
+
+
+def unindex_vehicle(pk):
+    """
+    Remove a vehicle from the index, if it is already loaded.
+    """
+    index = _plate_index
+    if index is not None:
+        index.remove(pk)
@@ -0,0 +1,99 @@
+"""
+In-process copy of the small reference tables (Cor, MarcaModelo, Quadra, Lote, Residencia).
+
+Each worker process keeps the rows of these tables in memory together with the
+version of the model in Atualizado. Reads are served from memory; the version is
+checked again at most every PORTARIA_REFERENCE_CACHE_TTL seconds, and the table is
+reloaded only when it changed. Saves and deletes in the same process invalidate the
+copy right away through the model signals.
+"""
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+
+
+class ReferenceTable:
+    """
+    Rows of a model, by id and in the model ordering.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.versao = None
+        self.ultima_atualizacao = None
+        self._rows = []
+        self._by_pk = {}
+        self._memo = {}
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def all(self):
+        """
+        All the rows, as model instances that must not be modified.
+        """
+        self._refresh()
+        return self._rows
+
+    def get(self, pk):
+        """
+        The row with this id, or None.
+        """
+        self._refresh()
+        return self._by_pk.get(pk)
+
+    def memo(self, key, function):
+        """
+        Value computed from the rows by ``function(rows)``, kept until the table changes.
+        """
+        self._refresh()
+        memo = self._memo
+        if key not in memo:
+            memo[key] = function(self._rows)
+        return memo[key]
+
+    def invalidate(self):
+        """
+        Reload the rows on the next read.
+        """
+        self._checked_at = None
+
+    def _refresh(self):
+        ttl = getattr(settings, 'PORTARIA_REFERENCE_CACHE_TTL', 0)
+        checked_at = self._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < ttl:
+            return
+        with self._lock:
+            if self._checked_at != checked_at:
+                # Another thread refreshed the table meanwhile
+                return
+            Atualizado = apps.get_model('portaria', 'Atualizado')
+            versao, ultima_atualizacao = (Atualizado.objects
+                                          .filter(nome_do_modelo=self.model._meta.model_name)
+                                          .values_list('versao', 'ultima_atualizacao')
+                                          .first() or (0, None))
+            # The version is read before the rows: a change in between only causes another reload
+            if checked_at is None or versao != self.versao:
+                rows = list(self.model.objects.all())
+                self._rows = rows
+                self._by_pk = {row.pk: row for row in rows}
+                self._memo = {}
+                self.versao = versao
+                self.ultima_atualizacao = ultima_atualizacao
+            self._checked_at = time.monotonic()
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def reference_table(model):
+    """
+    The in-memory copy of a reference model in this process.
+    """
+    table = _tables.get(model)
+    if table is None:
+        with _tables_lock:
+            table = _tables.setdefault(model, ReferenceTable(model))
+    return table
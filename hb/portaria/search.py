@@ -0,0 +1,153 @@
+"""
+Full-text search of residents and visitors by name, on SQLite FTS5.
+
+Each searchable model has an FTS5 table whose rowid is the id of the row it indexes:
+portaria_busca_morador (nome, observacao) and portaria_busca_visitante (nome). The text is
+stored normalized, without accents and in lower case, so "João" and "joao" are the same word,
+and every word of the query with two or more characters is matched as a prefix (prefixes of
+two and three characters have their own index). Results are ranked by bm25.
+
+The tables are kept up to date by the Morador and Visitantes signals and live in the same
+database, so they follow the transactions of the rows they index. Visits moved to the
+archive keep their entries, and are found through VisitaHistorico. On other databases the
+search falls back to an unranked icontains filter.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Morador, VisitaHistorico
+
+RESIDENT_TABLE = 'portaria_busca_morador'
+VISITOR_TABLE = 'portaria_busca_visitante'
+
+# bm25 weight of each column of the resident table: a match in the name counts more than in the notes
+RESIDENT_WEIGHTS = (10.0, 1.0)
+
+# Best ranked visits among which the visitors are grouped
+VISITOR_CANDIDATES = 5000
+
+_WORD = re.compile(r'\w+')
+
+
+def normalize_text(text):
+    """
+    Text in lower case and without accents, as stored in the search tables.
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def match_expression(query):
+    """
+    FTS5 query matching every word of ``query`` as a prefix, or '' when there is no word.
+    Single characters (initials) are left out: they would match most of the table.
+    """
+    return ' '.join(f'"{word}"*' for word in _WORD.findall(normalize_text(query)) if len(word) > 1)
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def index_resident(pk, name, notes):
+    if is_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT OR REPLACE INTO {RESIDENT_TABLE} (rowid, nome, observacao) VALUES (%s, %s, %s)',
+                           [pk, normalize_text(name), normalize_text(notes)])
+
+
+def index_residents(rows):
+    """
+    Index many residents at once.
+
+    Parameters
+    ----------
+    rows : iterable of (int, str, str)
+        Id, name and notes of each resident.
+    """
+    if is_available():
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT OR REPLACE INTO {RESIDENT_TABLE} (rowid, nome, observacao) VALUES (%s, %s, %s)',
+                               [(pk, normalize_text(name), normalize_text(notes)) for pk, name, notes in rows])
+
+
+def unindex_resident(pk):
+    if is_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {RESIDENT_TABLE} WHERE rowid = %s', [pk])
+
+
+def index_visit(pk, name):
+    if is_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT OR REPLACE INTO {VISITOR_TABLE} (rowid, nome) VALUES (%s, %s)',
+                           [pk, normalize_text(name)])
+
+
+def unindex_visit(pk):
+    if is_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {VISITOR_TABLE} WHERE rowid = %s', [pk])
+
+
+def search_residents(query, limit=20):
+    """
+    Residents whose name or notes contain words starting with the words of ``query``.
+
+    Returns
+    -------
+    list of (int, float)
+        Id of the resident and relevance (higher is better), most relevant first.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+    if not is_available():
+        words = Q()
+        for word in _WORD.findall(query):
+            words &= Q(nome__icontains=word) | Q(observacao__icontains=word)
+        return [(pk, None) for pk in Morador.objects.filter(words).values_list('pk', flat=True)[:limit]]
+
+    weights = ', '.join(str(weight) for weight in RESIDENT_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid, bm25({RESIDENT_TABLE}, {weights}) AS score FROM {RESIDENT_TABLE} '
+                       f'WHERE {RESIDENT_TABLE} MATCH %s ORDER BY score LIMIT %s', [expression, limit])
+        return [(pk, round(-score, 4)) for pk, score in cursor.fetchall()]
+
+
+def search_visitors(query, limit=20):
+    """
+    Visitors whose name contains words starting with the words of ``query``.
+
+    A visitor is a normalized name, however many visits it has; each one comes with its
+    most recent visit among the first VISITOR_CANDIDATES matches.
+
+    Returns
+    -------
+    list of (int, float)
+        Id of the visit (in VisitaHistorico) and relevance (higher is better), most relevant first.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+    if not is_available():
+        words = Q()
+        for word in _WORD.findall(query):
+            words &= Q(nome__icontains=word)
+        visitors = {}
+        for pk, name in (VisitaHistorico.objects.filter(words).order_by('-id')
+                         .values_list('pk', 'nome')[:VISITOR_CANDIDATES]):
+            visitors.setdefault(normalize_text(name), pk)
+        return [(pk, None) for pk in list(visitors.values())[:limit]]
+
+    # The LIMIT keeps SQLite from flattening the subquery, where bm25() cannot be used
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT max(id), min(score) AS best FROM ('
+                       f'SELECT rowid AS id, nome, bm25({VISITOR_TABLE}) AS score FROM {VISITOR_TABLE} '
+                       f'WHERE {VISITOR_TABLE} MATCH %s ORDER BY score, rowid DESC LIMIT %s'
+                       f') GROUP BY nome ORDER BY best, max(id) DESC LIMIT %s',
+                       [expression, VISITOR_CANDIDATES, limit])
+        return [(pk, round(-score, 4)) for pk, score in cursor.fetchall()]
@@ -1,6 +1,14 @@
-from rest_framework import serializers
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError as DjangoValidationError
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import empty
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.settings import api_settings
 
 from .models import (
+    DOCUMENTO,
+    SEM_DOCUMENTO,
+    TIPO_DE_VISITANTE,
     Cor,
     MarcaModelo,
     Veiculo,
@@ -8,9 +16,45 @@ from .models import (
     Lote,
     Quadra,
     Residencia,
+    PerfilVisitante,
     Visitantes,
-
+    EventoDaPortaria,
 )
+from .reference_data import reference_table
+
+
+class ReferenciaRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Chave estrangeira para uma tabela de referência, validada na cópia em memória da tabela
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = reference_table(self.queryset.model).get(pk)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+
+class ValidacaoDoModeloMixin:
+    """
+    Erros de ``full_clean()`` no ``save()`` do modelo (documento, placa, unicidade) viram erros de validação
+    da API (400), em vez de erro interno
+    """
+
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        except DjangoValidationError as e:
+            erros = serializers.as_serializer_error(e)
+            if NON_FIELD_ERRORS in erros:
+                erros[api_settings.NON_FIELD_ERRORS_KEY] = erros.pop(NON_FIELD_ERRORS)
+            raise serializers.ValidationError(erros)
 
 
 class CorSerializer(serializers.ModelSerializer):
@@ -25,13 +69,16 @@ class MarcaModeloSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class VeiculoSerializer(serializers.ModelSerializer):
+class VeiculoSerializer(ValidacaoDoModeloMixin, serializers.ModelSerializer):
+    modelo = ReferenciaRelatedField(queryset=MarcaModelo.objects.all())
+    cor = ReferenciaRelatedField(queryset=Cor.objects.all())
+
     class Meta:
         model = Veiculo
         fields = '__all__'
 
 
-class MoradorSerializer(serializers.ModelSerializer):
+class MoradorSerializer(ValidacaoDoModeloMixin, serializers.ModelSerializer):
     class Meta:
         model = Morador
         fields = '__all__'
@@ -50,12 +97,207 @@ class QuadraSerializer(serializers.ModelSerializer):
 
 
 class ResidenciaSerializer(serializers.ModelSerializer):
+    quadra = ReferenciaRelatedField(queryset=Quadra.objects.all(), help_text='Informe a quadra')
+    lote = ReferenciaRelatedField(queryset=Lote.objects.all(), help_text='Informe o lote')
+
     class Meta:
         model = Residencia
         fields = '__all__'
 
 
-class VisitanteSerializer(serializers.ModelSerializer):
+class PerfilVisitanteSerializer(ValidacaoDoModeloMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PerfilVisitante
+        fields = '__all__'
+
+
+class VisitanteSerializer(ValidacaoDoModeloMixin, serializers.ModelSerializer):
     class Meta:
         model = Visitantes
         fields = '__all__'
+
+
+class EntradaSerializer(serializers.Serializer):
+    """
+    Dados da entrada de um visitante pela portaria, identificando o morador pela placa ou pelo documento.
+
+    Um visitante frequente é informado pelo ``perfil`` ou só pelo ``documento``; nome e tipo vêm do perfil.
+    """
+    placa = serializers.CharField(required=False, allow_blank=True,
+                                  help_text='Placa do veículo que chega, cadastrado para um morador')
+    morador_documento = serializers.CharField(required=False, allow_blank=True,
+                                              help_text='Documento do morador visitado')
+    residencia = serializers.IntegerField(required=False,
+                                          help_text='Residência, quando o morador tem mais de uma')
+    perfil = serializers.IntegerField(required=False,
+                                      help_text='Perfil do visitante frequente')
+    tipo_visitante = serializers.ChoiceField(choices=TIPO_DE_VISITANTE, required=False)
+    nome = serializers.CharField(max_length=100, required=False)
+    tipo_de_documento = serializers.ChoiceField(choices=DOCUMENTO, required=False)
+    documento = serializers.CharField(max_length=20, required=False, allow_blank=True, allow_null=True)
+
+    def validate(self, data):
+        if not data.get('placa') and not data.get('morador_documento'):
+            raise serializers.ValidationError('Informe a placa ou o documento do morador')
+        if not data.get('perfil') and (not data.get('documento') or data.get('tipo_de_documento') == SEM_DOCUMENTO):
+            # Sem perfil possível: o visitante é informado por inteiro
+            faltando = {campo: ['Este campo é obrigatório.']
+                        for campo in ('tipo_visitante', 'nome', 'tipo_de_documento') if campo not in data}
+            if faltando:
+                raise serializers.ValidationError(faltando)
+        return data
+
+
+class SaidaSerializer(serializers.Serializer):
+    """
+    Dados da saída pela portaria: as visitas abertas de um documento ou de uma placa
+    """
+    documento = serializers.CharField(max_length=20, required=False, allow_blank=True, allow_null=True,
+                                      help_text='Documento do visitante, como informado na entrada')
+    placa = serializers.CharField(required=False, allow_blank=True, allow_null=True,
+                                  help_text='Placa do veículo, no formato antigo ou Mercosul')
+
+    def validate(self, data):
+        if not data.get('documento') and not data.get('placa'):
+            raise serializers.ValidationError('Informe o documento ou a placa')
+        return data
+
+
+class EventoSerializer(serializers.Serializer):
+    """
+    Evento da fila de um equipamento da portaria; os demais campos são os de ``visitante/entrada/``
+    (entrada) ou de ``visitante/saida/`` (saída)
+    """
+    chave = serializers.CharField(max_length=64,
+                                  help_text='Chave do evento, gerada pelo equipamento (ex: um UUID)')
+    tipo = serializers.ChoiceField(choices=EventoDaPortaria.TIPOS)
+    data = serializers.DateTimeField(required=False,
+                                     help_text='Momento do evento no equipamento; padrão: agora')
+
+
+class LeituraRapida:
+    """
+    Representação de leitura de um ModelSerializer montada a partir de linhas de ``values_list()``,
+    sem instanciar os modelos nem passar pelos campos do DRF a cada linha.
+
+    Os conversores de cada campo são preparados uma vez por serializer: o valor da coluna para campos
+    simples e escolhas, o id para chaves estrangeiras, ISO 8601 para datas e a lista de ids das relações
+    ManyToMany, lidas em uma consulta por página. O resultado é o mesmo de ``serializer.data``.
+    """
+    _por_serializer = {}
+
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        modelo = serializer.Meta.model
+        # (nome, coluna, conversor) na ordem do serializer; coluna None para as relações ManyToMany
+        self.campos = []
+        self.m2m = []
+        for nome, campo in serializer.fields.items():
+            if campo.write_only:
+                continue
+            if isinstance(campo, ManyRelatedField):
+                self.m2m.append((nome, modelo._meta.get_field(campo.source)))
+                self.campos.append((nome, None, None))
+                continue
+            if isinstance(campo, PrimaryKeyRelatedField):
+                coluna = modelo._meta.get_field(campo.source).attname
+                conversor = None
+            elif isinstance(campo, serializers.DateTimeField):
+                coluna, conversor = campo.source, self._conversor_de_data_hora(campo)
+            elif isinstance(campo, serializers.DateField):
+                coluna, conversor = campo.source, campo.to_representation
+            elif isinstance(campo, (serializers.IntegerField, serializers.CharField, serializers.ChoiceField,
+                                    serializers.BooleanField, serializers.FloatField)):
+                coluna, conversor = campo.source, None
+            else:
+                coluna, conversor = campo.source, campo.to_representation
+            self.campos.append((nome, coluna, conversor))
+
+    @classmethod
+    def para(cls, serializer_class):
+        """
+        Leitura rápida de um serializer, preparada uma vez por processo
+        """
+        leitura = cls._por_serializer.get(serializer_class)
+        if leitura is None:
+            leitura = cls._por_serializer[serializer_class] = cls(serializer_class)
+        return leitura
+
+    @staticmethod
+    def _conversor_de_data_hora(campo):
+        formato = getattr(campo, 'format', empty)
+        if formato is empty:
+            formato = api_settings.DATETIME_FORMAT
+        if formato is None or formato.lower() != ISO_8601:
+            return campo.to_representation
+
+        def iso_8601(fuso):
+            def converter(valor):
+                texto = valor.astimezone(fuso).isoformat()
+                return texto[:-6] + 'Z' if texto.endswith('+00:00') else texto
+            return converter
+        # O fuso atual é lido uma vez por página, em representar()
+        iso_8601.por_fuso = True
+        return iso_8601
+
+    def consulta(self, queryset):
+        """
+        ``values()`` com as colunas da representação, mantendo filtros e ordenação
+        """
+        return queryset.prefetch_related(None).values(*(coluna for _, coluna, _ in self.campos if coluna))
+
+    def representar(self, linhas):
+        """
+        Lista de dicionários, um por linha de ``consulta()``, como ``serializer(many=True).data``
+        """
+        dados = self._converter(linhas)
+        if self.m2m and dados:
+            pks = [item['id'] for item in dados]
+            for nome, campo in self.m2m:
+                relacionados = {}
+                for pk, relacionado in self._consulta_relacionados(campo, pks):
+                    relacionados.setdefault(pk, []).append(relacionado)
+                for item in dados:
+                    item[nome] = relacionados.get(item['id'], [])
+        return dados
+
+    async def alistar(self, queryset):
+        """
+        ``representar(consulta(queryset))`` pelo ORM assíncrono, para as views async
+        """
+        dados = self._converter([linha async for linha in self.consulta(queryset)])
+        if self.m2m and dados:
+            pks = [item['id'] for item in dados]
+            for nome, campo in self.m2m:
+                relacionados = {}
+                async for pk, relacionado in self._consulta_relacionados(campo, pks):
+                    relacionados.setdefault(pk, []).append(relacionado)
+                for item in dados:
+                    item[nome] = relacionados.get(item['id'], [])
+        return dados
+
+    def _converter(self, linhas):
+        fuso = timezone.get_current_timezone()
+        campos = [(nome, coluna, conversor(fuso) if getattr(conversor, 'por_fuso', False) else conversor)
+                  for nome, coluna, conversor in self.campos]
+        dados = []
+        for linha in linhas:
+            item = {}
+            for nome, coluna, conversor in campos:
+                valor = linha[coluna] if coluna else None
+                item[nome] = valor if conversor is None or valor is None else conversor(valor)
+            dados.append(item)
+        return dados
+
+    @staticmethod
+    def _consulta_relacionados(campo, pks):
+        """
+        Pares (pk, id relacionado), na ordenação do modelo relacionado, como em ``objeto.campo.all()``
+        """
+        intermediaria = campo.remote_field.through
+        origem, destino = campo.m2m_field_name(), campo.m2m_reverse_field_name()
+        ordenacao = [f'-{destino}__{o[1:]}' if o.startswith('-') else f'{destino}__{o}'
+                     for o in campo.related_model._meta.ordering]
+        return (intermediaria.objects.filter(**{f'{origem}__in': pks})
+                .order_by(*ordenacao, f'{destino}_id')
+                .values_list(f'{origem}_id', f'{destino}_id'))
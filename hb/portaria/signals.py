@@ -0,0 +1,238 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save, m2m_changed
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .models import (Atualizado,
+                     Removido,
+                     Cor,
+                     MarcaModelo,
+                     Veiculo,
+                     Morador,
+                     Lote,
+                     Quadra,
+                     Residencia,
+                     PerfilVisitante,
+                     Visitantes,
+                     ajustar_ocupacao,
+                     visitas_encerradas)
+from .broadcast import RESIDENTS, VEHICLES, VISITS, broker
+from .plate_index import index_vehicle, unindex_vehicle
+from .reference_data import reference_table
+from .search import index_resident, index_residents, index_visit, unindex_resident, unindex_visit
+from .serializers import MoradorSerializer, VeiculoSerializer, VisitanteSerializer
+
+# Modelos enviados pela sincronização incremental
+MODELOS_SINCRONIZADOS = (Cor, MarcaModelo, Veiculo, Morador, Lote, Quadra, Residencia, PerfilVisitante, Visitantes)
+
+# Tabelas pequenas mantidas em memória (reference_data)
+MODELOS_DE_REFERENCIA = (Cor, MarcaModelo, Quadra, Lote, Residencia)
+
+# Relações ManyToMany que alteram o registro dono do campo
+RELACOES_M2M = ((Morador, 'veiculos'), (Residencia, 'moradores'))
+
+# Campo ManyToMany de cada tabela intermediária
+CAMPOS_M2M = {getattr(modelo, campo).through: campo for modelo, campo in RELACOES_M2M}
+
+# Enviado após gravações em lote (bulk_create), que não enviam post_save; argumento: instances
+carga_em_lote = Signal()
+
+# Canal, prefixo dos eventos e serializer dos modelos transmitidos em api/v1/eventos/
+MODELOS_TRANSMITIDOS = {
+    Visitantes: (VISITS, 'visita', VisitanteSerializer),
+    Veiculo: (VEHICLES, 'veiculo', VeiculoSerializer),
+    Morador: (RESIDENTS, 'morador', MoradorSerializer),
+}
+
+
+@receiver(post_save, sender=Veiculo)
+def indexar_placa(sender, instance, **kwargs):
+    pk, placa = instance.pk, instance.placa
+    transaction.on_commit(lambda: index_vehicle(pk, placa))
+
+
+@receiver(post_delete, sender=Veiculo)
+def remover_placa(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: unindex_vehicle(pk))
+
+
+@receiver(post_save, sender=Morador)
+def indexar_morador(sender, instance, **kwargs):
+    index_resident(instance.pk, instance.nome, instance.observacao)
+
+
+@receiver(post_delete, sender=Morador)
+def remover_morador_da_busca(sender, instance, **kwargs):
+    unindex_resident(instance.pk)
+
+
+@receiver(post_save, sender=Visitantes)
+def indexar_visitante(sender, instance, **kwargs):
+    index_visit(instance.pk, instance.nome)
+
+
+@receiver(post_delete, sender=Visitantes)
+def remover_visitante_da_busca(sender, instance, **kwargs):
+    unindex_visit(instance.pk)
+
+
+@receiver(pre_save, sender=Visitantes)
+def conferir_ocupacao_anterior(sender, instance, **kwargs):
+    # Visitas carregadas pelo ORM já trazem o estado do banco (Visitantes.from_db)
+    if not hasattr(instance, '_ocupacao'):
+        anterior = None
+        if not instance._state.adding:
+            anterior = (Visitantes.objects.filter(pk=instance.pk)
+                        .values_list('residencia_id', 'tipo_visitante', 'data_saida').first())
+        instance._ocupacao = anterior[:2] if anterior and anterior[2] is None else None
+    # atualizar_ocupacao troca _ocupacao pelo estado gravado; transmitir_alteracao compara com este
+    instance._aberta_antes_de_gravar = instance._ocupacao is not None
+
+
+@receiver(post_save, sender=Visitantes)
+def atualizar_ocupacao(sender, instance, **kwargs):
+    anterior, atual = instance._ocupacao, instance.estado_de_ocupacao()
+    if anterior != atual:
+        variacoes = {}
+        if anterior:
+            variacoes[anterior] = -1
+        if atual:
+            variacoes[atual] = variacoes.get(atual, 0) + 1
+        ajustar_ocupacao(variacoes)
+    instance._ocupacao = atual
+
+
+@receiver(post_delete, sender=Visitantes)
+def descontar_ocupacao(sender, instance, **kwargs):
+    anterior = getattr(instance, '_ocupacao', instance.estado_de_ocupacao())
+    if anterior:
+        ajustar_ocupacao({anterior: -1})
+
+
+@receiver(post_save)
+def registrar_alteracao(sender, instance, **kwargs):
+    if sender in MODELOS_SINCRONIZADOS:
+        Atualizado.registrar(sender._meta.model_name)
+
+
+@receiver(post_delete)
+def registrar_remocao(sender, instance, **kwargs):
+    if sender in MODELOS_SINCRONIZADOS:
+        Removido.objects.create(nome_do_modelo=sender._meta.model_name, id_removido=instance.pk)
+        Atualizado.registrar(sender._meta.model_name)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidar_tabela_de_referencia(sender, **kwargs):
+    if sender in MODELOS_DE_REFERENCIA:
+        transaction.on_commit(reference_table(sender).invalidate)
+
+
+def _marcar_alterados(modelo, pks):
+    """
+    Atualiza ultima_atualizacao de registros alterados sem passar por save(), como nas relações ManyToMany
+    """
+    if modelo.objects.filter(pk__in=pks).update(ultima_atualizacao=timezone.now()):
+        Atualizado.registrar(modelo._meta.model_name)
+
+
+@receiver(m2m_changed)
+def registrar_alteracao_m2m(sender, instance, action, reverse, model, pk_set, **kwargs):
+    campo = CAMPOS_M2M.get(sender)
+    if campo is None:
+        return
+    if not reverse:
+        # morador.veiculos.add(...): o morador mudou
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _marcar_alterados(type(instance), [instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        # veiculo.morador_set.add(...): os moradores em pk_set mudaram
+        _marcar_alterados(model, pk_set)
+    elif action == 'pre_clear':
+        _marcar_alterados(model, model.objects.filter(**{campo: instance}).values('pk'))
+
+
+@receiver(pre_delete, sender=Veiculo)
+@receiver(pre_delete, sender=Morador)
+def registrar_remocao_m2m(sender, instance, **kwargs):
+    # A remoção apaga as linhas da tabela intermediária sem enviar m2m_changed
+    for modelo, campo in RELACOES_M2M:
+        if modelo._meta.get_field(campo).related_model is sender:
+            _marcar_alterados(modelo, modelo.objects.filter(**{campo: instance}).values('pk'))
+
+
+@receiver(carga_em_lote)
+def registrar_carga_em_lote(sender, instances, **kwargs):
+    if sender in MODELOS_SINCRONIZADOS:
+        Atualizado.registrar(sender._meta.model_name)
+    if sender in MODELOS_DE_REFERENCIA:
+        transaction.on_commit(reference_table(sender).invalidate)
+
+
+@receiver(carga_em_lote, sender=Veiculo)
+def indexar_placas(sender, instances, **kwargs):
+    placas = [(veiculo.pk, veiculo.placa) for veiculo in instances]
+
+    def indexar():
+        for pk, placa in placas:
+            index_vehicle(pk, placa)
+    transaction.on_commit(indexar)
+
+
+@receiver(carga_em_lote, sender=Morador)
+def indexar_moradores(sender, instances, **kwargs):
+    index_residents((morador.pk, morador.nome, morador.observacao) for morador in instances)
+
+
+def _transmitir(canal, evento, dados):
+    """
+    Publica o evento depois do commit; ``dados()`` só é chamado se houver quem receba
+    """
+    def publicar():
+        if broker.is_listened(canal):
+            broker.publish(canal, evento, dados())
+    transaction.on_commit(publicar)
+
+
+@receiver(post_save, sender=Visitantes)
+@receiver(post_save, sender=Veiculo)
+@receiver(post_save, sender=Morador)
+def transmitir_alteracao(sender, instance, created, **kwargs):
+    canal, prefixo, serializer = MODELOS_TRANSMITIDOS[sender]
+    if sender is Visitantes and created:
+        evento = 'visita.entrada'
+    elif sender is Visitantes and instance._aberta_antes_de_gravar and instance.data_saida is not None:
+        # Visita fechada pela API (PATCH): a mesma mensagem da saída por documento ou placa (a chave), com o id
+        saida = {'id': instance.pk, 'documento_chave': instance.documento_chave, 'placa': instance.placa_chave,
+                 'data_saida': instance.data_saida, 'saidas': 1}
+        _transmitir(canal, 'visita.saida', lambda: saida)
+        return
+    else:
+        evento = f'{prefixo}.alteracao'
+    _transmitir(canal, evento, lambda: serializer(instance).data)
+
+
+@receiver(post_delete, sender=Visitantes)
+@receiver(post_delete, sender=Veiculo)
+@receiver(post_delete, sender=Morador)
+def transmitir_remocao(sender, instance, **kwargs):
+    canal, prefixo, _ = MODELOS_TRANSMITIDOS[sender]
+    pk = instance.pk
+    _transmitir(canal, f'{prefixo}.remocao', lambda: {'id': pk})
+
+
+@receiver(carga_em_lote, sender=Veiculo)
+@receiver(carga_em_lote, sender=Morador)
+def transmitir_carga_em_lote(sender, instances, **kwargs):
+    # Uma mensagem por carga, com os ids; os clientes releem os registros que mostram
+    canal, prefixo, _ = MODELOS_TRANSMITIDOS[sender]
+    pks = [instance.pk for instance in instances]
+    _transmitir(canal, f'{prefixo}.carga', lambda: {'ids': pks})
+
+
+@receiver(visitas_encerradas, sender=Visitantes)
+def transmitir_saida(sender, documento_chave, placa, data_saida, total, **kwargs):
+    _transmitir(VISITS, 'visita.saida', lambda: {'documento_chave': documento_chave, 'placa': placa,
+                                                  'data_saida': data_saida, 'saidas': total})
@@ -1,3 +1,1061 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .constants import DOCUMENTO
+from .models import (SEM_DOCUMENTO, Atualizado, Cor, Lote, MarcaModelo, Morador, OcupacaoPorResidencia,
+                     PerfilVisitante,
+                     OcupacaoPorTipo, Quadra, Removido, Residencia, Veiculo, VisitaArquivada, Visitantes,
+                     VisitasPorDia, recontar_ocupacao)
+from .plate_index import PlateIndex, distance, get_plate_index, reset_plate_index
+from .reference_data import reference_table
+from .search import search_residents, search_visitors
+from .utils import (DOCUMENT_VALIDATORS, configure_validation_cache, is_cic_valid, is_cnh_valid, is_cnpj_valid,
+                    is_phone_number_valid, is_rg_valid, parse_address, validate_document, validate_many,
+                    validation_cache_info)
+from .views import VisitanteViewSet
+
+
+class DadosDaPortariaMixin:
+    """
+    Cadastros mínimos para os testes, com as cópias em memória (placas, tabelas de referência)
+    recarregadas a cada teste: o rollback do TestCase não envia os signals que as invalidam
+    """
+
+    def setUp(self):
+        super().setUp()
+        reset_plate_index()
+        for modelo in (Cor, MarcaModelo, Quadra, Lote, Residencia):
+            reference_table(modelo).invalidate()
+        self.cor = Cor.objects.create(cor='Prata')
+        self.modelo = MarcaModelo.objects.create(marca_modelo='Fiat Uno', tipo=1)
+
+    def criar_veiculo(self, placa):
+        return Veiculo.objects.create(placa=placa, tipo=1, modelo=self.modelo, cor=self.cor, ano=2020)
+
+    def criar_morador(self, nome, documento=None, veiculos=(), **campos):
+        morador = Morador.objects.create(nome=nome, documento=documento, tipo_documento=1 if documento else 2,
+                                         celular='11999999999', email='morador@example.com', **campos)
+        morador.veiculos.set(veiculos)
+        return morador
+
+    def criar_residencia(self, quadra, lote, moradores):
+        residencia = Residencia.objects.create(quadra=Quadra.objects.get_or_create(quadra=quadra)[0],
+                                               lote=Lote.objects.get_or_create(lote=lote)[0],
+                                               agua=1, saneamento=1)
+        residencia.moradores.set(moradores)
+        return residencia
+
+    def criar_visita(self, residencia, morador, nome='Visitante', tipo_visitante=1, documento=None, **campos):
+        return Visitantes.objects.create(residencia=residencia, morador=morador, nome=nome,
+                                         tipo_visitante=tipo_visitante, documento=documento,
+                                         tipo_de_documento=1 if documento else SEM_DOCUMENTO, **campos)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Planos de consulta conferidos no SQLite')
+class FiltrosDeVisitasTest(TestCase):
+    """
+    Os filtros do histórico de visitas devem usar os índices compostos, já na ordem da paginação
+    """
+
+    def plano(self, query_string):
+        request = Request(APIRequestFactory().get(f'/visitante/?{query_string}'))
+        view = VisitanteViewSet(request=request, format_kwarg=None, action='list')
+        queryset = view.get_queryset().order_by(*VisitanteViewSet.ordenacao)[:51]
+        return queryset.explain()
+
+    def assertUsaIndice(self, query_string, indice):
+        plano = self.plano(query_string)
+        self.assertIn(f'USING INDEX {indice}', plano)
+        self.assertNotIn('TEMP B-TREE', plano)
+
+    def test_periodo(self):
+        self.assertUsaIndice('entrada_de=2024-01-01&entrada_ate=2024-01-31', 'visitantes_entrada_id')
+
+    def test_residencia_no_periodo(self):
+        self.assertUsaIndice('residencia=3&entrada_de=2024-01-01&entrada_ate=2024-01-31',
+                             'visitantes_residencia_entrada')
+
+    def test_morador(self):
+        self.assertUsaIndice('morador=7', 'visitantes_morador_entrada')
+
+    def test_tipo_de_visitante_no_periodo(self):
+        self.assertUsaIndice('tipo_visitante=2&entrada_de=2024-01-01', 'visitantes_tipo_entrada')
+
+    def test_saida(self):
+        self.assertIn('USING INDEX visitantes_saida',
+                      self.plano('saida_de=2024-01-01T08:00:00&saida_ate=2024-01-01T18:00:00'))
+
+
+class ValidacaoEmLoteTest(SimpleTestCase):
+    """
+    validate_many refaz as contas dos validadores com NumPy: o resultado de cada linha deve ser o da função escalar
+    """
+    validadores = {'cic': is_cic_valid, 'cnpj': is_cnpj_valid, 'rg': is_rg_valid, 'cnh': is_cnh_valid,
+                   'phone': is_phone_number_valid}
+
+    def valores(self, tipo):
+        aleatorio = random.Random(tipo)
+
+        def digitos(n):
+            return ''.join(aleatorio.choice('0123456789') for _ in range(n))
+
+        # Cada base com todos os finais possíveis: válidos e com dígito verificador errado
+        if tipo == 'rg':
+            bases, finais = [digitos(n) for n in (1, 7, 8, 8)], '0123456789X'
+        elif tipo == 'phone':
+            bases = [digitos(2) + ddd + digitos(5) for ddd in ('11', '21', '10', '99')]
+            finais = [digitos(2) for _ in range(10)]
+        else:
+            largura = {'cic': 9, 'cnpj': 12, 'cnh': 9}[tipo]
+            bases = [digitos(largura) for _ in range(4)] + [digitos(7)]
+            finais = [f'{n:02d}' for n in range(100)]
+        # Formatados, com letras, curtos, longos e vazios
+        return [base + final for base in bases for final in finais] + [
+            '529.982.247-25', '11.222.333/0001-81', '(11) 99999-9999', '12.345.678-x', 'ABC', '1', '1' * 15,
+            ' ', '', None]
+
+    def test_igual_aos_validadores(self):
+        for tipo, validador in self.validadores.items():
+            with self.subTest(tipo):
+                valores = self.valores(tipo)
+                validos, motivos = validate_many(tipo, valores)
+                esperados = [validador('' if valor is None else valor) for valor in valores]
+                self.assertEqual(validos.tolist(), esperados)
+                self.assertTrue(any(esperados) and not all(esperados))
+                self.assertEqual([motivo is None for motivo in motivos], esperados)
+
+    def test_tipo_desconhecido(self):
+        with self.assertRaises(ValueError):
+            validate_many('passaporte', ['X1'])
+
+
+class ValidacaoDeDocumentosTest(SimpleTestCase):
+    """
+    validate_document escolhe o validador pelo código de DOCUMENTO; Morador.clean valida por ele
+    """
+
+    def test_validador_de_cada_tipo(self):
+        for codigo, nome in DOCUMENTO:
+            with self.subTest(nome):
+                validador = mock.Mock(return_value=False)
+                with mock.patch.dict(DOCUMENT_VALIDATORS, {codigo: validador}):
+                    self.assertFalse(validate_document(codigo, '123'))
+                validador.assert_called_once_with('123')
+
+    def test_documentos(self):
+        for codigo, valido, invalido in ((1, '529.982.247-25', '529.982.247-26'), (2, '24.678.135-X', '24.678.135-1'),
+                                         (3, 'V1234567-A', 'X1234567-A'), (4, '861.579.117-91', '861.579.117-92'),
+                                         (5, '52998224725', '52998224700')):
+            with self.subTest(codigo):
+                self.assertTrue(validate_document(codigo, valido))
+                self.assertFalse(validate_document(codigo, invalido))
+        # Passaporte, Sem documento e Outro não têm dígito verificador; códigos fora de DOCUMENTO são inválidos
+        for codigo in (6, 7, 9):
+            self.assertTrue(validate_document(codigo, 'qualquer'))
+        self.assertFalse(validate_document(8, '529.982.247-25'))
+
+    def test_morador(self):
+        morador = Morador(nome='Ana', tipo_documento=4, documento='861.579.117-91', celular='11999999999',
+                          email='ana@example.com')
+        with mock.patch('portaria.models.validate_document', return_value=False) as validar:
+            with self.assertRaises(DjangoValidationError) as erro:
+                morador.clean()
+        validar.assert_called_once_with(4, '861.579.117-91')
+        self.assertEqual(erro.exception.message_dict, {'documento': ['Documento inválido']})
+        morador.clean()
+
+    def test_benchmark(self):
+        saida = io.StringIO()
+        call_command('benchmark_validadores', '--numero', '1', '--repeticoes', '1', stdout=saida)
+        self.assertEqual(saida.getvalue().count('iguais'), 7)
+        self.assertNotIn('DIFERENTES', saida.getvalue())
+
+
+class CacheDeValidacaoTest(SimpleTestCase):
+    """
+    Cache opcional dos validadores (PORTARIA_VALIDATION_CACHE_SIZE), pelo valor normalizado
+    """
+
+    def test_desligado_por_padrao(self):
+        self.assertEqual(validation_cache_info(), {})
+        self.assertTrue(is_cic_valid('529.982.247-25'))
+        self.assertEqual(validation_cache_info(), {})
+
+    def test_acertos_e_faltas(self):
+        with override_settings(PORTARIA_VALIDATION_CACHE_SIZE=2):
+            # A mesma chave normalizada, com e sem pontuação
+            self.assertTrue(is_cic_valid('529.982.247-25'))
+            self.assertTrue(is_cic_valid('52998224725'))
+            self.assertFalse(is_cic_valid('52998224726'))
+            self.assertTrue(is_phone_number_valid('(11) 91234-5678'))
+            info = validation_cache_info()
+            self.assertEqual((info['cic'].hits, info['cic'].misses, info['cic'].currsize), (1, 2, 2))
+            self.assertEqual((info['phone'].hits, info['phone'].misses), (0, 1))
+            self.assertEqual(info['cic'].maxsize, 2)
+
+            # Reconfigurar descarta os resultados e os contadores
+            configure_validation_cache(2)
+            self.assertEqual(validation_cache_info()['cic'].currsize, 0)
+            configure_validation_cache(0)
+            self.assertEqual(validation_cache_info(), {})
+            self.assertTrue(is_cic_valid('529.982.247-25'))
+        self.assertEqual(validation_cache_info(), {})
+
+
+class ValidarCsvTest(SimpleTestCase):
+    """
+    Comando validar_csv: linhas rejeitadas gravadas em outro CSV, com os motivos
+    """
+
+    def validar(self, linhas, *argumentos):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        arquivo = os.path.join(pasta.name, 'moradores.csv')
+        with open(arquivo, 'w', newline='', encoding='utf-8') as csv_:
+            csv.writer(csv_).writerows(linhas)
+        saida = io.StringIO()
+        call_command('validar_csv', arquivo, '--processos', '1', '--lote', '2', *argumentos, stdout=saida)
+        with open(os.path.join(pasta.name, 'moradores.rejeitados.csv'), newline='', encoding='utf-8') as csv_:
+            return saida.getvalue(), list(csv.DictReader(csv_))
+
+    def test_rejeitados(self):
+        saida, rejeitados = self.validar([
+            ('nome', 'documento', 'tipo_documento', 'celular', 'placa'),
+            ('Ana', '529.982.247-25', 'CPF', '(11) 91234-5678', 'ABC1234'),
+            ('Bruno', '529.982.247-26', '1', '11912345678', 'ABC1C34'),
+            ('Carla', '', '', '11912345678', ''),
+            ('Davi', '24.678.135-X', 'RG', '', 'AB1234'),
+            ('Elias', '123', 'Crachá', '1191234', ''),
+        ])
+        self.assertEqual(saida.strip().split(' rejeitadas em ')[0], '5 linhas validadas, 3')
+        self.assertEqual([(linha['linha'], linha['nome'], linha['motivos']) for linha in rejeitados], [
+            ('3', 'Bruno', 'documento inválido'),
+            ('5', 'Davi', 'celular ausente; placa inválida'),
+            ('6', 'Elias', 'tipo de documento inválido; celular inválido'),
+        ])
+        self.assertEqual(rejeitados[0]['documento'], '529.982.247-26')
+
+    def test_sem_colunas_a_validar(self):
+        with self.assertRaises(CommandError):
+            self.validar([('nome', 'email'), ('Ana', 'ana@example.com')])
+
+
+class BuscaDePlacaTest(DadosDaPortariaMixin, TestCase):
+    """
+    Busca aproximada por placa: erros de OCR custam menos que os demais e as duas grafias da placa são iguais
+    """
+
+    def test_distancia(self):
+        self.assertEqual(distance('ABC1D23', 'ABC1D23'), 0)
+        self.assertEqual(distance('A8C1D23', 'ABC1D23'), 0.5)
+        self.assertEqual(distance('AXC1D23', 'ABC1D23'), 1)
+        self.assertEqual(distance('ABC1D2', 'ABC1D23'), 1)
+
+    def test_indice(self):
+        indice = PlateIndex()
+        indice.load([(1, 'ABC1234'), (2, 'ABD1234'), (3, 'XYZ9876')])
+        self.assertEqual(indice.search('ABC1C34'), [(1, 'ABC1C34', 0), (2, 'ABD1C34', 1)])
+        self.assertEqual(indice.search('A8C1C34', limit=1), [(1, 'ABC1C34', 0.5)])
+        self.assertEqual(indice.search('QWE5555'), [])
+        indice.remove(1)
+        self.assertEqual([pk for pk, _, _ in indice.search('ABC1C34')], [2])
+
+    def test_endpoint(self):
+        perto = self.criar_veiculo('ABC1234')
+        longe = self.criar_veiculo('ABD1234')
+        self.criar_veiculo('XYZ9876')
+        resposta = self.client.get(reverse('veiculo-busca'), {'placa': 'A8C1234'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([(item['id'], item['distancia']) for item in resposta.json()],
+                         [(perto.pk, 0.5), (longe.pk, 1.5)])
+        resposta = self.client.get(reverse('veiculo-busca'), {'placa': 'A8C1234', 'limite': 1})
+        self.assertEqual([item['id'] for item in resposta.json()], [perto.pk])
+
+    def test_veiculo_gravado_por_outro_processo(self):
+        self.criar_veiculo('ABC1234')
+        self.assertEqual(len(get_plate_index()), 1)
+        # Sem o commit, o índice deste processo não recebe o veículo: é como se outro processo o gravasse
+        with self.captureOnCommitCallbacks(execute=False):
+            outro = self.criar_veiculo('XYZ9876')
+        self.assertEqual(get_plate_index().search('XYZ9876'), [])
+        # Passado o prazo de conferência, a versão de Veiculo em Atualizado mudou e o índice é refeito
+        with override_settings(PORTARIA_REFERENCE_CACHE_TTL=0):
+            self.assertEqual(get_plate_index().search('XYZ9876'), [(outro.pk, 'XYZ9I76', 0)])
+            with self.assertNumQueries(1):
+                get_plate_index()
+
+
+class ConsultasDasListagensTest(DadosDaPortariaMixin, TestCase):
+    """
+    Listagens com veículos, moradores e residências relacionados: o número de consultas não cresce
+    com o número de registros
+    """
+
+    def semear(self, total):
+        for i in range(Residencia.objects.count(), total):
+            veiculos = [self.criar_veiculo(f'ABC{i:02d}{j}{j}') for j in range(2)]
+            moradores = [self.criar_morador(f'Morador {i}{j}', veiculos=veiculos) for j in range(2)]
+            residencia = self.criar_residencia(str(i), str(i), moradores)
+            self.criar_visita(residencia, moradores[0])
+
+    def assertConsultasConstantes(self, consultas, funcao):
+        for total in (2, 6):
+            self.semear(total)
+            # Primeira chamada fora da contagem: carrega as cópias em memória das tabelas de referência
+            funcao()
+            with self.assertNumQueries(consultas):
+                funcao()
+
+    def test_to_list(self):
+        self.assertConsultasConstantes(2, Morador.to_list)
+        self.assertConsultasConstantes(2, Residencia.to_list)
+        self.assertConsultasConstantes(1, Visitantes.to_list)
+
+    def test_anfitrioes(self):
+        self.assertConsultasConstantes(1, lambda: list(Residencia.anfitrioes(placa='ABC0000')))
+
+    def test_listagens(self):
+        for rota, consultas, modelo in (('morador-list', 3, Morador),
+                                        ('residencia-list', 3, Residencia),
+                                        ('visitantes-list', 2, Visitantes)):
+            with self.subTest(rota):
+                self.assertConsultasConstantes(consultas, lambda: self.client.get(reverse(rota)))
+                resposta = self.client.get(reverse(rota))
+                self.assertEqual(len(resposta.json()['results']), modelo.objects.count())
+
+
+class PaginacaoTest(DadosDaPortariaMixin, TestCase):
+    """
+    Paginação por cursor das listagens: páginas de ``?tamanho=`` sem repetições nem falhas, mesmo com datas iguais
+    """
+
+    def setUp(self):
+        super().setUp()
+        morador = self.criar_morador('Ana')
+        casa = self.criar_residencia('1', '1', [morador])
+        self.visitas = [self.criar_visita(casa, morador, nome=f'Visitante {i}') for i in range(5)]
+        # A mesma data_entrada em todas: a ordem e o cursor dependem do desempate por id
+        Visitantes.objects.update(data_entrada=timezone.make_aware(datetime.datetime(2024, 3, 5, 10)))
+
+    def paginas(self, **parametros):
+        paginas = []
+        resposta = self.client.get(reverse('visitantes-list'), parametros).json()
+        paginas.append([item['id'] for item in resposta['results']])
+        while resposta['next']:
+            resposta = self.client.get(resposta['next']).json()
+            paginas.append([item['id'] for item in resposta['results']])
+        return paginas
+
+    def test_paginas(self):
+        ids = sorted((visita.pk for visita in self.visitas), reverse=True)
+        self.assertEqual(self.paginas(tamanho=2), [ids[:2], ids[2:4], ids[4:]])
+        self.assertEqual(self.paginas(), [ids])
+
+    @override_settings(PORTARIA_MAX_PAGE_SIZE=3)
+    def test_tamanho_maximo(self):
+        self.assertEqual([len(pagina) for pagina in self.paginas(tamanho=100)], [3, 2])
+
+
+@override_settings(PORTARIA_SYNC_PAGE_SIZE=3)
+class SincronizacaoTest(DadosDaPortariaMixin, TestCase):
+    """
+    Sincronização em páginas por (ultima_atualizacao, id), com as remoções e a volta à sincronização completa
+    """
+
+    def sincronizar(self, **parametros):
+        paginas = [self.client.get(reverse('sync'), parametros).json()]
+        while paginas[-1]['proximo']:
+            paginas.append(self.client.get(paginas[-1]['proximo']).json())
+        for pagina in paginas:
+            self.assertLessEqual(sum(len(linhas) for parte in ('alteracoes', 'removidos')
+                                     for linhas in pagina[parte].values()), 3)
+        return paginas
+
+    @staticmethod
+    def recebidos(paginas, parte, nome):
+        return [linha['id'] if isinstance(linha, dict) else linha
+                for pagina in paginas for linha in pagina[parte][nome]]
+
+    def test_completa_em_paginas(self):
+        cores = [self.cor] + [Cor.objects.create(cor=f'Cor {i}') for i in range(6)]
+        veiculo = self.criar_veiculo('ABC1234')
+        paginas = self.sincronizar()
+        self.assertGreater(len(paginas), 2)
+        self.assertTrue(all(pagina['completa'] for pagina in paginas))
+        self.assertEqual(self.recebidos(paginas, 'alteracoes', 'cor'), [cor.pk for cor in cores])
+        self.assertEqual(self.recebidos(paginas, 'alteracoes', 'veiculo'), [veiculo.pk])
+        self.assertEqual(len({pagina['ate'] for pagina in paginas}), 1)
+
+    def test_incremental(self):
+        ate = self.sincronizar()[-1]['ate']
+        novas = [Cor.objects.create(cor=f'Cor {i}') for i in range(4)]
+        removida = novas.pop()
+        removida_pk = removida.pk
+        removida.delete()
+        paginas = self.sincronizar(since=ate)
+        self.assertFalse(paginas[0]['completa'])
+        self.assertEqual(self.recebidos(paginas, 'alteracoes', 'cor'), [cor.pk for cor in novas])
+        self.assertEqual(self.recebidos(paginas, 'removidos', 'cor'), [removida_pk])
+        self.assertEqual(self.recebidos(paginas, 'alteracoes', 'veiculo'), [])
+
+    @override_settings(PORTARIA_SYNC_RETENTION_DAYS=30)
+    def test_prazo_de_guarda(self):
+        antiga = Removido.objects.create(nome_do_modelo='cor', id_removido=99)
+        Removido.objects.filter(pk=antiga.pk).update(data_remocao=timezone.now() - datetime.timedelta(days=31))
+        recente = Removido.objects.create(nome_do_modelo='cor', id_removido=98)
+        self.assertEqual(Removido.limpar(), 1)
+        self.assertEqual(list(Removido.objects.values_list('pk', flat=True)), [recente.pk])
+
+        desatualizado = (timezone.now() - datetime.timedelta(days=31)).isoformat()
+        paginas = self.sincronizar(since=desatualizado)
+        self.assertTrue(paginas[0]['completa'])
+        self.assertEqual(self.recebidos(paginas, 'alteracoes', 'cor'), [self.cor.pk])
+        self.assertEqual(self.recebidos(paginas, 'removidos', 'cor'), [])
+
+    def test_cursor_invalido(self):
+        self.assertEqual(self.client.get(reverse('sync'), {'cursor': 'x'}).status_code, 400)
+
+
+class LeituraCondicionalTest(DadosDaPortariaMixin, TestCase):
+    """
+    ETag das listagens pela versão em Atualizado: o 304 consulta só Atualizado e o GET nunca grava
+    """
+
+    def test_sem_gravar_no_get(self):
+        self.criar_morador('Ana')
+        Atualizado.objects.filter(nome_do_modelo='morador').delete()
+
+        resposta = self.client.get(reverse('morador-list'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertFalse(Atualizado.objects.filter(nome_do_modelo='morador').exists())
+        with self.assertNumQueries(1):
+            resposta = self.client.get(reverse('morador-list'), HTTP_IF_NONE_MATCH=resposta['ETag'])
+        self.assertEqual(resposta.status_code, 304)
+
+        # A primeira alteração cria a versão e muda o ETag
+        self.criar_morador('Bruno')
+        self.assertEqual(self.client.get(reverse('morador-list'), HTTP_IF_NONE_MATCH=resposta['ETag']).status_code,
+                         200)
+
+
+class ConsultasAssincronasTest(DadosDaPortariaMixin, TestCase):
+    """
+    Rotas assíncronas: as mesmas respostas das rotas síncronas equivalentes, com o 304 pelo ETag
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.carro = self.criar_veiculo('ABC1234')
+        self.criar_veiculo('XYZ9876')
+        self.morador = self.criar_morador('Ana', documento='529.982.247-25', veiculos=[self.carro])
+        outro = self.criar_morador('Bruno')
+        self.casa = self.criar_residencia('1', '1', [self.morador])
+        outra_casa = self.criar_residencia('1', '2', [outro])
+        self.criar_visita(self.casa, self.morador, nome='Carla', placa='ABC1234')
+        self.criar_visita(outra_casa, outro, nome='Davi')
+        self.criar_visita(self.casa, self.morador, nome='Elias', data_saida=timezone.now())
+
+    async def test_mesmas_respostas(self):
+        for rota_async, rota, parametros, paginada in (
+                ('async-veiculo', 'veiculo-list', {'placa': 'ABC1C34'}, True),
+                ('async-morador', 'morador-list', {'documento': '52998224725', 'tipo_documento': 1}, True),
+                ('async-dentro', 'visitantes-dentro', {}, False),
+                ('async-dentro', 'visitantes-dentro', {'residencia': self.casa.pk}, False)):
+            with self.subTest(rota_async, **parametros):
+                resposta = await self.async_client.get(reverse(rota_async), parametros)
+                self.assertEqual(resposta.status_code, 200)
+                esperada = (await sync_to_async(self.client.get)(reverse(rota), parametros)).json()
+                self.assertEqual(resposta.json(), esperada['results'] if paginada else esperada)
+                self.assertTrue(resposta.json())
+
+                resposta = await self.async_client.get(reverse(rota_async), parametros,
+                                                       headers={'If-None-Match': resposta['ETag']})
+                self.assertEqual(resposta.status_code, 304)
+
+    async def test_parametros_invalidos(self):
+        for rota, parametros, campo in (('async-veiculo', {}, 'placa'),
+                                        ('async-morador', {'documento': '52998224725', 'tipo_documento': 'x'},
+                                         'tipo_documento'),
+                                        ('async-dentro', {'residencia': 'x'}, 'residencia')):
+            with self.subTest(rota):
+                resposta = await self.async_client.get(reverse(rota), parametros)
+                self.assertEqual(resposta.status_code, 400)
+                self.assertIn(campo, resposta.json())
+
+
+class VisitasAbertasTest(DadosDaPortariaMixin, TestCase):
+    """
+    Quem está dentro e a saída pelos índices parciais das visitas abertas
+    """
+
+    def setUp(self):
+        super().setUp()
+        morador = self.criar_morador('Ana')
+        self.casa = self.criar_residencia('1', '1', [morador])
+        self.outra_casa = self.criar_residencia('1', '2', [morador])
+        self.carro = self.criar_visita(self.casa, morador, nome='Bruno', placa='ABC1234')
+        self.a_pe = self.criar_visita(self.casa, morador, nome='Carla', documento='529.982.247-25')
+        self.vizinho = self.criar_visita(self.outra_casa, morador, nome='Davi')
+        self.criar_visita(self.casa, morador, nome='Elias', data_saida=timezone.now())
+
+    def dentro(self, **parametros):
+        return [item['id'] for item in self.client.get(reverse('visitantes-dentro'), parametros).json()]
+
+    def sair(self, **dados):
+        return self.client.post(reverse('visitantes-saida'), dados, content_type='application/json')
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'Planos de consulta conferidos no SQLite')
+    def test_indices_parciais(self):
+        for filtro, indice in (({'residencia': 3}, 'visitantes_abertas_residencia'),
+                               ({'documento_chave': '52998224725'}, 'visitantes_abertas_documento'),
+                               ({'placa_chave': 'ABC1C34'}, 'visitantes_abertas_placa')):
+            with self.subTest(indice):
+                self.assertIn(f'USING INDEX {indice}', Visitantes.objects.abertas().filter(**filtro).explain())
+
+    def test_dentro(self):
+        self.assertEqual(self.dentro(), [self.vizinho.pk, self.a_pe.pk, self.carro.pk])
+        self.assertEqual(self.dentro(residencia=self.outra_casa.pk), [self.vizinho.pk])
+
+    def test_saida(self):
+        # A placa fica como digitada na entrada; a saída pode vir na outra grafia
+        self.assertEqual((self.carro.placa, self.carro.placa_chave), ('ABC1234', 'ABC1C34'))
+        self.assertEqual(self.sair(placa='ABC1C34').json(), {'saidas': 1})
+        self.assertEqual(self.sair(documento='52998224725').json(), {'saidas': 1})
+        self.assertEqual(self.dentro(), [self.vizinho.pk])
+        self.assertEqual(self.sair(placa='ABC1234').json(), {'saidas': 0})
+        self.assertEqual(self.sair().status_code, 400)
+
+
+class EntradaTest(DadosDaPortariaMixin, TestCase):
+    """
+    Entrada em uma chamada: placa ou documento do morador -> morador -> residência, e a visita criada
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.carro = self.criar_veiculo('ABC1234')
+        self.morador = self.criar_morador('Ana', documento='529.982.247-25', veiculos=[self.carro])
+        self.casa = self.criar_residencia('3', '12', [self.morador])
+
+    def entrar(self, **dados):
+        visitante = {'nome': 'Bruno', 'tipo_visitante': 2, 'tipo_de_documento': SEM_DOCUMENTO}
+        return self.client.post(reverse('visitantes-entrada'), {**visitante, **dados},
+                                content_type='application/json')
+
+    def test_pela_placa(self):
+        resposta = self.entrar(placa='abc-1234')
+        self.assertEqual(resposta.status_code, 201)
+        dados = resposta.json()
+        self.assertEqual(dados['residencia'], {'id': self.casa.pk, 'quadra': '3', 'lote': '12'})
+        self.assertEqual(dados['morador'], {'id': self.morador.pk, 'nome': 'Ana', 'celular': '11999999999'})
+        self.assertEqual(dados['veiculo'], {'id': self.carro.pk, 'placa': 'ABC1234', 'modelo': 'Fiat Uno',
+                                            'cor': 'Prata'})
+        visita = Visitantes.objects.get(pk=dados['visita']['id'])
+        self.assertEqual((visita.residencia_id, visita.morador_id, visita.placa, visita.placa_chave, visita.nome),
+                         (self.casa.pk, self.morador.pk, 'ABC1234', 'ABC1C34', 'Bruno'))
+
+    def test_pelo_documento_do_morador(self):
+        resposta = self.entrar(morador_documento='52998224725')
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(resposta.json()['residencia']['id'], self.casa.pk)
+        self.assertIsNone(resposta.json()['veiculo'])
+
+    def test_mais_de_uma_residencia(self):
+        outra_casa = self.criar_residencia('4', '1', [self.morador])
+        resposta = self.entrar(placa='ABC1234')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.json()['residencias'], [self.casa.pk, outra_casa.pk])
+        resposta = self.entrar(placa='ABC1234', residencia=outra_casa.pk)
+        self.assertEqual(resposta.json()['residencia']['id'], outra_casa.pk)
+
+    def test_morador_desconhecido(self):
+        self.assertEqual(self.entrar(placa='XYZ9876').status_code, 404)
+        self.assertEqual(self.entrar().status_code, 400)
+        self.assertFalse(Visitantes.objects.exists())
+
+    def test_perfil_pelo_documento(self):
+        # A primeira entrada com documento cria o perfil; a seguinte o encontra pelo documento, com outra pontuação
+        resposta = self.entrar(placa='ABC1234', tipo_de_documento=1, documento='529.982.247-25')
+        self.assertEqual(resposta.status_code, 201)
+        perfil = PerfilVisitante.objects.get()
+        self.assertEqual((perfil.nome, perfil.tipo_visitante, perfil.documento_chave), ('Bruno', 2, '52998224725'))
+        resposta = self.client.post(reverse('visitantes-entrada'),
+                                    {'placa': 'ABC1234', 'tipo_de_documento': 1, 'documento': '52998224725'},
+                                    content_type='application/json')
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual((resposta.json()['visita']['perfil'], resposta.json()['visita']['nome']), (perfil.pk, 'Bruno'))
+        self.assertEqual(PerfilVisitante.objects.count(), 1)
+
+    def test_perfil_informado(self):
+        perfil = PerfilVisitante.objects.create(tipo_visitante=3, nome='Carla', tipo_de_documento=1,
+                                                documento='529.982.247-25')
+        resposta = self.client.post(reverse('visitantes-entrada'), {'placa': 'ABC1234', 'perfil': perfil.pk},
+                                    content_type='application/json')
+        self.assertEqual(resposta.status_code, 201)
+        visita = Visitantes.objects.get(pk=resposta.json()['visita']['id'])
+        self.assertEqual((visita.perfil_id, visita.nome, visita.tipo_visitante, visita.documento_chave),
+                         (perfil.pk, 'Carla', 3, '52998224725'))
+        resposta = self.client.post(reverse('visitantes-entrada'), {'placa': 'ABC1234', 'perfil': perfil.pk + 1},
+                                    content_type='application/json')
+        self.assertEqual(resposta.status_code, 404)
+
+    def test_documento_diferente_do_perfil(self):
+        # O perfil dispensa a validação só do seu próprio documento
+        perfil = PerfilVisitante.objects.create(tipo_visitante=3, nome='Carla', tipo_de_documento=1,
+                                                documento='529.982.247-25')
+        visita = {'tipo_visitante': 3, 'nome': 'Carla', 'residencia': self.casa.pk, 'morador': self.morador.pk,
+                  'perfil': perfil.pk}
+        for documento, tipo_de_documento, status_code in (('000', 1, 400),
+                                                          ('529.982.247-25', 4, 400),
+                                                          ('52998224725', 1, 201)):
+            with self.subTest(documento=documento, tipo_de_documento=tipo_de_documento):
+                resposta = self.client.post(reverse('visitantes-list'),
+                                            {**visita, 'documento': documento, 'tipo_de_documento': tipo_de_documento},
+                                            content_type='application/json')
+                self.assertEqual(resposta.status_code, status_code)
+        self.assertEqual(Visitantes.objects.get().documento_chave, '52998224725')
+
+
+class PerfilVisitanteTest(DadosDaPortariaMixin, TestCase):
+    """
+    Perfis de visitantes frequentes: documento validado e único por tipo, encontrado com ou sem pontuação
+    """
+
+    def criar_perfil(self, documento='529.982.247-25', tipo_de_documento=1):
+        return PerfilVisitante.objects.create(tipo_visitante=3, nome='Carla', tipo_de_documento=tipo_de_documento,
+                                              documento=documento)
+
+    def test_documento_validado(self):
+        for documento, tipo_de_documento in (('000', 1), ('529.982.247-25', SEM_DOCUMENTO)):
+            with self.subTest(tipo_de_documento=tipo_de_documento), self.assertRaises(DjangoValidationError):
+                self.criar_perfil(documento, tipo_de_documento)
+        self.assertFalse(PerfilVisitante.objects.exists())
+
+    def test_documento_unico(self):
+        self.criar_perfil()
+        with self.assertRaises(DjangoValidationError) as contexto:
+            self.criar_perfil('52998224725')
+        self.assertEqual(contexto.exception.messages, ['Já existe um perfil com este documento'])
+
+    def test_pelo_documento(self):
+        perfil = self.criar_perfil()
+        self.assertEqual(PerfilVisitante.pelo_documento('529 982 247 25'), perfil)
+        self.assertEqual(PerfilVisitante.pelo_documento('52998224725', 1), perfil)
+        self.assertIsNone(PerfilVisitante.pelo_documento('52998224725', 2))
+        self.assertIsNone(PerfilVisitante.pelo_documento(''))
+
+    def test_api(self):
+        resposta = self.client.post(reverse('perfilvisitante-list'),
+                                    {'tipo_visitante': 3, 'nome': 'Carla', 'tipo_de_documento': 1, 'documento': '000'},
+                                    content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+        perfil = self.criar_perfil()
+        resposta = self.client.get(reverse('perfilvisitante-list'), {'documento': '529.982.247-25'})
+        self.assertEqual([item['id'] for item in resposta.json()['results']], [perfil.pk])
+
+
+class ArquivamentoTest(DadosDaPortariaMixin, TestCase):
+    """
+    Visitas encerradas movidas para o arquivo com os totais por dia, sem mudar o que a API lê
+    """
+
+    def setUp(self):
+        super().setUp()
+        morador = self.criar_morador('Ana')
+        self.casa = self.criar_residencia('1', '1', [morador])
+        self.dia = timezone.make_aware(datetime.datetime(2024, 3, 5, 10))
+        self.visitas = [self.criar_visita(self.casa, morador, nome=f'Visitante {i}', tipo_visitante=1 + i % 2)
+                        for i in range(3)]
+        Visitantes.objects.update(data_entrada=self.dia, data_saida=self.dia + datetime.timedelta(hours=1))
+        self.aberta = self.criar_visita(self.casa, morador, nome='Aberta')
+        Visitantes.objects.filter(pk=self.aberta.pk).update(data_entrada=self.dia)
+
+    def test_arquivar(self):
+        resumo = VisitasPorDia.resumo(residencia=self.casa.pk)
+        inicio = timezone.make_aware(datetime.datetime(2024, 3, 1))
+        fim = timezone.make_aware(datetime.datetime(2024, 4, 1))
+
+        self.assertEqual(VisitaArquivada.arquivar(inicio, fim), 3)
+        self.assertEqual(sorted(VisitaArquivada.objects.values_list('pk', flat=True)),
+                         [visita.pk for visita in self.visitas])
+        self.assertEqual(list(Visitantes.objects.values_list('pk', flat=True)), [self.aberta.pk])
+        self.assertEqual(sorted(VisitasPorDia.objects.values_list('dia', 'tipo_visitante', 'total')),
+                         [(self.dia.date(), 1, 2), (self.dia.date(), 2, 1)])
+        # O resumo soma o arquivo e as visitas recentes: não muda com o arquivamento
+        self.assertEqual(VisitasPorDia.resumo(residencia=self.casa.pk), resumo)
+        self.assertEqual(len(self.client.get(reverse('visitantes-list')).json()['results']), 4)
+
+        self.assertEqual(VisitaArquivada.arquivar(inicio, fim), 0)
+        self.assertEqual(VisitasPorDia.objects.get(tipo_visitante=1).total, 2)
+
+
+class CargaEmLoteTest(DadosDaPortariaMixin, TestCase):
+    """
+    Carga em lote com upsert pela chave natural: contagens de criados e atualizados e chaves repetidas
+    """
+
+    def carregar(self, rota, registros):
+        return self.client.post(reverse(rota), registros, content_type='application/json')
+
+    def veiculo(self, placa, ano=2020):
+        return {'placa': placa, 'tipo': 1, 'modelo': self.modelo.pk, 'cor': self.cor.pk, 'ano': ano}
+
+    def test_upsert_de_veiculos(self):
+        resposta = self.carregar('veiculo-lote', [self.veiculo('ABC1234'), self.veiculo('XYZ9876')])
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual((resposta.json()['criados'], resposta.json()['atualizados']), (2, 0))
+
+        # A mesma placa na grafia Mercosul atualiza o veículo, em vez de criar outro
+        resposta = self.carregar('veiculo-lote', [self.veiculo('ABC1C34', ano=2022), self.veiculo('QWE4321')])
+        self.assertEqual((resposta.json()['criados'], resposta.json()['atualizados']), (1, 1))
+        self.assertEqual(Veiculo.objects.count(), 3)
+        veiculo = Veiculo.objects.get(placa_chave='ABC1C34')
+        self.assertEqual((veiculo.placa, veiculo.ano), ('ABC1C34', 2022))
+        self.assertEqual(resposta.json()['ids'][0], veiculo.pk)
+
+    def test_chave_repetida(self):
+        resposta = self.carregar('veiculo-lote', [self.veiculo('ABC1234'), self.veiculo('ABC1C34'),
+                                                  self.veiculo('ZZZ')])
+        self.assertEqual(resposta.status_code, 400)
+        erros = resposta.json()
+        self.assertEqual(erros[0], {})
+        self.assertEqual(erros[1], {'non_field_errors': ['Repetido no lote (registro 0)']})
+        self.assertIn('non_field_errors', erros[2])
+        self.assertFalse(Veiculo.objects.exists())
+
+    def test_placa_repetida_fora_do_lote(self):
+        self.criar_veiculo('ABC1234')
+        resposta = self.client.post(reverse('veiculo-list'), self.veiculo('ABC1C34'), content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.json(), {'placa': ['Já existe um veículo com esta placa']})
+
+    def test_upsert_de_moradores(self):
+        morador = {'nome': 'Ana', 'tipo_documento': 1, 'celular': '11999999999', 'email': 'ana@example.com'}
+        resposta = self.carregar('morador-lote', [{**morador, 'documento': '529.982.247-25'},
+                                                  {**morador, 'nome': 'Sem documento'}])
+        self.assertEqual((resposta.json()['criados'], resposta.json()['atualizados']), (2, 0))
+        resposta = self.carregar('morador-lote', [{**morador, 'documento': '52998224725', 'nome': 'Ana Maria'},
+                                                  {**morador, 'nome': 'Sem documento'}])
+        self.assertEqual((resposta.json()['criados'], resposta.json()['atualizados']), (1, 1))
+        self.assertEqual(Morador.objects.get(documento_chave='52998224725').nome, 'Ana Maria')
+        self.assertEqual(Morador.objects.filter(nome='Sem documento').count(), 2)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Busca textual pelo FTS5 do SQLite')
+class BuscaPorNomeTest(DadosDaPortariaMixin, TestCase):
+    """
+    Busca por nome sem acentos e por prefixo, ordenada por relevância, e o filtro icontains de outros bancos
+    """
+
+    def setUp(self):
+        super().setUp()
+        # Criada antes: a ordem do resultado vem da relevância, não do id
+        self.maria = self.criar_morador('Maria Souza', observacao='Irmã do João')
+        self.joao = self.criar_morador('João Silva')
+        self.pedro = self.criar_morador('Pedro')
+        # Moradores sem as palavras buscadas, para que o bm25 dê peso a elas
+        for nome in ('Carlos', 'Beatriz', 'Helena', 'Rafael', 'Tiago'):
+            self.criar_morador(nome)
+
+    def test_moradores(self):
+        self.assertEqual([pk for pk, _ in search_residents('joao')], [self.joao.pk, self.maria.pk])
+        self.assertEqual([pk for pk, _ in search_residents('JOÃO sil')], [self.joao.pk])
+        self.assertEqual(search_residents('j'), [])
+        self.pedro.delete()
+        self.assertEqual(search_residents('pedro'), [])
+
+        resposta = self.client.get(reverse('morador-busca'), {'q': 'joão'}).json()
+        self.assertEqual([item['id'] for item in resposta], [self.joao.pk, self.maria.pk])
+        self.assertGreater(resposta[0]['relevancia'], resposta[1]['relevancia'])
+
+    def test_visitantes(self):
+        casa = self.criar_residencia('1', '1', [self.joao])
+        self.criar_visita(casa, self.joao, nome='Ana Lúcia')
+        recente = self.criar_visita(casa, self.joao, nome='Ana Lúcia')
+        anabela = self.criar_visita(casa, self.joao, nome='Anabela')
+        # Cada visitante (nome) vem uma vez, com a visita mais recente
+        self.assertEqual(sorted(pk for pk, _ in search_visitors('ana')), [recente.pk, anabela.pk])
+        self.assertEqual([pk for pk, _ in search_visitors('lucia')], [recente.pk])
+
+    def test_sem_fts(self):
+        with mock.patch('portaria.search.is_available', return_value=False):
+            self.assertEqual(search_residents('silva'), [(self.joao.pk, None)])
+            self.assertEqual(search_residents('irmã'), [(self.maria.pk, None)])
+
+
+class EnderecoTest(DadosDaPortariaMixin, TestCase):
+    """
+    Endereço digitado na portaria -> residência, pelas cópias em memória de quadras, lotes e residências
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.casa = self.criar_residencia('03', '12', [])
+
+    def buscar(self, endereco):
+        return self.client.get(reverse('residencia-endereco'), {'q': endereco})
+
+    def test_leitura_do_endereco(self):
+        for endereco in ('Q3 L12', 'qd 03 lt 12', 'Lote 12 Quadra 3', '3/12', '03-12', '3 12', 'Q3 12'):
+            self.assertEqual(parse_address(endereco), ('3', '12'), endereco)
+        self.assertEqual(parse_address('Q3 L12A'), ('3', '12A'))
+        for endereco in ('', 'Q3', '3', 'Q3 L12 L13', '1 2 3'):
+            self.assertIsNone(parse_address(endereco), endereco)
+
+    def test_pelo_endereco(self):
+        self.assertEqual(Residencia.pelo_endereco('Quadra 3 Lote 12'), [self.casa])
+        self.assertEqual(Residencia.pelo_endereco('Q3 L13'), [])
+        self.assertIsNone(Residencia.pelo_endereco('Q3'))
+        # Com os mapas já montados, a busca não consulta o banco
+        with self.assertNumQueries(0):
+            self.assertEqual(Residencia.pelo_endereco('3/12'), [self.casa])
+
+    def test_endpoint(self):
+        resposta = self.buscar('q3 l12')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json(), {'id': self.casa.pk, 'quadra': '03', 'lote': '12'})
+        self.assertEqual(self.buscar('Q9 L1').status_code, 404)
+        self.assertEqual(self.buscar('Q3').status_code, 400)
+
+    def test_nomes_equivalentes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            outra = self.criar_residencia('3', '12', [])
+        resposta = self.buscar('Q3 L12')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.json()['residencias'], [self.casa.pk, outra.pk])
+
+    def test_invalidacao_no_commit(self):
+        self.assertEqual(self.buscar('Q4 L1').status_code, 404)
+        with self.captureOnCommitCallbacks() as no_commit:
+            nova = self.criar_residencia('4', '1', [])
+        # Antes do commit, a cópia em memória continua a mesma até o prazo de conferência da versão
+        self.assertEqual(self.buscar('Q4 L1').status_code, 404)
+        for invalidar in no_commit:
+            invalidar()
+        self.assertEqual(self.buscar('Q4 L1').json()['id'], nova.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            nova.delete()
+        self.assertEqual(self.buscar('Q4 L1').status_code, 404)
+
+
+class EventosDaPortariaTest(DadosDaPortariaMixin, TestCase):
+    """
+    Fila de eventos de um equipamento: chaves repetidas, lotes com eventos inválidos e saídas fora de ordem
+    """
+
+    def setUp(self):
+        super().setUp()
+        morador = self.criar_morador('Ana', veiculos=[self.criar_veiculo('ABC1234')])
+        self.casa = self.criar_residencia('1', '1', [morador])
+        self.hora = timezone.make_aware(datetime.datetime(2024, 3, 5, 10))
+
+    def enviar(self, eventos):
+        return self.client.post(reverse('visitantes-eventos'), eventos, content_type='application/json')
+
+    def entrada(self, chave, horas=0):
+        return {'chave': chave, 'tipo': 'entrada', 'data': (self.hora + datetime.timedelta(hours=horas)).isoformat(),
+                'placa': 'ABC1234', 'nome': 'Bruno', 'tipo_visitante': 2, 'tipo_de_documento': SEM_DOCUMENTO}
+
+    def saida(self, chave, horas=0):
+        return {'chave': chave, 'tipo': 'saida', 'data': (self.hora + datetime.timedelta(hours=horas)).isoformat(),
+                'placa': 'ABC1234'}
+
+    def test_chaves_repetidas(self):
+        eventos = [self.entrada('e1'), self.entrada('e1'), self.saida('s1', horas=1)]
+        resultados = self.enviar(eventos).json()
+        self.assertEqual([r['status'] for r in resultados], ['aplicado', 'repetido', 'aplicado'])
+        self.assertEqual(resultados[1]['visita'], resultados[0]['visita'])
+        self.assertEqual(resultados[2]['saidas'], 1)
+
+        # O reenvio do lote inteiro não aplica nada de novo
+        reenvio = self.enviar(eventos).json()
+        self.assertEqual([r['status'] for r in reenvio], ['repetido'] * 3)
+        self.assertEqual([r.get('visita') for r in reenvio], [r.get('visita') for r in resultados])
+        self.assertEqual(Visitantes.objects.count(), 1)
+
+    def test_lote_com_eventos_invalidos(self):
+        resultados = self.enviar([self.entrada('e1'), 5, {'tipo': 'entrada'},
+                                  {'chave': 's0', 'tipo': 'saida', 'placa': ['ABC1234']},
+                                  {'chave': 's1', 'tipo': 'saida'}, self.entrada('e2', horas=1)])
+        self.assertEqual(resultados.status_code, 200)
+        resultados = resultados.json()
+        self.assertEqual([r['status'] for r in resultados], ['aplicado', 'erro', 'erro', 'erro', 'erro', 'aplicado'])
+        self.assertIn('placa', resultados[3]['erros'])
+        self.assertEqual(resultados[4]['chave'], 's1')
+        self.assertEqual(Visitantes.objects.abertas().count(), 2)
+
+        self.assertEqual(self.enviar({'chave': 'e3'}).status_code, 400)
+
+    def test_conflito_com_os_dados_gravados(self):
+        aplicar = VisitanteViewSet._aplicar_evento
+
+        def aplicar_evento(view, dados, evento):
+            resposta = aplicar(view, dados, evento)
+            if dados['chave'] == 'e2':
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            return resposta
+
+        with mock.patch.object(VisitanteViewSet, '_aplicar_evento', aplicar_evento):
+            resultados = self.enviar([self.entrada('e1'), self.entrada('e2'), self.entrada('e3')]).json()
+        self.assertEqual([r['status'] for r in resultados], ['aplicado', 'erro', 'aplicado'])
+        # O evento em conflito é desfeito no seu savepoint e pode ser reenviado
+        self.assertEqual(Visitantes.objects.count(), 2)
+        self.assertEqual(self.enviar([self.entrada('e2')]).json()[0]['status'], 'aplicado')
+
+    def test_saidas_fora_de_ordem(self):
+        # A saída registrada antes da entrada, no relógio do equipamento, não fecha a visita
+        resultados = self.enviar([self.saida('s1', horas=1), self.entrada('e1', horas=2),
+                                  self.saida('s2', horas=1)]).json()
+        self.assertEqual([r['saidas'] for r in (resultados[0], resultados[2])], [0, 0])
+        self.assertEqual(Visitantes.objects.abertas().count(), 1)
+
+        resultados = self.enviar([self.saida('s3', horas=3)]).json()
+        self.assertEqual(resultados[0]['saidas'], 1)
+        visita = Visitantes.objects.get()
+        self.assertEqual((visita.data_entrada, visita.data_saida),
+                         (self.hora + datetime.timedelta(hours=2), self.hora + datetime.timedelta(hours=3)))
+
+    def test_saida_sem_objeto(self):
+        for corpo in (['ABC1234'], 'ABC1234', {'placa': {'placa': 'ABC1234'}}):
+            with self.subTest(corpo=corpo):
+                resposta = self.client.post(reverse('visitantes-saida'), corpo, content_type='application/json')
+                self.assertEqual(resposta.status_code, 400)
+
+
+class TransmissaoTest(DadosDaPortariaMixin, TestCase):
+    """
+    Mensagens de api/v1/eventos/ enviadas depois do commit das visitas
+    """
+
+    def setUp(self):
+        super().setUp()
+        morador = self.criar_morador('Ana')
+        self.visita = self.criar_visita(self.criar_residencia('1', '1', [morador]), morador, placa='ABC1234')
+
+    def eventos(self, alterar):
+        with mock.patch('portaria.signals.broker') as broker, self.captureOnCommitCallbacks(execute=True):
+            broker.is_listened.return_value = True
+            alterar()
+        return [(evento, dados) for _, evento, dados in (c.args for c in broker.publish.call_args_list)]
+
+    def alterar(self, **dados):
+        resposta = self.client.patch(reverse('visitantes-detail', args=[self.visita.pk]), dados,
+                                     content_type='application/json')
+        self.assertEqual(resposta.status_code, 200)
+
+    def test_saida_pela_api(self):
+        [(evento, dados)] = self.eventos(lambda: self.alterar(nome='Bruno'))
+        self.assertEqual(evento, 'visita.alteracao')
+
+        agora = timezone.now().replace(microsecond=0)
+        [(evento, dados)] = self.eventos(lambda: self.alterar(data_saida=agora.isoformat()))
+        self.assertEqual(evento, 'visita.saida')
+        self.assertEqual(dados, {'id': self.visita.pk, 'documento_chave': None, 'placa': 'ABC1C34',
+                                 'data_saida': agora, 'saidas': 1})
+
+        # A visita já fechada volta a ser só alterada
+        [(evento, _)] = self.eventos(lambda: self.alterar(nome='Carla'))
+        self.assertEqual(evento, 'visita.alteracao')
+
+
+class OcupacaoTest(DadosDaPortariaMixin, TestCase):
+    """
+    Contadores de ocupação mantidos a cada entrada e saída, de acordo com a contagem das visitas abertas
+    """
+
+    def setUp(self):
+        super().setUp()
+        morador = self.criar_morador('Ana', veiculos=[self.criar_veiculo('ABC1234')])
+        self.casa = self.criar_residencia('1', '1', [morador])
+        self.morador = morador
+
+    def ocupacao(self):
+        return self.client.get(reverse('visitantes-ocupacao'))
+
+    def assertOcupacao(self, dentro, por_tipo):
+        self.assertEqual(recontar_ocupacao(gravar=False), [])
+        dados = self.ocupacao().json()
+        self.assertEqual(dados['dentro'], dentro)
+        self.assertEqual({item['tipo_visitante']: item['dentro'] for item in dados['por_tipo']}, por_tipo)
+        self.assertEqual(dados['por_residencia'], [{'residencia': self.casa.pk, 'dentro': dentro}] if dentro else [])
+
+    def entrar(self, tipo_visitante=2):
+        resposta = self.client.post(reverse('visitantes-entrada'),
+                                    {'placa': 'ABC1234', 'nome': 'Bruno', 'tipo_visitante': tipo_visitante,
+                                     'tipo_de_documento': SEM_DOCUMENTO}, content_type='application/json')
+        return resposta.json()['visita']['id']
+
+    def test_entrada_e_saida(self):
+        self.entrar()
+        self.entrar(tipo_visitante=1)
+        self.assertOcupacao(2, {1: 1, 2: 1})
+        self.client.post(reverse('visitantes-saida'), {'placa': 'ABC1234'}, content_type='application/json')
+        self.assertOcupacao(0, {})
+
+    def test_fechada_pela_api(self):
+        visita = self.entrar()
+        self.client.patch(reverse('visitantes-detail', args=[visita]), {'data_saida': timezone.now().isoformat()},
+                          content_type='application/json')
+        self.assertOcupacao(0, {})
+        # Reaberta, volta a contar
+        self.client.patch(reverse('visitantes-detail', args=[visita]), {'data_saida': None},
+                          content_type='application/json')
+        self.assertOcupacao(1, {2: 1})
+
+    def test_remocao_da_visita_aberta(self):
+        visita = self.entrar()
+        self.entrar()
+        self.assertEqual(self.client.delete(reverse('visitantes-detail', args=[visita])).status_code, 204)
+        self.assertOcupacao(1, {2: 1})
+
+    def test_arquivamento(self):
+        dia = timezone.make_aware(datetime.datetime(2024, 3, 5, 10))
+        self.criar_visita(self.casa, self.morador, data_saida=dia)
+        aberta = self.criar_visita(self.casa, self.morador)
+        Visitantes.objects.update(data_entrada=dia)
+        self.assertEqual(VisitaArquivada.arquivar(dia - datetime.timedelta(days=1), dia + datetime.timedelta(days=1)),
+                         1)
+        self.assertEqual(list(Visitantes.objects.values_list('pk', flat=True)), [aberta.pk])
+        self.assertOcupacao(1, {1: 1})
+
+    def test_recontar(self):
+        self.entrar()
+        OcupacaoPorTipo.objects.update(dentro=5)
+        OcupacaoPorResidencia.objects.all().delete()
+        etag = self.ocupacao()['ETag']
+
+        saida = io.StringIO()
+        call_command('recontar_ocupacao', '--conferir', stdout=saida)
+        self.assertEqual(saida.getvalue().splitlines(), [
+            f'residencia {self.casa.pk}: 0 nos contadores, 1 visitas abertas',
+            'tipo_visitante 2: 5 nos contadores, 1 visitas abertas',
+            '2 contadores divergentes',
+        ])
+        # Só conferir não muda os contadores nem a versão da leitura
+        self.assertEqual(self.ocupacao()['ETag'], etag)
+        self.assertEqual(self.ocupacao().json()['dentro'], 5)
+
+        call_command('recontar_ocupacao', stdout=io.StringIO())
+        self.assertOcupacao(1, {2: 1})
+        self.assertNotEqual(self.ocupacao()['ETag'], etag)
+
+        saida = io.StringIO()
+        call_command('recontar_ocupacao', '--conferir', stdout=saida)
+        self.assertEqual(saida.getvalue().strip(), 'Contadores de acordo com as visitas abertas')
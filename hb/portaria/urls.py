@@ -7,7 +7,11 @@ from .views import (CorViewSet,
                     LoteViewSet,
                     QuadraViewSet,
                     ResidenciaViewSet,
-                    VisitanteViewSet)
+                    PerfilVisitanteViewSet,
+                    VisitanteViewSet,
+                    SincronizacaoView,
+                    eventos_ao_vivo)
+from .views_async import moradores_pelo_documento, veiculos_pela_placa, visitas_abertas
 
 
 router = DefaultRouter()
@@ -18,9 +22,16 @@ router.register(r'morador', MoradorViewSet)
 router.register(r'lote', LoteViewSet)
 router.register(r'quadra', QuadraViewSet)
 router.register(r'residencia', ResidenciaViewSet)
+router.register(r'perfil-visitante', PerfilVisitanteViewSet)
 router.register(r'visitante', VisitanteViewSet)
 
 
 urlpatterns = [
+    path('api/v1/sync/', SincronizacaoView.as_view(), name='sync'),
+    path('api/v1/eventos/', eventos_ao_vivo, name='eventos'),
+    # Consultas da portaria pelo ORM assíncrono, para servidores ASGI
+    path('api/v1/async/veiculo/', veiculos_pela_placa, name='async-veiculo'),
+    path('api/v1/async/morador/', moradores_pelo_documento, name='async-morador'),
+    path('api/v1/async/visitante/dentro/', visitas_abertas, name='async-dentro'),
     path('api/v1/', include(router.urls)),
 ]
@@ -4,7 +4,76 @@ This includes functions for validating CPF, CNPJ, CIC, RNE, and RG numbers.
 This site helps to generate test values: https://www.4devs.com.br/
 """
 import re
-from .constants import AREA_CODES
+from functools import lru_cache
+from itertools import count
+from operator import mul
+
+import numpy as np
+
+from .constants import (AREA_CODES,
+                        DOCUMENTO,
+                        MERCOSUL_LETTERS,
+                        CIC_FIRST_WEIGHTS,
+                        CIC_SECOND_WEIGHTS,
+                        CNPJ_FIRST_WEIGHTS,
+                        CNPJ_SECOND_WEIGHTS,
+                        OLD_CNH_WEIGHTS,
+                        CNH_FIRST_WEIGHTS,
+                        CNH_SECOND_WEIGHTS)
+
+_NON_DIGIT = re.compile(r'[^0-9]')
+_NON_ALPHANUMERIC = re.compile(r'[^A-Z0-9]')
+_NON_DECIMAL = re.compile(r'\D')
+# RNE numbers: Letter (typically V or W), 6-8 digits, and a check character
+_RNE = re.compile(r'[VW]\d{6,8}-[A-Z]')
+_LICENSE_PLATE = re.compile(r'[A-Z]{3}\d{4}|[A-Z]{3}\d[A-Z]\d{2}')
+# Address tokens: a number with an optional letter suffix (12A) or a word
+_ADDRESS_TOKEN = re.compile(r'\d+[A-Z]?|[A-Z]+')
+_BLOCK_LABELS = frozenset(('Q', 'QD', 'QDA', 'QUADRA'))
+_LOT_LABELS = frozenset(('L', 'LT', 'LOTE'))
+
+# Checks run on the normalized values, by name. configure_validation_cache() swaps them for cached versions.
+_UNCACHED_CHECKS = {}
+_CHECKS = {}
+
+
+def _memoizable(name):
+    """
+    Register a check on normalized values so it can be put behind the validation cache.
+    """
+    def decorator(function):
+        _UNCACHED_CHECKS[name] = function
+        _CHECKS[name] = function
+        return function
+    return decorator
+
+
+def configure_validation_cache(maxsize):
+    """
+    Put an LRU cache in front of each validator, keyed on the normalized value.
+
+    Every call drops the cached results and the hit/miss counters.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of values kept per validator. 0 or None disables the cache.
+    """
+    for name, function in _UNCACHED_CHECKS.items():
+        _CHECKS[name] = lru_cache(maxsize=maxsize)(function) if maxsize else function
+
+
+def validation_cache_info():
+    """
+    Hit/miss counters of the validation cache.
+
+    Returns
+    -------
+    dict
+        The functools CacheInfo (hits, misses, maxsize, currsize) of each cached validator by name,
+        empty if the cache is disabled.
+    """
+    return {name: function.cache_info() for name, function in _CHECKS.items() if hasattr(function, 'cache_info')}
 
 
 def is_cic_valid(cic):
@@ -21,27 +90,30 @@ def is_cic_valid(cic):
     bool
         True if the CIC is valid, False otherwise.
     """
-    cic = re.sub(r'[^0-9]', '', cic)
+    return _CHECKS['cic'](_NON_DIGIT.sub('', cic))
 
+
+@_memoizable('cic')
+def _check_cic(cic):
     if len(cic) != 11:
         return False
 
+    digits = [int(digit) for digit in cic]
+
     # Calculate the first check digit (10th digit)
-    first_weights = list(range(10, 1, -1))  # weights from 10 to 2
-    first_check_sum = sum(int(digit) * weight for digit, weight in zip(cic[:9], first_weights))
+    first_check_sum = sum(map(mul, digits, CIC_FIRST_WEIGHTS))
     first_check_digit = 11 - (first_check_sum % 11)
     if first_check_digit >= 10:
         first_check_digit = 0
 
     # Calculate the second check digit (11th digit)
-    second_weights = list(range(11, 1, -1))  # weights from 11 to 2
-    second_check_sum = sum(int(digit) * weight for digit, weight in zip(cic[:10], second_weights))
+    second_check_sum = sum(map(mul, digits, CIC_SECOND_WEIGHTS))
     second_check_digit = 11 - (second_check_sum % 11)
     if second_check_digit >= 10:
         second_check_digit = 0
 
     # Check if the calculated digits match the provided digits
-    return int(cic[9]) == first_check_digit and int(cic[10]) == second_check_digit
+    return digits[9] == first_check_digit and digits[10] == second_check_digit
 
 
 def is_cnpj_valid(cnpj):
@@ -59,30 +131,33 @@ def is_cnpj_valid(cnpj):
         True if the CNPJ is valid, False otherwise.
      """
     # Clean the CNPJ string by removing special characters
-    cnpj = re.sub(r'[^0-9]', '', cnpj)
+    return _CHECKS['cnpj'](_NON_DIGIT.sub('', cnpj))
 
+
+@_memoizable('cnpj')
+def _check_cnpj(cnpj):
     # The CNPJ must be 14 digits long
     if len(cnpj) != 14:
         return False
 
+    digits = [int(digit) for digit in cnpj]
+
     # Validate first check digit
-    first_weights = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
-    sum_of_products = sum(int(digit) * weight for digit, weight in zip(cnpj[:12], first_weights))
+    sum_of_products = sum(map(mul, digits, CNPJ_FIRST_WEIGHTS))
     first_check_digit = 11 - (sum_of_products % 11)
 
     if first_check_digit >= 10:
         first_check_digit = 0
-    if int(cnpj[12]) != first_check_digit:
+    if digits[12] != first_check_digit:
         return False
 
     # Validate second check digit
-    second_weights = [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
-    sum_of_products = sum(int(digit) * weight for digit, weight in zip(cnpj[:13], second_weights))
+    sum_of_products = sum(map(mul, digits, CNPJ_SECOND_WEIGHTS))
     second_check_digit = 11 - (sum_of_products % 11)
 
     if second_check_digit >= 10:
         second_check_digit = 0
-    if int(cnpj[13]) != second_check_digit:
+    if digits[13] != second_check_digit:
         return False
 
     return True
@@ -102,10 +177,8 @@ def is_rne_valid(rne):
     bool
         True if the RNE ID number is valid, False otherwise.
     """
-    # Define the regex pattern for RNE numbers: Letter (typically V or W), 6-8 digits, and a check character
-    pattern = r'^[VW]\d{6,8}-[A-Z]$'
     # Check if the RNE number matches the pattern
-    return bool(re.fullmatch(pattern, rne))
+    return _RNE.fullmatch(rne) is not None
 
 
 def is_rg_valid(rg):
@@ -120,15 +193,19 @@ def is_rg_valid(rg):
     Returns
     -------
     bool
-        True if the RG number is valid, False otherwise.
+        True if the RG number is valid, False otherwise. Empty numbers and letters
+        other than a final 'X' are invalid.
     """
-    rg = re.sub(r'[^A-Z0-9]', '', rg.upper())
-    digits = map(int, rg[:-1])
-    totals = []
-    for i, digit in enumerate(digits):
-        totals.append(digit * (2 + i))
+    return _CHECKS['rg'](_NON_ALPHANUMERIC.sub('', rg.upper()))
+
+
+@_memoizable('rg')
+def _check_rg(rg):
+    if not rg or not (rg[:-1].isdigit() or len(rg) == 1):
+        return False
 
-    total = sum(totals)
+    # Weights grow from 2 on, one per digit before the verification digit
+    total = sum(map(mul, map(int, rg[:-1]), count(2)))
     remainder = total % 11
     verification_digit = 11 - remainder
 
@@ -137,7 +214,7 @@ def is_rg_valid(rg):
     elif verification_digit == 11:
         verification_digit = 0
 
-    return verification_digit == int(rg[-1])
+    return rg[-1].isdigit() and verification_digit == int(rg[-1])
 
 
 def is_old_cnh_pgus_valid(cnh):
@@ -158,8 +235,7 @@ def is_old_cnh_pgus_valid(cnh):
     if len(cnh) != 9:
         return False
 
-    weights = [9, 8, 7, 6, 5, 4, 3, 2, 1]
-    sum_digits = sum(int(c) * w for c, w in zip(cnh, weights))
+    sum_digits = sum(map(mul, map(int, cnh), OLD_CNH_WEIGHTS))
     remainder = sum_digits % 11
     verify_one = 0 if remainder > 9 else 11 - remainder
     return str(verify_one) == cnh[-1]
@@ -181,8 +257,11 @@ def is_cnh_valid(cnh):
 
     resources: https://www.devmedia.com.br/forum/validacao-de-cnh/372972
     """
-    cnh = re.sub(r'[^0-9]', '', cnh)
+    return _CHECKS['cnh'](_NON_DIGIT.sub('', cnh))
 
+
+@_memoizable('cnh')
+def _check_cnh(cnh):
     if len(cnh) == 9:
         return is_old_cnh_pgus_valid(cnh)
 
@@ -192,26 +271,21 @@ def is_cnh_valid(cnh):
         filler = '0' * (11 - length)
         cnh = cnh[0:length - 2] + filler + cnh[length - 2:]
 
-    weights1 = [2, 3, 4, 5, 6, 7, 8, 9, 10]
-    sum_digits = 0
-    for i in range(9):
-        sum_digits += int(cnh[i]) * weights1[i]
+    digits = [int(digit) for digit in cnh[:11]]
+    sum_digits = sum(map(mul, digits, CNH_FIRST_WEIGHTS))
 
     remainder = sum_digits % 11
     verify_one = 0 if remainder > 9 else 11 - remainder
 
-    if cnh[9] != str(verify_one):
+    if digits[9] != verify_one:
         return False
 
-    weights2 = [3, 4, 5, 6, 7, 8, 9, 10, 11, 2]
-    sum_digits = 0
-    for i in range(10):
-        sum_digits += int(cnh[i]) * weights2[i]
+    sum_digits = sum(map(mul, digits, CNH_SECOND_WEIGHTS))
 
     remainder = sum_digits % 11
     verify_two = 1 if remainder == 10 else 11 - remainder
 
-    return str(verify_two) == cnh[10]
+    return digits[10] == verify_two
 
 
 def validate_cnh(cnh):
@@ -260,12 +334,52 @@ def is_phone_number_valid(phone_number):
         True if the phone number is valid, False otherwise.
     """
     # Remove all non-numeric characters from the phone number
-    phone_number = re.sub(r'\D', '', phone_number)
+    return _CHECKS['phone'](_NON_DECIMAL.sub('', phone_number))
+
 
+@_memoizable('phone')
+def _check_phone_number(phone_number):
     # Check if the phone number has the correct length and starts with a valid area code
     return len(phone_number) == 11 and phone_number[2:4] in AREA_CODES
 
 
+def normalize_license_plate(license_plate):
+    """
+    Normalizes a license plate number for validation and lookups.
+
+    Parameters
+    ----------
+    license_plate:  License plate number as a string.
+
+    Returns
+    -------
+        str: The plate in uppercase with only letters and numbers.
+    """
+    # Remove any non-alphanumeric characters and convert to uppercase
+    return _NON_ALPHANUMERIC.sub('', license_plate.upper())
+
+
+def license_plate_key(license_plate):
+    """
+    Key shared by the old format and the Mercosul spelling of a license plate.
+
+    The old format ABC1234 becomes ABC1C34: the second digit turns into a letter
+    (0 is A, 1 is B, ..., 9 is J), as in the conversion to the Mercosul format.
+
+    Parameters
+    ----------
+    license_plate:  License plate number as a string.
+
+    Returns
+    -------
+        str: The normalized plate in the Mercosul format.
+    """
+    license_plate = normalize_license_plate(license_plate)
+    if len(license_plate) == 7 and license_plate[4].isdigit():
+        license_plate = license_plate[:4] + MERCOSUL_LETTERS[int(license_plate[4])] + license_plate[5:]
+    return license_plate
+
+
 def is_license_plate_valid(license_plate):
     """
     Validates a Brazilian license plate number.
@@ -278,23 +392,328 @@ def is_license_plate_valid(license_plate):
     -------
         Bool: True if the license plate is valid, False otherwise.
     """
-    # Remove any non-alphanumeric characters and convert to uppercase
-    license_plate = re.sub(r'[^A-Z0-9]', '', license_plate.upper())
-    return re.match(r'^[A-Z]{3}\d{4}$|^[A-Z]{3}\d[A-Z]\d{2}$', license_plate) is not None
+    return _CHECKS['license_plate'](normalize_license_plate(license_plate))
+
+
+@_memoizable('license_plate')
+def _check_license_plate(license_plate):
+    return _LICENSE_PLATE.fullmatch(license_plate) is not None
+
+
+# Validators by DOCUMENTO code. Types without a check digit (Passaporte, Sem documento, Outro) accept any value.
+DOCUMENT_VALIDATORS = {
+    1: is_cic_valid,  # CPF
+    2: is_rg_valid,  # RG
+    3: is_rne_valid,  # RNE
+    4: is_cnh_valid,  # CNH
+    5: is_cic_valid,  # CIN uses the CPF number
+}
+
+_DOCUMENT_TYPES = frozenset(code for code, _ in DOCUMENTO)
+
+
+def document_key(value):
+    """
+    Normalizes a document number for storage and lookups, whatever its type.
+
+    Parameters
+    ----------
+    value : str
+        Document number as a string, possibly including dots, slashes, hyphens and spaces.
+
+    Returns
+    -------
+    str or None
+        The number in uppercase with only letters and digits, or None if nothing is left.
+        '529.982.247-25' and '52998224725' share the key '52998224725'.
+    """
+    return _NON_ALPHANUMERIC.sub('', (value or '').upper()) or None
+
+
+def _address_tokens(text):
+    return _ADDRESS_TOKEN.findall((text or '').upper())
+
+
+def _address_value(token):
+    # '03' and '3' are the same block; '03A' and '3A' the same lot
+    if not token[0].isdigit():
+        return token
+    digits = token.rstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+    return str(int(digits)) + token[len(digits):]
+
+
+def address_part_key(value):
+    """
+    Normalizes the name of a block (quadra) or lot (lote) for lookups.
 
+    Parameters
+    ----------
+    value : str
+        Name as stored or typed, e.g. '03', 'Q3', 'Quadra 3' or '12-A'.
+
+    Returns
+    -------
+    str or None
+        The name in uppercase, without labels, separators and leading zeros, or None if nothing is left.
+        '03', 'Q3' and 'Quadra 3' share the key '3'.
+    """
+    tokens = _address_tokens(value)
+    values = [token for token in tokens if token not in _BLOCK_LABELS and token not in _LOT_LABELS]
+    # A name made only of a label (a block named 'L') is kept as it is
+    return ''.join(_address_value(token) for token in values or tokens) or None
+
+
+def parse_address(text):
+    """
+    Splits an address typed at the gate into the keys of its block and lot.
+
+    Accepts labelled forms in any order ('Q3 L12', 'Qd 03 Lt 12', 'Lote 12 Quadra 3') and
+    unlabelled ones, with the block first ('3/12', '3-12', '3 12').
+
+    Parameters
+    ----------
+    text : str
+        Address as typed.
+
+    Returns
+    -------
+    tuple of (str, str) or None
+        Keys of the block and of the lot, as returned by address_part_key, or None if the text
+        does not name exactly one block and one lot.
+    """
+    block, lot, unlabelled, label = [], [], [], None
+    for token in _address_tokens(text):
+        if token in _BLOCK_LABELS:
+            label = block
+        elif token in _LOT_LABELS:
+            label = lot
+        else:
+            (label if label is not None else unlabelled).append(_address_value(token))
+            label = None
+    if unlabelled:
+        # Unlabelled values are the block and the lot, or fill in the missing one ('Q3 12')
+        if not block and not lot and len(unlabelled) == 2:
+            block, lot = unlabelled[:1], unlabelled[1:]
+        elif block and not lot:
+            lot = unlabelled
+        elif lot and not block:
+            block = unlabelled
+        else:
+            return None
+    if len(block) != 1 or len(lot) != 1:
+        return None
+    return block[0], lot[0]
+
+
+def validate_document(tipo_documento, value):
+    """
+    Validates a document number according to its type.
+
+    Parameters
+    ----------
+    tipo_documento : int
+        Document type, one of the DOCUMENTO codes.
+    value : str
+        Document number as a string, possibly including dots, slashes, and hyphens.
+
+    Returns
+    -------
+    bool
+        True if the document is valid for its type, False otherwise or if the type is unknown.
+    """
+    if tipo_documento not in _DOCUMENT_TYPES:
+        return False
+    validator = DOCUMENT_VALIDATORS.get(tipo_documento)
+    return validator is None or validator(value)
+
+
+def _digit_matrix(values, width):
+    """
+    Build an integer matrix with one row per string of ``width`` ASCII digits.
+
+    Parameters
+    ----------
+    values : list of str
+        Strings with exactly ``width`` digits each.
+    width : int
+        Number of digits per string.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape ``(len(values), width)`` with the digit values.
+    """
+    if not values or width == 0:
+        return np.zeros((len(values), width), dtype=np.int64)
+    buffer = ''.join(values).encode('ascii')
+    matrix = np.frombuffer(buffer, dtype=np.uint8).reshape(len(values), width)
+    return matrix.astype(np.int64) - ord('0')
 
-if __name__ == '__main__':
-    cnh = """58316794534 2324146 2730470 3079329 3081207 3398603 3412165 3779387 4626843 4805301 4847786 4966090 5177094 5388225""".split()
 
-    print('is_cnh_valid', is_cnh_valid('86157911791'))
-    print('is_cnh_valid', is_cnh_valid('70273812743'))
-    print('is_cnh_valid', is_cnh_valid('05626223124'))
-    print('is_cnh_valid', is_cnh_valid('74545188472'))
-    print('is_cnh_valid', is_cnh_valid('81452553802'))
-    print('is_cnh_valid', is_cnh_valid('62816710724'))
-    print('is_cnh_valid', is_cnh_valid('86291284022'))
-    print('is_cnh_valid', is_cnh_valid('89513811062'))
-    print('is_cnh_valid', is_cnh_valid('89513811062'))
+def _check_digit(matrix, weights):
+    """
+    Compute the ``11 - (sum % 11)`` check digit used by CPF/CIC and CNPJ, mapping 10 and 11 to 0.
+    """
+    digit = 11 - (matrix @ np.asarray(weights, dtype=np.int64)) % 11
+    digit[digit >= 10] = 0
+    return digit
+
+
+def _fill_results(valid, reasons, rows, ok, failure):
+    """
+    Store the outcome ``ok`` of the rows ``rows`` in ``valid`` and ``reasons``.
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    valid[rows] = ok
+    for i, row_ok in zip(rows.tolist(), ok.tolist()):
+        reasons[i] = None if row_ok else failure
+    return valid, reasons
+
+
+def _validate_many_cic(values):
+    cleaned = [_NON_DIGIT.sub('', value) for value in values]
+    valid = np.zeros(len(cleaned), dtype=bool)
+    reasons = ['length'] * len(cleaned)
+
+    rows = [i for i, cic in enumerate(cleaned) if len(cic) == 11]
+    matrix = _digit_matrix([cleaned[i] for i in rows], 11)
+    first_check_digit = _check_digit(matrix[:, :9], CIC_FIRST_WEIGHTS)
+    second_check_digit = _check_digit(matrix[:, :10], CIC_SECOND_WEIGHTS)
+    ok = (matrix[:, 9] == first_check_digit) & (matrix[:, 10] == second_check_digit)
+
+    return _fill_results(valid, reasons, rows, ok, 'check_digit')
+
+
+def _validate_many_cnpj(values):
+    cleaned = [_NON_DIGIT.sub('', value) for value in values]
+    valid = np.zeros(len(cleaned), dtype=bool)
+    reasons = ['length'] * len(cleaned)
+
+    rows = [i for i, cnpj in enumerate(cleaned) if len(cnpj) == 14]
+    matrix = _digit_matrix([cleaned[i] for i in rows], 14)
+    first_check_digit = _check_digit(matrix[:, :12], CNPJ_FIRST_WEIGHTS)
+    second_check_digit = _check_digit(matrix[:, :13], CNPJ_SECOND_WEIGHTS)
+    ok = (matrix[:, 12] == first_check_digit) & (matrix[:, 13] == second_check_digit)
+
+    return _fill_results(valid, reasons, rows, ok, 'check_digit')
+
+
+def _validate_many_rg(values):
+    cleaned = [_NON_ALPHANUMERIC.sub('', value.upper()) for value in values]
+    valid = np.zeros(len(cleaned), dtype=bool)
+    # Empty values and letters other than a final 'X' are format errors
+    reasons = ['format'] * len(cleaned)
+
+    rows = [i for i, rg in enumerate(cleaned) if rg and (len(rg) == 1 or rg[:-1].isdigit())]
+    bodies = [cleaned[i][:-1] for i in rows]
+    width = max((len(body) for body in bodies), default=0)
+    # Right padding with zeros keeps the weight of each position and adds nothing to the sum.
+    matrix = _digit_matrix([body.ljust(width, '0') for body in bodies], width)
+    verification_digit = 11 - (matrix @ np.arange(2, 2 + width, dtype=np.int64)) % 11
+    verification_digit[verification_digit == 11] = 0
+
+    for i, digit in zip(rows, verification_digit.tolist()):
+        last = cleaned[i][-1]
+        if digit == 10:
+            valid[i] = last == 'X'
+        elif last.isdigit():
+            valid[i] = digit == int(last)
+        else:
+            continue
+        reasons[i] = None if valid[i] else 'check_digit'
+    return valid, reasons
+
+
+def _pad_cnh(cnh):
+    """
+    Normalize a digits-only CNH to the 11 positions read by is_cnh_valid.
+    """
+    length = len(cnh)
+    if length != 11:
+        filler = '0' * (11 - length)
+        cnh = cnh[0:length - 2] + filler + cnh[length - 2:]
+    return cnh[:11]
+
+
+def _validate_many_cnh(values):
+    cleaned = [_NON_DIGIT.sub('', value) for value in values]
+    valid = np.zeros(len(cleaned), dtype=bool)
+    reasons = ['check_digit'] * len(cleaned)
+
+    # Old PGU-S numbers (9 digits)
+    old_rows = [i for i, cnh in enumerate(cleaned) if len(cnh) == 9]
+    matrix = _digit_matrix([cleaned[i] for i in old_rows], 9)
+    remainder = (matrix @ np.array(OLD_CNH_WEIGHTS, dtype=np.int64)) % 11
+    verify_one = np.where(remainder > 9, 0, 11 - remainder)
+    old_ok = matrix[:, 8] == verify_one
+
+    # Current numbers (11 digits after padding)
+    rows = [i for i, cnh in enumerate(cleaned) if len(cnh) != 9]
+    matrix = _digit_matrix([_pad_cnh(cleaned[i]) for i in rows], 11)
+    remainder = (matrix[:, :9] @ np.array(CNH_FIRST_WEIGHTS, dtype=np.int64)) % 11
+    verify_one = np.where(remainder > 9, 0, 11 - remainder)
+    remainder = (matrix[:, :10] @ np.array(CNH_SECOND_WEIGHTS, dtype=np.int64)) % 11
+    verify_two = np.where(remainder == 10, 1, 11 - remainder)
+    ok = (matrix[:, 9] == verify_one) & (matrix[:, 10] == verify_two)
+
+    _fill_results(valid, reasons, old_rows, old_ok, 'check_digit')
+    return _fill_results(valid, reasons, rows, ok, 'check_digit')
+
+
+_AREA_CODE_TABLE = np.zeros(100, dtype=bool)
+_AREA_CODE_TABLE[[int(code) for code in AREA_CODES]] = True
+
+
+def _validate_many_phone_number(values):
+    cleaned = [_NON_DECIMAL.sub('', value) for value in values]
+    valid = np.zeros(len(cleaned), dtype=bool)
+    reasons = ['length'] * len(cleaned)
+
+    rows = [i for i, phone_number in enumerate(cleaned) if len(phone_number) == 11 and phone_number.isascii()]
+    matrix = _digit_matrix([cleaned[i] for i in rows], 11)
+    # Same positions as is_phone_number_valid: phone_number[2:4]
+    ok = _AREA_CODE_TABLE[matrix[:, 2] * 10 + matrix[:, 3]]
+    _fill_results(valid, reasons, rows, ok, 'area_code')
+
+    # Non-ASCII decimal digits survive \D and count towards the length, so check these rows as strings
+    rows = [i for i, phone_number in enumerate(cleaned) if len(phone_number) == 11 and not phone_number.isascii()]
+    ok = np.array([cleaned[i][2:4] in AREA_CODES for i in rows], dtype=bool)
+    return _fill_results(valid, reasons, rows, ok, 'area_code')
+
+
+_BATCH_VALIDATORS = {
+    'cic': _validate_many_cic,
+    'cpf': _validate_many_cic,
+    'cnpj': _validate_many_cnpj,
+    'rg': _validate_many_rg,
+    'cnh': _validate_many_cnh,
+    'phone': _validate_many_phone_number,
+}
+
+
+def validate_many(kind, values):
+    """
+    Validates a whole column of documents or phone numbers at once.
+
+    The values are normalized like the scalar validators and the check digits are computed with NumPy
+    over a digit matrix, so the result for each row is the same as calling the scalar function.
+
+    Parameters
+    ----------
+    kind : str
+        One of 'cic' (or 'cpf'), 'cnpj', 'rg', 'cnh' or 'phone'.
+    values : iterable of str
+        Values to validate. None is treated as an empty string.
+
+    Returns
+    -------
+    tuple
+        A boolean numpy array with True for the valid rows, and a list with the failure reason of each row
+        ('length', 'format', 'check_digit' or 'area_code'), None for the valid ones.
+    """
+    try:
+        validator = _BATCH_VALIDATORS[kind]
+    except KeyError:
+        raise ValueError(f'Unknown document kind: {kind!r}') from None
+    return validator(['' if value is None else str(value) for value in values])
 
-    for c in cnh:
-        print(is_cnh_valid(c))
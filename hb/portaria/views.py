@@ -1,12 +1,45 @@
-from rest_framework import viewsets
-from .models import (Cor,
+import asyncio
+import base64
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.validators import UniqueValidator
+from rest_framework.views import APIView
+from .models import (SEM_DOCUMENTO,
+                     Atualizado,
+                     Removido,
+                     Cor,
                      MarcaModelo,
                      Veiculo,
                      Morador,
                      Lote,
                      Quadra,
                      Residencia,
-                     Visitantes)
+                     PerfilVisitante,
+                     Visitantes,
+                     VisitaHistorico,
+                     EventoDaPortaria,
+                     OcupacaoPorResidencia,
+                     OcupacaoPorTipo,
+                     VisitasPorDia)
 
 from .serializers import (CorSerializer,
                           MarcaModeloSerializer,
@@ -15,44 +48,978 @@ from .serializers import (CorSerializer,
                           LoteSerializer,
                           QuadraSerializer,
                           ResidenciaSerializer,
-                          VisitanteSerializer)
+                          PerfilVisitanteSerializer,
+                          VisitanteSerializer,
+                          EntradaSerializer,
+                          EventoSerializer,
+                          SaidaSerializer,
+                          LeituraRapida)
+from .broadcast import CHANNELS, broker
+from .plate_index import get_plate_index
+from .signals import carga_em_lote
+from .reference_data import reference_table
+from .search import search_residents, search_visitors
+from .utils import document_key, license_plate_key
+
+# Maximum number of results of the fuzzy plate search
+LIMITE_BUSCA_PLACA = 50
+
+# Maximum number of results of the name search
+LIMITE_BUSCA_NOME = 50
+
+# Maximum number of records in one bulk load
+LIMITE_CARGA_EM_LOTE = 10000
+
+# Maximum number of gate events in one upload
+LIMITE_EVENTOS = 1000
+
+# Seconds between the comments that keep an idle event stream open through proxies
+INTERVALO_PING_EVENTOS = 15
+
+
+class MaisDeUmaResidencia(APIException):
+    """
+    Entrada com anfitriões em mais de uma residência: a resposta 400 traz os ids, como números, para a escolha
+    """
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_code = 'invalid'
+
+    def __init__(self, residencias):
+        # Sem passar por APIException.__init__, que converteria os ids em texto (ErrorDetail)
+        self.detail = {'residencia': 'Mais de uma residência encontrada; informe a residência',
+                       'residencias': sorted(residencias)}
+
+
+def _parametro_inteiro(request, nome, padrao):
+    valor = request.query_params.get(nome, padrao)
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ValidationError({nome: 'Informe um número inteiro'})
+
+
+def _parametro_data(request, nome, fim_do_dia=False):
+    """
+    Data (AAAA-MM-DD) ou data e hora (ISO 8601) informada na query string, como datetime com fuso.
+
+    Uma data sem hora vale pelo início do dia ou, com ``fim_do_dia``, pelo início do dia seguinte.
+    """
+    valor = request.query_params.get(nome)
+    if not valor:
+        return None
+    try:
+        # parse_datetime também aceita uma data sem hora, por isso a data é testada primeiro
+        dia = parse_date(valor)
+        if dia is not None:
+            momento = datetime.datetime.combine(dia, datetime.time())
+            if fim_do_dia:
+                momento += datetime.timedelta(days=1)
+        else:
+            momento = parse_datetime(valor)
+    except ValueError:
+        momento = None
+    if momento is None:
+        raise ValidationError({nome: 'Informe uma data (AAAA-MM-DD) ou data e hora (ISO 8601)'})
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return momento
+
+
+class LeituraCondicionalMixin:
+    """
+    ETag e Last-Modified nas leituras (list e retrieve), a partir da versão do modelo em Atualizado.
+
+    If-None-Match e If-Modified-Since são respondidos com 304 consultando apenas Atualizado,
+    sem tocar na tabela do modelo.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self._leitura_condicional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._leitura_condicional(super().retrieve, request, *args, **kwargs)
+
+    def _versao_atual(self):
+        """
+        Versão e data da última atualização do modelo
+        """
+        # Só leitura: um modelo ainda sem alterações fica na versão 0, sem gravar em Atualizado no GET
+        return (Atualizado.objects.filter(nome_do_modelo=self.queryset.model._meta.model_name)
+                .values_list('versao', 'ultima_atualizacao').first()) or (0, None)
+
+    def _leitura_condicional(self, leitura, request, *args, **kwargs):
+        versao, ultima_atualizacao = self._versao_atual()
+
+        # A resposta depende também da URL (filtros, id) e do formato negociado
+        representacao = f'{request.get_full_path()} {request.accepted_renderer.format}'
+        resumo = hashlib.md5(representacao.encode(), usedforsecurity=False).hexdigest()[:16]
+        etag = quote_etag(f'{self.queryset.model._meta.model_name}-{versao}-{resumo}')
+        last_modified = int(ultima_atualizacao.timestamp()) if ultima_atualizacao else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = leitura(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response.headers['ETag'] = etag
+            if last_modified is not None:
+                response.headers['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+def _resultados_da_busca(view, resultados, queryset):
+    """
+    Registros encontrados por uma busca, na ordem dela, cada um com a sua ``relevancia``
+    """
+    leitura = LeituraRapida.para(view.get_serializer_class())
+    linhas = {item['id']: item
+              for item in leitura.representar(leitura.consulta(queryset.filter(pk__in=[pk for pk, _ in resultados])))}
+    dados = []
+    for pk, relevancia in resultados:
+        if pk in linhas:
+            linhas[pk]['relevancia'] = relevancia
+            dados.append(linhas[pk])
+    return dados
+
+
+class ListagemRapidaMixin:
+    """
+    ``list`` montado com LeituraRapida a partir de ``values()``, sem instanciar os modelos.
+    O retrieve e as escritas continuam com o ModelSerializer.
+    """
 
+    def list(self, request, *args, **kwargs):
+        leitura = LeituraRapida.para(self.get_serializer_class())
+        queryset = leitura.consulta(self.filter_queryset(self.get_queryset()))
+        pagina = self.paginate_queryset(queryset)
+        if pagina is not None:
+            return self.get_paginated_response(leitura.representar(pagina))
+        return Response(leitura.representar(queryset))
 
-class CorViewSet(viewsets.ModelViewSet):
+
+class TabelaDeReferenciaMixin(LeituraCondicionalMixin):
+    """
+    Leituras servidas pela cópia em memória da tabela (reference_data), sem consultar o banco
+    enquanto a tabela não mudar, inclusive para ETag e Last-Modified. As escritas continuam indo ao banco.
+    As tabelas são pequenas e vêm inteiras, sem paginação.
+    """
+    pagination_class = None
+
+    def _tabela(self):
+        return reference_table(self.queryset.model)
+
+    def _versao_atual(self):
+        tabela = self._tabela()
+        tabela.all()
+        return tabela.versao, tabela.ultima_atualizacao
+
+    def list(self, request, *args, **kwargs):
+        return self._leitura_condicional(self._listar_da_tabela, request, *args, **kwargs)
+
+    def _listar_da_tabela(self, request, *args, **kwargs):
+        # Mesma lista serializada para todas as requisições, até a tabela mudar
+        dados = self._tabela().memo(self.get_serializer_class(),
+                                    lambda linhas: self.get_serializer(linhas, many=True).data)
+        return Response(dados)
+
+    def get_object(self):
+        if self.request.method not in SAFE_METHODS:
+            return super().get_object()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            objeto = self._tabela().get(int(self.kwargs[lookup_url_kwarg]))
+        except ValueError:
+            objeto = None
+        if objeto is None:
+            raise Http404
+        self.check_object_permissions(self.request, objeto)
+        return objeto
+
+
+class CargaEmLoteMixin:
+    """
+    Gravação em lote: ``POST <recurso>/lote/`` com uma lista de registros.
+
+    Todos os registros são validados antes de qualquer gravação (serializer e ``clean()`` do modelo,
+    sem consultas por registro); havendo erros, a resposta é 400 com uma lista alinhada à enviada,
+    ``{}`` para os registros válidos. Sem erros, tudo é gravado com bulk_create em uma transação.
+
+    Com ``chave_natural``, registros já existentes com a mesma chave são atualizados (upsert);
+    sem ela, a carga apenas insere. Registros com a chave incompleta (algum campo nulo) são sempre inseridos.
+    """
+    chave_natural = None
+
+    @action(detail=False, methods=['post'])
+    def lote(self, request):
+        registros = request.data
+        if not isinstance(registros, list):
+            raise ValidationError({'non_field_errors': ['Envie uma lista de registros']})
+        if len(registros) > LIMITE_CARGA_EM_LOTE:
+            raise ValidationError({'non_field_errors': [f'No máximo {LIMITE_CARGA_EM_LOTE} registros por lote']})
+
+        modelo = self.queryset.model
+        serializer = self.get_serializer()
+        # A unicidade é resolvida pelo banco (upsert) e as relações ManyToMany são conferidas
+        # em uma consulta para o lote inteiro, em vez de uma por registro
+        serializer.validators = []
+        for campo in serializer.fields.values():
+            campo.validators = [v for v in campo.validators if not isinstance(v, UniqueValidator)]
+        campos_m2m = {f.name: serializer.fields[f.name] for f in modelo._meta.many_to_many
+                      if f.name in serializer.fields}
+        for nome in campos_m2m:
+            del serializer.fields[nome]
+
+        erros = [{} for _ in registros]
+        objetos, relacoes, chaves = [], [], {}
+        for i, registro in enumerate(registros):
+            if not isinstance(registro, dict):
+                erros[i] = {'non_field_errors': ['Cada registro deve ser um objeto']}
+                continue
+            try:
+                objeto = modelo(**serializer.run_validation(registro))
+                objeto.clean()
+            except ValidationError as e:
+                erros[i] = e.detail
+                continue
+            except DjangoValidationError as e:
+                erros[i] = e.message_dict if hasattr(e, 'error_dict') else {'non_field_errors': e.messages}
+                continue
+            m2m = self._relacoes_do_registro(registro, campos_m2m, erros[i])
+            chave = self._chave_natural(objeto)
+            if chave is not None:
+                if chave in chaves:
+                    campo = self.chave_natural[0] if len(self.chave_natural) == 1 else None
+                    if campo not in serializer.fields or serializer.fields[campo].read_only:
+                        # Chave calculada pelo modelo, como placa_chave
+                        campo = 'non_field_errors'
+                    erros[i][campo] = [f'Repetido no lote (registro {chaves[chave]})']
+                chaves.setdefault(chave, i)
+            if not erros[i]:
+                objetos.append(objeto)
+                relacoes.append((i, m2m))
+
+        self._conferir_relacoes(campos_m2m, relacoes, erros)
+        if any(erros):
+            return Response(erros, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic():
+                atualizados = self._gravar_lote(modelo, objetos)
+                self._gravar_relacoes(modelo, objetos, [m2m for _, m2m in relacoes], atualizados)
+                carga_em_lote.send(sender=modelo, instances=objetos)
+        except IntegrityError as e:
+            raise ValidationError({'non_field_errors': [str(e)]})
+
+        return Response({'criados': len(objetos) - len(atualizados),
+                         'atualizados': len(atualizados),
+                         'ids': [objeto.pk for objeto in objetos]},
+                        status=status.HTTP_201_CREATED)
+
+    def _chave_natural(self, objeto):
+        """
+        Chave natural do registro, ou None sem chave natural ou com algum campo dela nulo
+        """
+        if not self.chave_natural:
+            return None
+        chave = tuple(getattr(objeto, campo) for campo in self.chave_natural)
+        return None if None in chave else chave
+
+    @staticmethod
+    def _relacoes_do_registro(registro, campos_m2m, erros):
+        """
+        Ids informados em cada campo ManyToMany do registro; a existência é conferida depois, para o lote todo
+        """
+        m2m = {}
+        for nome, campo in campos_m2m.items():
+            if nome not in registro:
+                if campo.required:
+                    erros[nome] = [campo.error_messages['required']]
+                continue
+            valores = registro[nome]
+            if isinstance(valores, str) or not hasattr(valores, '__iter__'):
+                erros[nome] = [campo.error_messages['not_a_list'].format(input_type=type(valores).__name__)]
+                continue
+            if not valores and not campo.allow_empty:
+                erros[nome] = [campo.error_messages['empty']]
+                continue
+            invalidos = [valor for valor in valores
+                         if isinstance(valor, bool) or not isinstance(valor, (int, str)) or not str(valor).isdigit()]
+            if invalidos:
+                erros[nome] = [campo.child_relation.error_messages['incorrect_type']
+                               .format(data_type=type(invalidos[0]).__name__)]
+                continue
+            m2m[nome] = {int(valor) for valor in valores}
+        return m2m
+
+    @staticmethod
+    def _conferir_relacoes(campos_m2m, relacoes, erros):
+        for nome, campo in campos_m2m.items():
+            informados = set().union(*(m2m.get(nome, ()) for _, m2m in relacoes))
+            if not informados:
+                continue
+            existentes = set(campo.child_relation.get_queryset()
+                             .filter(pk__in=informados).values_list('pk', flat=True))
+            for i, m2m in relacoes:
+                faltando = sorted(m2m.get(nome, set()) - existentes)
+                if faltando:
+                    erros[i][nome] = [campo.child_relation.error_messages['does_not_exist'].format(pk_value=pk)
+                                      for pk in faltando]
+
+    def _gravar_lote(self, modelo, objetos):
+        """
+        Insere os registros ou, com chave natural, faz o upsert; retorna as chaves dos que já existiam
+        """
+        if not self.chave_natural:
+            modelo.objects.bulk_create(objetos)
+            return set()
+
+        primeiro = self.chave_natural[0]
+        existentes = {
+            chave for chave in modelo.objects
+            .filter(**{f'{primeiro}__in': {getattr(objeto, primeiro) for objeto in objetos}})
+            .values_list(*self.chave_natural)
+        }
+        atualizar = [f.name for f in modelo._meta.concrete_fields
+                     if not f.primary_key and f.name not in self.chave_natural and f.attname not in self.chave_natural
+                     and not getattr(f, 'auto_now_add', False)]
+        modelo.objects.bulk_create(objetos, update_conflicts=True,
+                                   unique_fields=self.chave_natural, update_fields=atualizar)
+        return {self._chave_natural(objeto) for objeto in objetos} & existentes
+
+    def _gravar_relacoes(self, modelo, objetos, relacoes, atualizados):
+        """
+        Substitui as relações ManyToMany informadas, com uma gravação por tabela intermediária
+        """
+        for campo in modelo._meta.many_to_many:
+            informados = [(objeto.pk, relacao[campo.name])
+                          for objeto, relacao in zip(objetos, relacoes) if campo.name in relacao]
+            if not informados:
+                continue
+            intermediaria = campo.remote_field.through
+            origem, destino = f'{campo.m2m_field_name()}_id', f'{campo.m2m_reverse_field_name()}_id'
+            if atualizados:
+                intermediaria.objects.filter(**{f'{origem}__in': [pk for pk, _ in informados]}).delete()
+            intermediaria.objects.bulk_create([intermediaria(**{origem: pk, destino: relacionado})
+                                               for pk, ids in informados for relacionado in ids])
+
+
+class CorViewSet(CargaEmLoteMixin, TabelaDeReferenciaMixin, viewsets.ModelViewSet):
     queryset = Cor.objects.all()
     serializer_class = CorSerializer
 
 
-class MarcaModeloViewSet(viewsets.ModelViewSet):
+class MarcaModeloViewSet(CargaEmLoteMixin, TabelaDeReferenciaMixin, viewsets.ModelViewSet):
     queryset = MarcaModelo.objects.all()
     serializer_class = MarcaModeloSerializer
 
 
-class VeiculoViewSet(viewsets.ModelViewSet):
+class VeiculoViewSet(CargaEmLoteMixin, LeituraCondicionalMixin, ListagemRapidaMixin, viewsets.ModelViewSet):
     queryset = Veiculo.objects.all()
     serializer_class = VeiculoSerializer
+    # ABC1234 e ABC1C34 são o mesmo veículo: a carga atualiza a placa para a grafia enviada
+    chave_natural = ('placa_chave',)
+
+    def get_queryset(self):
+        """
+        Aceita ``?placa=`` no formato antigo ou Mercosul; as duas grafias usam o índice de placa_chave.
+        """
+        queryset = super().get_queryset()
+        placa = self.request.query_params.get('placa')
+        if placa:
+            queryset = queryset.filter(placa_chave=license_plate_key(placa))
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def busca(self, request):
+        """
+        Busca aproximada por placa, tolerante a erros de digitação e de OCR (O/0, I/1, B/8...).
+
+        Parâmetros: ``placa`` e ``limite`` (padrão 10). Cada veículo vem com a ``distancia``
+        até a placa informada, do mais próximo para o mais distante.
+        """
+        placa = request.query_params.get('placa', '')
+        limite = min(max(_parametro_inteiro(request, 'limite', 10), 1), LIMITE_BUSCA_PLACA)
+
+        resultados = get_plate_index().search(placa, limit=limite)
+        veiculos = Veiculo.objects.in_bulk([pk for pk, _, _ in resultados])
 
+        dados = []
+        for pk, _, distancia in resultados:
+            if pk in veiculos:
+                item = self.get_serializer(veiculos[pk]).data
+                item['distancia'] = distancia
+                dados.append(item)
+        return Response(dados)
 
-class MoradorViewSet(viewsets.ModelViewSet):
-    queryset = Morador.objects.all()
+
+class MoradorViewSet(CargaEmLoteMixin, LeituraCondicionalMixin, ListagemRapidaMixin, viewsets.ModelViewSet):
+    queryset = Morador.objects.prefetch_related('veiculos')
     serializer_class = MoradorSerializer
+    chave_natural = ('tipo_documento', 'documento_chave')
+
+    def get_queryset(self):
+        """
+        Aceita ``?documento=`` com ou sem pontuação, e opcionalmente ``?tipo_documento=``,
+        pelo índice único de documento_chave.
+        """
+        queryset = super().get_queryset()
+        documento = self.request.query_params.get('documento')
+        if documento:
+            queryset = queryset.filter(documento_chave=document_key(documento))
+            if 'tipo_documento' in self.request.query_params:
+                queryset = queryset.filter(tipo_documento=_parametro_inteiro(self.request, 'tipo_documento', None))
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def busca(self, request):
+        """
+        Busca por parte do nome ou da observação, sem diferenciar acentos e maiúsculas.
+
+        Parâmetros: ``q`` e ``limite`` (padrão 20). Cada morador vem com a ``relevancia``,
+        do mais relevante para o menos relevante.
+        """
+        limite = min(max(_parametro_inteiro(request, 'limite', 20), 1), LIMITE_BUSCA_NOME)
+        return Response(_resultados_da_busca(self, search_residents(request.query_params.get('q', ''), limite),
+                                             self.get_queryset()))
 
 
-class LoteViewSet(viewsets.ModelViewSet):
+class LoteViewSet(CargaEmLoteMixin, TabelaDeReferenciaMixin, viewsets.ModelViewSet):
     queryset = Lote.objects.all()
     serializer_class = LoteSerializer
 
 
-class QuadraViewSet(viewsets.ModelViewSet):
+class QuadraViewSet(CargaEmLoteMixin, TabelaDeReferenciaMixin, viewsets.ModelViewSet):
     queryset = Quadra.objects.all()
     serializer_class = QuadraSerializer
 
 
-class ResidenciaViewSet(viewsets.ModelViewSet):
-    queryset = Residencia.objects.all()
+class ResidenciaViewSet(CargaEmLoteMixin, LeituraCondicionalMixin, ListagemRapidaMixin, viewsets.ModelViewSet):
+    queryset = Residencia.objects.prefetch_related('moradores')
     serializer_class = ResidenciaSerializer
+    chave_natural = ('quadra_id', 'lote_id')
+
+    @action(detail=False, methods=['get'])
+    def endereco(self, request):
+        """
+        Residência de um endereço digitado na portaria: ``q`` com a quadra e o lote ('Q3 L12', '3/12'...).
+
+        Resolvido nas cópias em memória de quadras, lotes e residências, sem consultas ao banco
+        enquanto as tabelas não mudam.
+        """
+        residencias = Residencia.pelo_endereco(request.query_params.get('q', ''))
+        if residencias is None:
+            raise ValidationError({'q': ['Informe a quadra e o lote, por exemplo Q3 L12']})
+        if not residencias:
+            raise NotFound('Nenhuma residência encontrada nesse endereço')
+        if len(residencias) > 1:
+            # Response em vez de ValidationError, que converteria os ids em texto
+            return Response({'q': ['Mais de uma residência encontrada; informe a residência'],
+                             'residencias': sorted(r.pk for r in residencias)}, status=status.HTTP_400_BAD_REQUEST)
+        residencia = residencias[0]
+        return Response({
+            'id': residencia.pk,
+            'quadra': reference_table(Quadra).get(residencia.quadra_id).quadra,
+            'lote': reference_table(Lote).get(residencia.lote_id).lote,
+        })
+
 
+class PerfilVisitanteViewSet(CargaEmLoteMixin, LeituraCondicionalMixin, ListagemRapidaMixin, viewsets.ModelViewSet):
+    queryset = PerfilVisitante.objects.all()
+    serializer_class = PerfilVisitanteSerializer
+    chave_natural = ('documento_chave', 'tipo_de_documento')
 
-class VisitanteViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        """
+        Aceita ``?documento=`` com ou sem pontuação, e opcionalmente ``?tipo_de_documento=``,
+        pelo índice único de documento_chave.
+        """
+        queryset = super().get_queryset()
+        documento = self.request.query_params.get('documento')
+        if documento:
+            queryset = queryset.filter(documento_chave=document_key(documento))
+            if 'tipo_de_documento' in self.request.query_params:
+                queryset = queryset.filter(
+                    tipo_de_documento=_parametro_inteiro(self.request, 'tipo_de_documento', None))
+        return queryset
+
+
+class VisitanteViewSet(LeituraCondicionalMixin, ListagemRapidaMixin, viewsets.ModelViewSet):
     queryset = Visitantes.objects.all()
     serializer_class = VisitanteSerializer
+    # Mais recentes primeiro, pelo índice (data_entrada, id)
+    ordenacao = ('-data_entrada', '-id')
+
+    def get_queryset(self):
+        """
+        Filtros do histórico de visitas, combináveis entre si e com a paginação:
+
+        - ``residencia``, ``morador``, ``tipo_visitante`` e ``documento`` (com ou sem pontuação),
+          cada um com índice composto com data_entrada;
+        - ``entrada_de`` / ``entrada_ate`` e ``saida_de`` / ``saida_ate``, datas ou datas e horas.
+          Uma data sem hora em ``*_ate`` inclui o dia inteiro.
+
+        As leituras (list e retrieve) incluem as visitas arquivadas, pelo histórico; as escritas
+        alcançam apenas as visitas em Visitantes.
+        """
+        if self.action in ('list', 'retrieve'):
+            queryset = VisitaHistorico.objects.all()
+        else:
+            queryset = super().get_queryset()
+        filtros = {}
+        for parametro, campo in (('residencia', 'residencia_id'),
+                                 ('morador', 'morador_id'),
+                                 ('tipo_visitante', 'tipo_visitante')):
+            if parametro in self.request.query_params:
+                filtros[campo] = _parametro_inteiro(self.request, parametro, None)
+        if self.request.query_params.get('documento'):
+            filtros['documento_chave'] = document_key(self.request.query_params['documento'])
+        for campo in ('entrada', 'saida'):
+            inicio = _parametro_data(self.request, f'{campo}_de')
+            fim = _parametro_data(self.request, f'{campo}_ate', fim_do_dia=True)
+            if inicio:
+                filtros[f'data_{campo}__gte'] = inicio
+            if fim:
+                filtros[f'data_{campo}__lt'] = fim
+        return queryset.filter(**filtros)
+
+    @action(detail=False, methods=['get'])
+    def busca(self, request):
+        """
+        Visitantes frequentes por parte do nome, sem diferenciar acentos e maiúsculas, incluindo o arquivo.
+
+        Parâmetros: ``q`` e ``limite`` (padrão 20). Cada visitante (nome) vem uma vez, com a sua
+        visita mais recente.
+        """
+        limite = min(max(_parametro_inteiro(request, 'limite', 20), 1), LIMITE_BUSCA_NOME)
+        return Response(_resultados_da_busca(self, search_visitors(request.query_params.get('q', ''), limite),
+                                             VisitaHistorico.objects.all()))
+
+    @action(detail=False, methods=['get'])
+    def resumo(self, request):
+        """
+        Visitas por dia, residência e tipo de visitante, incluindo as arquivadas.
+
+        Parâmetros opcionais: ``entrada_de``, ``entrada_ate``, ``residencia`` e ``tipo_visitante``.
+        """
+        return self._leitura_condicional(self._resumir, request)
+
+    def _resumir(self, request):
+        filtros = {nome: _parametro_inteiro(request, nome, None)
+                   for nome in ('residencia', 'tipo_visitante') if nome in request.query_params}
+        return Response(VisitasPorDia.resumo(inicio=_parametro_data(request, 'entrada_de'),
+                                             fim=_parametro_data(request, 'entrada_ate', fim_do_dia=True),
+                                             **filtros))
+
+    @action(detail=False, methods=['get'])
+    def dentro(self, request):
+        """
+        Visitas abertas (quem está dentro agora), das mais recentes para as mais antigas.
+
+        Parâmetro opcional: ``residencia``.
+        """
+        return self._leitura_condicional(self._listar_abertas, request)
+
+    def _listar_abertas(self, request):
+        visitas = Visitantes.objects.abertas()
+        residencia = request.query_params.get('residencia')
+        if residencia:
+            visitas = visitas.filter(residencia=_parametro_inteiro(request, 'residencia', None))
+        leitura = LeituraRapida.para(self.get_serializer_class())
+        return Response(leitura.representar(leitura.consulta(visitas.order_by('-data_entrada'))))
+
+    @action(detail=False, methods=['get'])
+    def ocupacao(self, request):
+        """
+        Quantos visitantes estão dentro agora, no total, por residência e por tipo de visitante,
+        lidos dos contadores mantidos a cada entrada e saída, sem contar as visitas.
+
+        Parâmetros opcionais: ``residencia`` ou ``tipo_visitante``, para um só contador.
+        """
+        return self._leitura_condicional(self._ler_ocupacao, request)
+
+    def _ler_ocupacao(self, request):
+        for nome, modelo, campo in (('residencia', OcupacaoPorResidencia, 'residencia_id'),
+                                    ('tipo_visitante', OcupacaoPorTipo, 'tipo_visitante')):
+            if nome in request.query_params:
+                chave = _parametro_inteiro(request, nome, None)
+                dentro = modelo.objects.filter(**{campo: chave}).values_list('dentro', flat=True).first()
+                return Response({nome: chave, 'dentro': dentro or 0})
+        por_tipo = [{'tipo_visitante': tipo, 'dentro': dentro}
+                    for tipo, dentro in OcupacaoPorTipo.objects.filter(dentro__gt=0)
+                    .order_by('tipo_visitante').values_list('tipo_visitante', 'dentro')]
+        por_residencia = [{'residencia': residencia, 'dentro': dentro}
+                          for residencia, dentro in OcupacaoPorResidencia.objects.filter(dentro__gt=0)
+                          .order_by('residencia_id').values_list('residencia_id', 'dentro')]
+        return Response({'dentro': sum(item['dentro'] for item in por_tipo),
+                         'por_residencia': por_residencia,
+                         'por_tipo': por_tipo})
+
+    @action(detail=False, methods=['post'])
+    def entrada(self, request):
+        """
+        Entrada pela portaria em uma só chamada: a ``placa`` (ou o ``morador_documento``) leva ao morador
+        e à residência em uma consulta, a visita é criada e a resposta traz tudo o que a tela da portaria mostra.
+        """
+        entrada = EntradaSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        visita, anfitriao = self._registrar_entrada(entrada.validated_data)
+
+        quadra = reference_table(Quadra).get(anfitriao['quadra_id'])
+        lote = reference_table(Lote).get(anfitriao['lote_id'])
+        resposta = {
+            'visita': self.get_serializer(visita).data,
+            'residencia': {
+                'id': anfitriao['residencia_id'],
+                'quadra': quadra.quadra if quadra else None,
+                'lote': lote.lote if lote else None,
+            },
+            'morador': {
+                'id': anfitriao['morador_id'],
+                'nome': anfitriao['morador_nome'],
+                'celular': anfitriao['morador_celular'],
+            },
+            'veiculo': None,
+        }
+        if 'veiculo_id' in anfitriao:
+            modelo = reference_table(MarcaModelo).get(anfitriao['veiculo_modelo_id'])
+            cor = reference_table(Cor).get(anfitriao['veiculo_cor_id'])
+            resposta['veiculo'] = {
+                'id': anfitriao['veiculo_id'],
+                'placa': anfitriao['veiculo_placa'],
+                'modelo': modelo.marca_modelo if modelo else None,
+                'cor': cor.cor if cor else None,
+            }
+        return Response(resposta, status=status.HTTP_201_CREATED)
+
+    def _registrar_entrada(self, dados, data_entrada=None):
+        """
+        Cria a visita de uma entrada já validada (EntradaSerializer)
+
+        Parâmetros
+        ----------
+        dados : dict
+            Dados validados da entrada
+        data_entrada : datetime
+            Momento da entrada, para entradas registradas antes (sem conexão). Padrão: agora
+
+        Retorna
+        -------
+        tuple:
+            A visita criada e o anfitrião, como em Residencia.anfitrioes()
+        """
+        anfitrioes = Residencia.anfitrioes(placa=dados.get('placa'), documento=dados.get('morador_documento'))
+        if dados.get('residencia'):
+            anfitrioes = anfitrioes.filter(pk=dados['residencia'])
+        anfitrioes = list(anfitrioes)
+        if not anfitrioes:
+            raise NotFound('Nenhum morador encontrado para a placa ou o documento informado')
+        if len({a['residencia_id'] for a in anfitrioes}) > 1:
+            raise MaisDeUmaResidencia({a['residencia_id'] for a in anfitrioes})
+        anfitriao = anfitrioes[0]
+
+        try:
+            with transaction.atomic():
+                perfil = self._perfil_da_entrada(dados)
+                visita = Visitantes(tipo_visitante=perfil.tipo_visitante if perfil else dados['tipo_visitante'],
+                                    nome=perfil.nome if perfil else dados['nome'],
+                                    tipo_de_documento=perfil.tipo_de_documento if perfil else dados['tipo_de_documento'],
+                                    documento=perfil.documento if perfil else dados.get('documento') or None,
+                                    perfil=perfil,
+                                    placa=dados.get('placa') or None,
+                                    residencia_id=anfitriao['residencia_id'],
+                                    morador_id=anfitriao['morador_id'])
+                visita.save()
+                if data_entrada is not None:
+                    # data_entrada é auto_now_add: a data informada é gravada depois do INSERT
+                    Visitantes.objects.filter(pk=visita.pk).update(data_entrada=data_entrada)
+                    visita.data_entrada = data_entrada
+        except DjangoValidationError as e:
+            raise ValidationError(e.message_dict)
+        return visita, anfitriao
+
+    def _perfil_da_entrada(self, dados):
+        """
+        Perfil do visitante da entrada: o informado, o do documento ou um novo, criado na primeira
+        visita com documento. O nome e o tipo informados atualizam o perfil.
+
+        Retorna
+        -------
+        PerfilVisitante:
+            O perfil, ou None para visitantes sem documento
+        """
+        if dados.get('perfil'):
+            perfil = PerfilVisitante.objects.filter(pk=dados['perfil']).first()
+            if perfil is None:
+                raise NotFound('Perfil de visitante não encontrado')
+        elif dados.get('documento') and dados.get('tipo_de_documento') != SEM_DOCUMENTO:
+            perfil = PerfilVisitante.pelo_documento(dados['documento'], dados.get('tipo_de_documento'))
+        else:
+            return None
+
+        if perfil is None:
+            faltando = {campo: ['Este campo é obrigatório.']
+                        for campo in ('tipo_visitante', 'nome', 'tipo_de_documento') if campo not in dados}
+            if faltando:
+                raise ValidationError(faltando)
+            perfil = PerfilVisitante(tipo_visitante=dados['tipo_visitante'],
+                                     nome=dados['nome'],
+                                     tipo_de_documento=dados['tipo_de_documento'],
+                                     documento=dados['documento'])
+            perfil.save()
+        elif (dados.get('nome', perfil.nome) != perfil.nome
+              or dados.get('tipo_visitante', perfil.tipo_visitante) != perfil.tipo_visitante):
+            perfil.nome = dados.get('nome', perfil.nome)
+            perfil.tipo_visitante = dados.get('tipo_visitante', perfil.tipo_visitante)
+            perfil.save()
+        return perfil
+
+    @action(detail=False, methods=['post'])
+    def saida(self, request):
+        """
+        Registra a saída das visitas abertas de um ``documento`` ou de uma ``placa``.
+        """
+        saida = SaidaSerializer(data=request.data)
+        saida.is_valid(raise_exception=True)
+        fechadas = Visitantes.objects.registrar_saida(documento=saida.validated_data.get('documento'),
+                                                      placa=saida.validated_data.get('placa'))
+        return Response({'saidas': fechadas})
+
+    @action(detail=False, methods=['post'])
+    def eventos(self, request):
+        """
+        Fila de entradas e saídas de um equipamento da portaria, enviada de uma vez ao voltar a conexão.
+
+        Cada evento traz a ``chave`` gerada no equipamento, o ``tipo`` (entrada ou saida), a ``data``
+        em que aconteceu e os campos de ``entrada/`` ou de ``saida/``. Os eventos já recebidos são
+        encontrados em uma consulta pelo índice único das chaves e não são aplicados de novo; os demais
+        são aplicados na ordem enviada, em uma transação, cada um em um savepoint.
+
+        A resposta traz, alinhado à lista enviada, o ``status`` de cada evento (aplicado, repetido ou erro)
+        com a ``visita`` criada ou o número de ``saidas``, ou os ``erros``.
+        """
+        eventos = request.data
+        if not isinstance(eventos, list):
+            raise ValidationError({'non_field_errors': ['Envie uma lista de eventos']})
+        if len(eventos) > LIMITE_EVENTOS:
+            raise ValidationError({'non_field_errors': [f'No máximo {LIMITE_EVENTOS} eventos por envio']})
+
+        envelopes = []
+        for evento in eventos:
+            envelope = EventoSerializer(data=evento) if isinstance(evento, dict) else None
+            if envelope is None or not envelope.is_valid():
+                envelopes.append((None, envelope.errors if envelope else
+                                  {'non_field_errors': ['Cada evento deve ser um objeto']}))
+            else:
+                envelopes.append((envelope.validated_data, None))
+        recebidos = dict(EventoDaPortaria.objects
+                         .filter(chave__in=[dados['chave'] for dados, _ in envelopes if dados])
+                         .values_list('chave', 'resposta'))
+
+        resultados = []
+        with transaction.atomic():
+            for evento, (dados, erros) in zip(eventos, envelopes):
+                if dados is None:
+                    resultados.append({'chave': evento.get('chave') if isinstance(evento, dict) else None,
+                                       'status': 'erro', 'erros': erros})
+                    continue
+                chave = dados['chave']
+                if chave in recebidos:
+                    resultados.append({'chave': chave, 'status': 'repetido', **recebidos[chave]})
+                    continue
+                try:
+                    with transaction.atomic():
+                        resposta = self._aplicar_evento(dados, evento)
+                        EventoDaPortaria.objects.create(chave=chave, tipo=dados['tipo'],
+                                                        data=dados.get('data') or timezone.now(), resposta=resposta)
+                except APIException as e:
+                    resultados.append({'chave': chave, 'status': 'erro', 'erros': e.detail})
+                    continue
+                except IntegrityError:
+                    # A mesma chave chegou ao mesmo tempo em outro envio, que a aplicou primeiro; qualquer
+                    # outra violação (um registro removido nesse meio tempo...) desfaz só este evento
+                    recebido = EventoDaPortaria.objects.filter(chave=chave).values_list('resposta', flat=True).first()
+                    if recebido is None:
+                        resultados.append({'chave': chave, 'status': 'erro', 'erros': {
+                            'non_field_errors': ['Evento em conflito com os dados gravados; não aplicado']}})
+                    else:
+                        resultados.append({'chave': chave, 'status': 'repetido', **recebido})
+                    continue
+                recebidos[chave] = resposta
+                resultados.append({'chave': chave, 'status': 'aplicado', **resposta})
+        return Response(resultados)
+
+    def _aplicar_evento(self, dados, evento):
+        """
+        Aplica um evento da fila de um equipamento e devolve o resultado guardado com a chave
+        """
+        if dados['tipo'] == EventoDaPortaria.ENTRADA:
+            entrada = EntradaSerializer(data=evento)
+            entrada.is_valid(raise_exception=True)
+            visita, _ = self._registrar_entrada(entrada.validated_data, data_entrada=dados.get('data'))
+            return {'visita': visita.pk}
+
+        saida = SaidaSerializer(data=evento)
+        saida.is_valid(raise_exception=True)
+        return {'saidas': Visitantes.objects.registrar_saida(documento=saida.validated_data.get('documento'),
+                                                             placa=saida.validated_data.get('placa'),
+                                                             quando=dados.get('data'))}
+
+
+class SincronizacaoView(APIView):
+    """
+    Sincronização incremental: ``GET sync/?since=<data ISO 8601>`` devolve só os registros alterados
+    a partir dessa data e os ids removidos, por modelo. Sem ``since``, ou com um ``since`` mais antigo
+    que o prazo de guarda das remoções (PORTARIA_SYNC_RETENTION_DAYS), devolve todos os registros
+    e ``completa`` verdadeiro: o cliente descarta os seus dados e fica com os recebidos.
+
+    A resposta vem em páginas de até PORTARIA_SYNC_PAGE_SIZE registros e remoções, na ordem
+    (ultima_atualizacao, id) de cada modelo; enquanto houver mais, ``proximo`` traz a URL da página
+    seguinte. Na última página, ``ate`` é a data a ser enviada como ``since`` na próxima sincronização.
+    """
+    # Nome na resposta, consulta e serializer de cada modelo sincronizado
+    modelos = (
+        ('cor', Cor.objects.all(), CorSerializer),
+        ('marca-modelo', MarcaModelo.objects.all(), MarcaModeloSerializer),
+        ('veiculo', Veiculo.objects.all(), VeiculoSerializer),
+        ('morador', Morador.objects.prefetch_related('veiculos'), MoradorSerializer),
+        ('lote', Lote.objects.all(), LoteSerializer),
+        ('quadra', Quadra.objects.all(), QuadraSerializer),
+        ('residencia', Residencia.objects.prefetch_related('moradores'), ResidenciaSerializer),
+        ('perfil-visitante', PerfilVisitante.objects.all(), PerfilVisitanteSerializer),
+        ('visitante', Visitantes.objects.all(), VisitanteSerializer),
+    )
+
+    def _partes(self):
+        """
+        Partes da resposta, na ordem das páginas: as alterações e as remoções de cada modelo, com
+        a chave na resposta, o nome, o nome do modelo, a consulta, o campo de data e a representação
+        """
+        for nome, queryset, serializer_class in self.modelos:
+            nome_do_modelo = queryset.model._meta.model_name
+            yield ('alteracoes', nome, nome_do_modelo, queryset, 'ultima_atualizacao',
+                   lambda linhas, serializer_class=serializer_class: serializer_class(linhas, many=True).data)
+            yield ('removidos', nome, nome_do_modelo,
+                   Removido.objects.filter(nome_do_modelo=nome_do_modelo).only('data_remocao', 'id_removido'),
+                   'data_remocao', lambda linhas: [removido.id_removido for removido in linhas])
+
+    def get(self, request):
+        if 'cursor' in request.query_params:
+            posicao = self._ler_cursor(request.query_params['cursor'])
+        else:
+            since = request.query_params.get('since')
+            if since:
+                try:
+                    since = parse_datetime(since)
+                except ValueError:
+                    since = None
+                if since is None:
+                    raise ValidationError({'since': 'Informe uma data no formato ISO 8601'})
+                if timezone.is_naive(since):
+                    since = timezone.make_aware(since)
+            # Marca d'água obtida antes das consultas: o que mudar durante elas vem de novo na próxima vez
+            ate = timezone.now()
+            if since is not None and since < Removido.inicio_da_guarda(ate):
+                # As remoções desde essa data podem já ter sido apagadas (limpar_removidos)
+                since = None
+            posicao = {'ate': ate, 'since': since, 'parte': 0, 'depois': None}
+
+        since = posicao['since']
+        atualizados = dict(Atualizado.objects.values_list('nome_do_modelo', 'ultima_atualizacao'))
+        resposta = {'ate': posicao['ate'], 'completa': since is None, 'proximo': None,
+                    'alteracoes': {nome: [] for nome, _, _ in self.modelos},
+                    'removidos': {nome: [] for nome, _, _ in self.modelos}}
+        restantes = getattr(settings, 'PORTARIA_SYNC_PAGE_SIZE', 1000)
+
+        for parte, (chave, nome, nome_do_modelo, queryset, campo, representar) in enumerate(self._partes()):
+            if parte < posicao['parte']:
+                continue
+            if since is None:
+                # Na sincronização completa não há remoções a enviar
+                if chave == 'removidos':
+                    continue
+            else:
+                # Modelo sem alterações desde a última sincronização: nem consulta a tabela
+                ultima_atualizacao = atualizados.get(nome_do_modelo)
+                if ultima_atualizacao is not None and ultima_atualizacao < since:
+                    continue
+                queryset = queryset.filter(**{f'{campo}__gte': since})
+            depois = posicao['depois'] if parte == posicao['parte'] else None
+            if depois is not None:
+                momento, pk = depois
+                queryset = queryset.filter(Q(**{f'{campo}__gt': momento}) | Q(**{campo: momento, 'pk__gt': pk}))
+
+            # Uma linha a mais indica que a parte continua na próxima página
+            linhas = list(queryset.order_by(campo, 'pk')[:restantes + 1])
+            if len(linhas) > restantes:
+                linhas = linhas[:restantes]
+                if linhas:
+                    depois = (getattr(linhas[-1], campo), linhas[-1].pk)
+                cursor = self._escrever_cursor({**posicao, 'parte': parte, 'depois': depois})
+                resposta['proximo'] = replace_query_param(request.build_absolute_uri(), 'cursor', cursor)
+            resposta[chave][nome] = representar(linhas)
+            restantes -= len(linhas)
+            if resposta['proximo']:
+                break
+
+        return Response(resposta)
+
+    @staticmethod
+    def _escrever_cursor(posicao):
+        depois = posicao['depois']
+        dados = {
+            'ate': posicao['ate'].isoformat(),
+            'since': posicao['since'].isoformat() if posicao['since'] else None,
+            'parte': posicao['parte'],
+            'depois': [depois[0].isoformat(), depois[1]] if depois else None,
+        }
+        return base64.urlsafe_b64encode(json.dumps(dados, separators=(',', ':')).encode()).decode()
+
+    @staticmethod
+    def _ler_cursor(cursor):
+        try:
+            dados = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            depois = dados['depois']
+            return {
+                'ate': datetime.datetime.fromisoformat(dados['ate']),
+                'since': datetime.datetime.fromisoformat(dados['since']) if dados['since'] else None,
+                'parte': int(dados['parte']),
+                'depois': (datetime.datetime.fromisoformat(depois[0]), int(depois[1])) if depois else None,
+            }
+        except (TypeError, ValueError, KeyError, IndexError):
+            raise ValidationError({'cursor': 'Cursor inválido'})
+
+
+@require_GET
+async def eventos_ao_vivo(request):
+    """
+    Entradas e saídas de visitantes e alterações de veículos e moradores em tempo real (Server-Sent Events).
+
+    ``?canais=`` escolhe entre visitantes, veiculos e moradores, separados por vírgula (padrão: todos).
+    Ao reconectar, o navegador envia ``Last-Event-ID`` e recebe antes as mensagens perdidas que ainda
+    estão no histórico. Cada conexão fica aberta enquanto o cliente estiver conectado, por isso exige
+    um servidor ASGI (hb.asgi); veja portaria.broadcast.
+    """
+    canais = {canal for canal in request.GET.get('canais', '').split(',') if canal in CHANNELS} or CHANNELS
+    ultimo = request.headers.get('Last-Event-ID', '')
+    ultimo = int(ultimo) if ultimo.isdigit() else None
+
+    async def fluxo():
+        assinatura = broker.subscribe(canais, ultimo)
+        try:
+            yield b'retry: 3000\n\n'
+            while True:
+                try:
+                    mensagem = await asyncio.wait_for(assinatura.queue.get(), INTERVALO_PING_EVENTOS)
+                except asyncio.TimeoutError:
+                    yield b': ping\n\n'
+                    continue
+                if mensagem is None:
+                    return
+                yield mensagem
+        finally:
+            broker.unsubscribe(assinatura)
+
+    resposta = StreamingHttpResponse(fluxo(), content_type='text/event-stream')
+    resposta['Cache-Control'] = 'no-cache'
+    # Sem o buffer de proxies como o nginx, que atrasaria as mensagens
+    resposta['X-Accel-Buffering'] = 'no'
+    return resposta
@@ -0,0 +1,100 @@
+"""
+Versões assíncronas, pelo ORM async do Django, das consultas mais frequentes da portaria:
+veículo pela placa, morador pelo documento e visitas abertas.
+
+Servidas por um servidor ASGI (hb.asgi), não ocupam uma thread do servidor enquanto esperam o banco.
+As respostas são as das rotas síncronas equivalentes, sem a paginação (uma placa ou um documento trazem
+poucos registros), com o mesmo ETag/Last-Modified. ``manage.py benchmark_async`` compara a vazão das
+duas versões.
+"""
+import hashlib
+
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET
+
+from .models import Atualizado, Morador, Veiculo, Visitantes
+from .serializers import LeituraRapida, MoradorSerializer, VeiculoSerializer, VisitanteSerializer
+from .utils import document_key, license_plate_key
+
+
+def _erro(campo, mensagem):
+    return JsonResponse({campo: [mensagem]}, status=400, json_dumps_params={'ensure_ascii': False})
+
+
+def _inteiro(request, nome):
+    valor = request.GET.get(nome)
+    try:
+        return int(valor) if valor else None
+    except ValueError:
+        return False
+
+
+async def _leitura_condicional(request, modelo, serializer_class, queryset):
+    """
+    Lista de ``queryset`` como ``serializer_class``, ou 304 pela versão do modelo em Atualizado
+    """
+    versao, ultima_atualizacao = await (Atualizado.objects
+                                        .filter(nome_do_modelo=modelo._meta.model_name)
+                                        .values_list('versao', 'ultima_atualizacao')
+                                        .afirst()) or (0, None)
+    resumo = hashlib.md5(request.get_full_path().encode(), usedforsecurity=False).hexdigest()[:16]
+    etag = quote_etag(f'{modelo._meta.model_name}-{versao}-{resumo}')
+    last_modified = int(ultima_atualizacao.timestamp()) if ultima_atualizacao else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        dados = await LeituraRapida.para(serializer_class).alistar(queryset)
+        response = JsonResponse(dados, safe=False, json_dumps_params={'ensure_ascii': False})
+    if response.status_code in (200, 304):
+        response.headers['ETag'] = etag
+        if last_modified is not None:
+            response.headers['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+@require_GET
+async def veiculos_pela_placa(request):
+    """
+    Veículos de uma ``placa``, no formato antigo ou Mercosul, pelo índice de placa_chave
+    """
+    placa = request.GET.get('placa')
+    if not placa:
+        return _erro('placa', 'Informe a placa')
+    veiculos = Veiculo.objects.filter(placa_chave=license_plate_key(placa)).order_by('-id')
+    return await _leitura_condicional(request, Veiculo, VeiculoSerializer, veiculos)
+
+
+@require_GET
+async def moradores_pelo_documento(request):
+    """
+    Moradores de um ``documento``, com ou sem pontuação, e opcionalmente do ``tipo_documento``,
+    pelo índice único de documento_chave
+    """
+    documento = request.GET.get('documento')
+    if not documento:
+        return _erro('documento', 'Informe o documento')
+    moradores = Morador.objects.filter(documento_chave=document_key(documento))
+    tipo_documento = _inteiro(request, 'tipo_documento')
+    if tipo_documento is False:
+        return _erro('tipo_documento', 'Informe um número inteiro')
+    if tipo_documento is not None:
+        moradores = moradores.filter(tipo_documento=tipo_documento)
+    return await _leitura_condicional(request, Morador, MoradorSerializer, moradores.order_by('-id'))
+
+
+@require_GET
+async def visitas_abertas(request):
+    """
+    Visitas abertas (quem está dentro agora), das mais recentes para as mais antigas.
+
+    Parâmetro opcional: ``residencia``.
+    """
+    visitas = Visitantes.objects.abertas()
+    residencia = _inteiro(request, 'residencia')
+    if residencia is False:
+        return _erro('residencia', 'Informe um número inteiro')
+    if residencia is not None:
+        visitas = visitas.filter(residencia=residencia)
+    return await _leitura_condicional(request, Visitantes, VisitanteSerializer, visitas.order_by('-data_entrada'))